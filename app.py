@@ -2,8 +2,9 @@
 图纸查询系统 - Web版本
 Flask Web应用主文件
 """
-from flask import Flask, render_template, request, jsonify, send_file, abort, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, send_file, abort, redirect, url_for, session, g
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import os
 import json
 import re
@@ -15,14 +16,21 @@ from functools import wraps
 from config import config
 from database.db_manager import db_manager
 from utils.pdf_handler import pdf_handler
+from utils.thumbnail import thumbnail_service
+from utils.upload_stream import StreamingRequest, is_valid_pdf, store_upload
+from utils.catalog_import import start_import_job, load_import_job
+from utils.event_broker import event_broker
+from utils.metrics import metrics
+from utils.request_trace import request_tracer
 
 # 创建Flask应用
 app = Flask(__name__)
+app.request_class = StreamingRequest  # 上传的PDF直接流式写盘
 CORS(app)  # 允许跨域请求
 
 # 配置
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = config.UPLOAD_MAX_CONTENT_LENGTH
 
 # 简单的登录校验装饰器
 def login_required(f):
@@ -42,46 +50,161 @@ def _sign_token(payload: dict) -> str:
 
 def _verify_token(token: str):
     """校验令牌并返回载荷，失败返回None"""
-    try:
-        if not token:
-            return None
-        parts = token.split('.')
-        if len(parts) != 2:
-            return None
-        d, s = parts
-        # 补齐base64填充
-        pad = lambda x: x + '==' if len(x) % 4 else x
-        data = base64.urlsafe_b64decode(pad(d))
-        sig = base64.urlsafe_b64decode(pad(s))
-        expected = hmac.new(config.SECRET_KEY.encode(), data, hashlib.sha256).digest()
-        if not hmac.compare_digest(sig, expected):
-            return None
-        payload = json.loads(data.decode())
-        exp = payload.get('exp')
-        if exp and time.time() > float(exp):
+    with request_tracer.span('auth'):
+        try:
+            if not token:
+                return None
+            parts = token.split('.')
+            if len(parts) != 2:
+                return None
+            d, s = parts
+            # 补齐base64填充
+            pad = lambda x: x + '==' if len(x) % 4 else x
+            data = base64.urlsafe_b64decode(pad(d))
+            sig = base64.urlsafe_b64decode(pad(s))
+            expected = hmac.new(config.SECRET_KEY.encode(), data, hashlib.sha256).digest()
+            if not hmac.compare_digest(sig, expected):
+                return None
+            payload = json.loads(data.decode())
+            exp = payload.get('exp')
+            if exp and time.time() > float(exp):
+                return None
+            return payload
+        except Exception:
             return None
-        return payload
-    except Exception:
-        return None
+
+# 请求指标（Web进程把快照写入 METRICS_DIR，多个工作进程合并输出）
+metrics.share(config.METRICS_DIR)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', '请求处理耗时（秒，流式响应只计到开始发送）', ['method', 'route', 'status'])
+PDF_BYTES_SERVED = metrics.counter('pdf_bytes_served_total', '发送的PDF字节数（含分段下载）')
+
+def _collect_app_metrics():
+    """推送订阅数与PDF文件索引（供 /metrics 输出）"""
+    samples = [('sse_subscribers', 'gauge', '当前推送（SSE）连接数', {},
+                event_broker.stats()['subscribers'])]
+    if pdf_handler.file_index:
+        samples.append(('pdf_index_files', 'gauge', 'PDF文件索引中的文件数', {},
+                        pdf_handler.file_index.stats()['files']))
+    return samples
+
+metrics.register_collector(_collect_app_metrics)
+
+# 上传生成的文件名：{产品号}_{8位uuid}.pdf（删除图纸时只清理这类文件）
+_UPLOADED_PDF_RE = re.compile(r'_[0-9a-f]{8}\.pdf$', re.IGNORECASE)
+
+def _send_pdf(full_path, download_name):
+    """
+    发送PDF文件，支持 Range 分段下载与条件请求（ETag / Last-Modified → 304）
+    ETag 由文件大小与修改时间生成；文件不存在时返回404（调用方无需事先检查）
+    同一个 /api/pdf/<id> 在重新上传后会指向另一个文件，因此每次都要求浏览器用 ETag 校验（未变化时返回304）
+    """
+    with request_tracer.span('fs_stat'):
+        try:
+            st = os.stat(full_path)
+        except FileNotFoundError:
+            pdf_handler.mark_removed(full_path)
+            abort(404, 'PDF文件不存在')
+    etag = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    response = send_file(full_path,
+                         mimetype='application/pdf',
+                         as_attachment=False,
+                         download_name=download_name,
+                         conditional=True,
+                         etag=etag,
+                         last_modified=st.st_mtime)
+    # 图纸需登录访问，只允许浏览器私有缓存
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if response.status_code in (200, 206) and response.content_length:
+        PDF_BYTES_SERVED.inc(response.content_length)
+    return response
+
+def _thumbnail_url(drawing_id, pdf_exists):
+    """搜索结果中的缩略图地址（无法生成缩略图时为None）"""
+    if pdf_exists and thumbnail_service.enabled:
+        return f'/api/pdf/{drawing_id}/thumbnail'
+    return None
+
+def _tenant_storage_bytes(full_path, activation_code=None, size=None):
+    """
+    文件计入租户PDF占用空间的字节数（只统计保存在该租户文件夹下的文件，与统计的扫描口径一致），不计入时为0
+    
+    参数:
+        size: 已知的文件大小（文件已删除时由调用方提供）
+    """
+    if not db_manager.stats:
+        return 0
+    folder = pdf_handler.get_folder(activation_code)
+    if os.path.normcase(os.path.normpath(os.path.dirname(full_path))) != os.path.normcase(os.path.normpath(folder)):
+        return 0
+    if size is None:
+        try:
+            size = os.path.getsize(full_path)
+        except OSError:
+            return 0
+    return size
+
+def _track_upload_storage(full_path, activation_code=None):
+    """上传后累加租户PDF占用空间"""
+    db_manager.notify_storage_changed(_tenant_storage_bytes(full_path, activation_code), activation_code)
+
+def _track_removed_storage(activation_code):
+    """后台清理文件后扣减租户PDF占用空间（返回 remove_files_async 的回调）"""
+    def on_removed(removed):
+        freed = sum(_tenant_storage_bytes(full_path, activation_code, size) for full_path, size in removed)
+        db_manager.notify_storage_changed(-freed, activation_code)
+    return on_removed
+
+# 请求计时（先于登录校验注册，被拦截的请求也计入）
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    request_tracer.start()
+    # 工作进程（fork 之后）首次处理请求时开始同步其他进程的写操作
+    db_manager.start_change_log()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is not None:
+        # 按路由规则而不是实际路径统计，避免ID等参数让标签无限增长
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=route, status=response.status_code)
+    trace = request_tracer.stop()
+    # 推送（SSE）连接持续到客户端断开，不计入慢请求
+    if trace is not None and response.mimetype != 'text/event-stream':
+        info = {
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'status': response.status_code,
+            'bytes': response.content_length,
+            'tenant': session.get('tenant_db'),
+        }
+        response.call_on_close(lambda: request_tracer.finish(trace, **info))
+    return response
 
 # 统一API登录校验（统计接口除外）
 @app.before_request
 def require_login_for_api():
-    path = request.path
-    # 放行登录/注册、静态资源、统计接口
-    allow_paths = {
-        '/login', '/register', '/logout', '/api/auth/login', '/api/auth/register', '/api/statistics'
-    }
-    if path.startswith('/static/'):
-        return
-    # 移动端接口使用令牌鉴权，统一放行到具体路由处理
-    if path.startswith('/api/mobile/'):
-        return
-    if path in allow_paths:
-        return
-    # 对所有 /api/* 接口进行登录校验
-    if path.startswith('/api/') and not session.get('user_id'):
-        return jsonify({'success': False, 'message': '未登录，请先登录'}), 401
+    with request_tracer.span('auth'):
+        path = request.path
+        # 放行登录/注册、静态资源、统计接口
+        allow_paths = {
+            '/login', '/register', '/logout', '/api/auth/login', '/api/auth/register', '/api/statistics'
+        }
+        if path.startswith('/static/'):
+            return
+        # 移动端接口使用令牌鉴权，统一放行到具体路由处理
+        if path.startswith('/api/mobile/'):
+            return
+        if path in allow_paths:
+            return
+        # 对所有 /api/* 接口进行登录校验
+        if path.startswith('/api/') and not session.get('user_id'):
+            return jsonify({'success': False, 'message': '未登录，请先登录'}), 401
 
 @app.route('/')
 def index():
@@ -100,7 +223,8 @@ def index():
     
     return render_template(template, 
                          app_name=config.APP_NAME, 
-                         version=config.VERSION)
+                         version=config.VERSION,
+                         sse_poll_seconds=config.SSE_FALLBACK_POLL_SECONDS)
 
 @app.route('/mobile')
 def mobile_index():
@@ -109,7 +233,8 @@ def mobile_index():
         return redirect(url_for('login'))
     return render_template('index_mobile_optimized.html', 
                          app_name=config.APP_NAME, 
-                         version=config.VERSION)
+                         version=config.VERSION,
+                         sse_poll_seconds=config.SSE_FALLBACK_POLL_SECONDS)
 
 @app.route('/desktop')
 def desktop_index():
@@ -118,7 +243,8 @@ def desktop_index():
         return redirect(url_for('login'))
     return render_template('index.html', 
                          app_name=config.APP_NAME, 
-                         version=config.VERSION)
+                         version=config.VERSION,
+                         sse_poll_seconds=config.SSE_FALLBACK_POLL_SECONDS)
 
 # ==================== 移动端 API（小程序） ====================
 @app.route('/api/mobile/register', methods=['POST'])
@@ -199,6 +325,8 @@ def mobile_upload():
             return jsonify({'success': False, 'message': '产品号和PDF文件不能为空'}), 400
         if not pdf_file.filename.lower().endswith('.pdf'):
             return jsonify({'success': False, 'message': '只能上传PDF文件'}), 400
+        if not is_valid_pdf(pdf_file):
+            return jsonify({'success': False, 'message': '文件内容不是有效的PDF'}), 400
 
         # 生成文件名
         import uuid
@@ -208,21 +336,28 @@ def mobile_upload():
         # 保存文件到服务器（按激活码分目录）
         full_path = pdf_handler.get_full_path(filename, activation_code=activation_code)
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        pdf_file.save(full_path)
+        store_upload(pdf_file, full_path)
+        pdf_handler.mark_saved(full_path)
+        thumbnail_service.schedule(full_path)
 
         # 在租户库中判断是否重复并插入
+        scope = db_manager.drawing_scope(activation_code)
         with db_manager.get_tenant_connection(activation_code=activation_code) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id FROM drawings WHERE product_code = %s", (product_code,))
+            cursor.execute(f"SELECT id FROM drawings WHERE {scope.filter}product_code = %s",
+                           scope.params + (product_code,))
             exists = cursor.fetchone()
             if exists:
                 cursor.close()
                 return jsonify({'success': False, 'message': f'产品号 "{product_code}" 已存在'}), 400
             cursor.execute(
-                "INSERT INTO drawings (product_code, pdf_path) VALUES (%s, %s)",
-                (product_code, filename)
+                f"INSERT INTO drawings ({scope.columns}product_code, pdf_path) VALUES ({scope.values}%s, %s)",
+                scope.params + (product_code, filename)
             )
             new_id = cursor.lastrowid
+            db_manager.notify_drawing_changed('insert', new_id, product_code, filename, activation_code=activation_code,
+                                              storage_delta=_tenant_storage_bytes(full_path, activation_code),
+                                              cursor=cursor)
             cursor.close()
 
         # 返回可用于预览的URL（移动端专用，带令牌）
@@ -242,19 +377,14 @@ def mobile_serve_pdf(drawing_id):
         activation_code = payload.get('code')
 
         # 根据ID查询图纸信息（在对应租户库）
-        with db_manager.get_tenant_connection(activation_code=activation_code) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT pdf_path FROM drawings WHERE id = %s", (drawing_id,))
-            result = cursor.fetchone()
-            cursor.close()
-        if not result:
+        drawing = db_manager.get_drawing_by_id(drawing_id, activation_code=activation_code)
+        if not drawing:
             abort(404, '图纸不存在')
 
-        pdf_path = result[0]
-        full_path = pdf_handler.get_full_path(pdf_path, activation_code=activation_code)
-        if not os.path.exists(full_path):
-            abort(404, 'PDF文件不存在')
-        return send_file(full_path, mimetype='application/pdf', as_attachment=False, download_name=pdf_path)
+        pdf_path = drawing['pdf_path']
+        return _send_pdf(pdf_handler.get_full_path(pdf_path, activation_code), pdf_path)
+    except HTTPException:
+        raise
     except Exception as e:
         abort(500, f"服务器错误: {str(e)}")
 
@@ -279,11 +409,9 @@ def search_drawing():
             pdf_exists = True  # 先假设存在，避免网络延迟
             pdf_path = drawing['pdf_path']
             
-            # 简单检查文件路径格式
+            # 通过文件索引检查（避免对网络共享目录逐个stat）
             try:
-                full_path = pdf_handler.get_full_path(pdf_path)
-                import os
-                pdf_exists = os.path.exists(full_path)
+                pdf_exists, _ = pdf_handler.check_exists(pdf_path)
             except:
                 pdf_exists = False
             
@@ -294,7 +422,8 @@ def search_drawing():
                     'product_code': drawing['product_code'],
                     'pdf_path': drawing['pdf_path'],
                     'pdf_exists': pdf_exists,
-                    'pdf_url': f'/api/pdf/{drawing["id"]}' if pdf_exists else None
+                    'pdf_url': f'/api/pdf/{drawing["id"]}' if pdf_exists else None,
+                    'thumbnail_url': _thumbnail_url(drawing['id'], pdf_exists)
                 }
             })
         else:
@@ -331,6 +460,7 @@ def search_fuzzy():
             pdf_exists, _ = pdf_handler.check_exists(result['pdf_path'])
             result['pdf_exists'] = pdf_exists
             result['pdf_url'] = f'/api/pdf/{result["id"]}' if pdf_exists else None
+            result['thumbnail_url'] = _thumbnail_url(result['id'], pdf_exists)
         
         return jsonify({
             'success': True,
@@ -349,44 +479,59 @@ def serve_pdf(drawing_id):
     """提供PDF文件服务"""
     try:
         # 根据ID查询图纸信息
-        with db_manager.get_tenant_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT pdf_path FROM drawings WHERE id = %s", (drawing_id,))
-            result = cursor.fetchone()
-            cursor.close()
+        drawing = db_manager.get_drawing_by_id(drawing_id)
         
-        if not result:
+        if not drawing:
             abort(404, "图纸不存在")
         
-        pdf_path = result[0]
-        full_path = pdf_handler.get_full_path(pdf_path)
+        pdf_path = drawing['pdf_path']
+        return _send_pdf(pdf_handler.get_full_path(pdf_path), pdf_path)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        abort(500, f"服务器错误: {str(e)}")
+
+@app.route('/api/pdf/<int:drawing_id>/thumbnail')
+def serve_pdf_thumbnail(drawing_id):
+    """提供PDF首页缩略图（首次请求时生成并缓存）"""
+    try:
+        drawing = db_manager.get_drawing_by_id(drawing_id)
+        
+        if not drawing:
+            abort(404, "图纸不存在")
         
-        if not os.path.exists(full_path):
+        try:
+            with request_tracer.span('fs_stat'):
+                thumb_path, key = thumbnail_service.get_thumbnail(pdf_handler.get_full_path(drawing['pdf_path']))
+        except FileNotFoundError:
             abort(404, "PDF文件不存在")
+        if not thumb_path:
+            abort(404, "无法生成缩略图")
         
-        return send_file(full_path, 
-                        mimetype='application/pdf',
-                        as_attachment=False,
-                        download_name=pdf_path)
+        # 缩略图按PDF路径+大小+修改时间存储，ETag 直接使用缓存键
+        response = send_file(thumb_path,
+                             mimetype=thumbnail_service.mimetype,
+                             conditional=True,
+                             etag=key)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         abort(500, f"服务器错误: {str(e)}")
 
 @app.route('/api/statistics')
 def get_statistics():
-    """获取统计信息API - 实时更新"""
+    """获取统计信息API - 从内存读取，写操作时增量更新"""
     try:
         from flask import make_response
         
-        total_count = db_manager.get_total_count()
         response_data = {
             'success': True,
-            'data': {
-                'total_drawings': total_count,
-                'app_name': config.APP_NAME,
-                'version': config.VERSION,
-                'environment': config.ENVIRONMENT
-            }
+            'data': _statistics_payload(db_manager.get_statistics())
         }
         
         # 不使用缓存，确保数据实时更新
@@ -403,13 +548,120 @@ def get_statistics():
             'message': f'获取统计信息失败: {str(e)}'
         })
 
+def _statistics_payload(stats):
+    """统计接口/推送的数据格式"""
+    return dict(stats, app_name=config.APP_NAME, version=config.VERSION, environment=config.ENVIRONMENT)
+
+def _sse_message(event, data, event_id=None):
+    """格式化一条 Server-Sent Events 消息"""
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(subscription, initial, formatters):
+    """
+    把订阅转换为 SSE 响应
+    
+    参数:
+        subscription: EventBroker 订阅
+        initial: 连接建立后先发送的消息列表
+        formatters: 主题 -> 把该主题的事件格式化为消息的函数
+    """
+    from flask import Response, stream_with_context
+    
+    def generate():
+        with subscription:
+            yield "retry: 5000\n\n"
+            yield from initial
+            deadline = time.time() + config.SSE_MAX_STREAM_SECONDS
+            while time.time() < deadline:
+                item = subscription.get(timeout=min(config.SSE_HEARTBEAT_SECONDS, max(deadline - time.time(), 0.1)))
+                if subscription.take_overflow():
+                    # 消费过慢丢过事件，通知客户端整体刷新
+                    yield _sse_message('reset', {})
+                if item is None:
+                    yield ": keepalive\n\n"
+                else:
+                    topic, event = item
+                    yield formatters[topic](event)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 nginx 缓冲
+    return response
+
+def _event_stream(streams):
+    """
+    建立推送连接（一个连接可同时推送多类事件）
+    
+    参数:
+        streams: 需要的事件类别集合：'stats'（统计）、'changes'（图纸变更）
+    """
+    from database.tenant_stats import stats_topic
+    from database.change_feed import changes_topic
+    
+    tenant_db = db_manager.resolve_tenant_db()
+    formatters = {}
+    initial = []
+    if 'stats' in streams:
+        try:
+            stats = db_manager.get_statistics()
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'获取统计信息失败: {str(e)}'}), 500
+        initial.append(_sse_message('stats', _statistics_payload(stats)))
+        formatters[stats_topic(tenant_db)] = lambda stats: _sse_message('stats', _statistics_payload(stats))
+    if 'changes' in streams and db_manager.change_feed:
+        formatters[changes_topic(tenant_db)] = lambda e: _sse_message('change', e, e['event_id'])
+    if not formatters:
+        return jsonify({'success': False, 'message': '推送未启用'}), 404
+    
+    subscription = event_broker.subscribe(*formatters)
+    if subscription is None:
+        # 推送连接已满，客户端回退为定时请求
+        return jsonify({'success': False, 'message': '推送连接已满'}), 503
+    
+    # 断线重连：补发错过的变更事件（订阅之后再取，避免遗漏）
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id and changes_topic(tenant_db) in formatters:
+        missed = db_manager.change_feed.since(tenant_db, last_event_id)
+        if missed is None:
+            initial.append(_sse_message('reset', {}))
+        else:
+            initial.extend(_sse_message('change', e, e['event_id']) for e in missed)
+    
+    return _sse_response(subscription, initial, formatters)
+
+@app.route('/api/events')
+def stream_events():
+    """
+    页面推送（Server-Sent Events），每个页面只建立一个连接
+    参数 streams: 逗号分隔的事件类别，stats / changes（默认两者）
+    事件 stats: 统计信息（数据变化时推送）
+    事件 change: 图纸变更 {event_id, action, id, product_code, pdf_path, old_product_code, at}
+    事件 reset: 有变更未能送达（断线过久/消费过慢），客户端应重新加载
+    连接数已满时返回503，页面改为定时请求
+    """
+    streams = set(filter(None, request.args.get('streams', 'stats,changes').split(',')))
+    return _event_stream(streams)
+
+@app.route('/api/statistics/stream')
+def stream_statistics():
+    """统计信息推送（兼容旧页面，等同 /api/events?streams=stats）"""
+    return _event_stream({'stats'})
+
+@app.route('/api/drawings/changes')
+def stream_drawing_changes():
+    """图纸变更推送（兼容旧页面，等同 /api/events?streams=changes）"""
+    return _event_stream({'changes'})
+
 @app.route('/admin')
 @login_required
 def admin_panel():
     """管理员面板页面"""
     return render_template('admin_panel.html', 
                          app_name=config.APP_NAME, 
-                         version=config.VERSION)
+                         version=config.VERSION,
+                         sse_poll_seconds=config.SSE_FALLBACK_POLL_SECONDS)
 
 # 登录页面与逻辑
 @app.route('/login', methods=['GET', 'POST'])
@@ -481,14 +733,33 @@ def logout():
 
 @app.route('/api/admin/drawings', methods=['GET'])
 def get_all_drawings():
-    """获取所有图纸数据API"""
+    """
+    分页获取图纸数据API
+    查询参数: cursor（上一页的 next_cursor）、limit、keyword（产品号筛选）、
+             sort（id / product_code）、order（asc / desc）
+    """
     try:
-        drawings = db_manager.get_all_drawings(limit=1000)
+        page = db_manager.get_drawings_page(
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', type=int),
+            keyword=request.args.get('keyword', ''),
+            sort=request.args.get('sort', 'id'),
+            order=request.args.get('order', 'asc')
+        )
         return jsonify({
             'success': True,
-            'data': drawings,
-            'count': len(drawings)
+            'data': page['items'],
+            'count': len(page['items']),
+            'total': page['total'],
+            'total_exact': page['total_exact'],
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
         })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -558,19 +829,15 @@ def update_drawing(drawing_id):
             })
         
         # 先获取原有记录
-        with db_manager.get_tenant_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT product_code FROM drawings WHERE id = %s", (drawing_id,))
-            result = cursor.fetchone()
-            cursor.close()
+        drawing = db_manager.get_drawing_by_id(drawing_id)
         
-        if not result:
+        if not drawing:
             return jsonify({
                 'success': False,
                 'message': '图纸不存在'
             })
         
-        old_product_code = result[0]
+        old_product_code = drawing['product_code']
         
         # 如果产品号发生变化，检查新产品号是否已存在
         if product_code != old_product_code:
@@ -582,13 +849,15 @@ def update_drawing(drawing_id):
                 })
         
         # 更新数据库
+        scope = db_manager.drawing_scope()
         with db_manager.get_tenant_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE drawings SET product_code = %s, pdf_path = %s WHERE id = %s",
-                (product_code, pdf_path, drawing_id)
+                f"UPDATE drawings SET product_code = %s, pdf_path = %s WHERE {scope.filter}id = %s",
+                (product_code, pdf_path) + scope.params + (drawing_id,)
             )
-            conn.commit()
+            db_manager.notify_drawing_changed('update', drawing_id, product_code, pdf_path,
+                                              old_product_code=old_product_code, cursor=cursor)
             cursor.close()
         
         return jsonify({
@@ -629,6 +898,11 @@ def upload_drawing():
                 'success': False,
                 'message': '只能上传PDF文件'
             })
+        if not is_valid_pdf(pdf_file):
+            return jsonify({
+                'success': False,
+                'message': '文件内容不是有效的PDF'
+            })
         
         # 生成文件名
         import os
@@ -636,16 +910,19 @@ def upload_drawing():
         file_extension = '.pdf'
         filename = f"{product_code}_{uuid.uuid4().hex[:8]}{file_extension}"
         
-        # 保存文件到服务器
+        # 保存文件到服务器（流式上传时为原子改名）
         upload_dir = os.path.join(config.PDF_NETWORK_PATH.rstrip(os.sep))
         os.makedirs(upload_dir, exist_ok=True)
         file_path = os.path.join(upload_dir, filename)
-        pdf_file.save(file_path)
+        store_upload(pdf_file, file_path)
+        pdf_handler.mark_saved(file_path)
         
         # 添加到数据库
         success = db_manager.add_drawing(product_code, filename)
         
         if success:
+            thumbnail_service.schedule(file_path)
+            _track_upload_storage(file_path, session.get('activation_code'))
             return jsonify({
                 'success': True,
                 'message': '上传成功',
@@ -653,8 +930,7 @@ def upload_drawing():
             })
         else:
             # 如果数据库添加失败，删除已上传的文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            pdf_handler.remove_file(file_path)
             return jsonify({
                 'success': False,
                 'message': '数据库添加失败'
@@ -691,21 +967,22 @@ def update_drawing_file(drawing_id):
                 'success': False,
                 'message': '只能上传PDF文件'
             })
+        if not is_valid_pdf(pdf_file):
+            return jsonify({
+                'success': False,
+                'message': '文件内容不是有效的PDF'
+            })
         
         # 获取原有记录
-        with db_manager.get_tenant_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT product_code, pdf_path FROM drawings WHERE id = %s", (drawing_id,))
-            result = cursor.fetchone()
-            cursor.close()
+        drawing = db_manager.get_drawing_by_id(drawing_id)
         
-        if not result:
+        if not drawing:
             return jsonify({
                 'success': False,
                 'message': '图纸不存在'
             })
         
-        old_product_code, old_pdf_path = result
+        old_product_code, old_pdf_path = drawing['product_code'], drawing['pdf_path']
         
         # 如果产品号发生变化，检查新产品号是否已存在
         if product_code != old_product_code:
@@ -726,25 +1003,34 @@ def update_drawing_file(drawing_id):
         upload_dir = os.path.join(config.PDF_NETWORK_PATH.rstrip(os.sep))
         os.makedirs(upload_dir, exist_ok=True)
         file_path = os.path.join(upload_dir, filename)
-        pdf_file.save(file_path)
+        store_upload(pdf_file, file_path)
+        pdf_handler.mark_saved(file_path)
         
         # 更新数据库
+        activation_code = session.get('activation_code')
+        scope = db_manager.drawing_scope()
         with db_manager.get_tenant_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE drawings SET product_code = %s, pdf_path = %s WHERE id = %s",
-                (product_code, filename, drawing_id)
+                f"UPDATE drawings SET product_code = %s, pdf_path = %s WHERE {scope.filter}id = %s",
+                (product_code, filename) + scope.params + (drawing_id,)
             )
-            conn.commit()
+            db_manager.notify_drawing_changed('update', drawing_id, product_code, filename,
+                                              old_product_code=old_product_code,
+                                              storage_delta=_tenant_storage_bytes(file_path, activation_code),
+                                              cursor=cursor)
             cursor.close()
+        thumbnail_service.schedule(file_path)
         
-        # 删除旧文件
+        # 提交后删除旧文件，释放的占用空间单独记录
         old_file_path = os.path.join(upload_dir, old_pdf_path)
-        if os.path.exists(old_file_path):
-            try:
-                os.remove(old_file_path)
-            except:
-                pass  # 忽略删除旧文件的错误
+        freed = _tenant_storage_bytes(old_file_path, activation_code)
+        try:
+            if not pdf_handler.remove_file(old_file_path):
+                freed = 0
+        except:
+            freed = 0  # 忽略删除旧文件的错误
+        db_manager.notify_storage_changed(-freed, activation_code)
         
         return jsonify({
             'success': True,
@@ -771,26 +1057,18 @@ def delete_drawings_batch():
                 'message': '请选择要删除的图纸'
             })
         
-        deleted_count = 0
+        activation_code = session.get('activation_code')
+        deleted, unused_paths = db_manager.delete_drawings_by_ids(ids, activation_code=activation_code)
+        deleted_count = len(deleted)
         
-        for drawing_id in ids:
-            try:
-                # 获取产品号
-                with db_manager.get_tenant_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT product_code FROM drawings WHERE id = %s", (drawing_id,))
-                    result = cursor.fetchone()
-                    cursor.close()
-                
-                if result:
-                    product_code = result[0]
-                    success = db_manager.delete_drawing(product_code)
-                    if success:
-                        deleted_count += 1
-                        
-            except Exception as e:
-                print(f"删除图纸 {drawing_id} 失败: {e}")
-                continue
+        # 后台清理系统上传生成的PDF文件（手工指定路径的文件不删除）
+        # 管理端上传保存在根目录，移动端上传保存在激活码目录，两处都尝试
+        cleanup_paths = set()
+        for pdf_path in unused_paths:
+            if _UPLOADED_PDF_RE.search(os.path.basename(pdf_path)):
+                cleanup_paths.add(pdf_handler.get_full_path(pdf_path, activation_code))
+                cleanup_paths.add(pdf_handler.get_full_path(pdf_path))
+        pdf_handler.remove_files_async(cleanup_paths, on_removed=_track_removed_storage(activation_code))
         
         return jsonify({
             'success': True,
@@ -804,6 +1082,80 @@ def delete_drawings_batch():
             'message': f'删除失败: {str(e)}'
         })
 
+@app.route('/api/admin/drawings/import', methods=['POST'])
+def import_drawings():
+    """批量导入图纸目录API（CSV/XLSX，后台执行，返回任务ID）"""
+    try:
+        catalog_file = request.files.get('file')
+        if not catalog_file or catalog_file.filename == '':
+            return jsonify({
+                'success': False,
+                'message': '请选择要导入的CSV或Excel文件'
+            })
+        
+        ext = os.path.splitext(catalog_file.filename)[1].lower()
+        if ext not in ('.csv', '.xlsx', '.xlsm'):
+            return jsonify({
+                'success': False,
+                'message': '只支持 CSV / XLSX 文件'
+            })
+        
+        on_duplicate = 'update' if request.form.get('on_duplicate') == 'update' else 'skip'
+        allow_missing = request.form.get('allow_missing') in ('1', 'true', 'on')
+        
+        import uuid
+        os.makedirs(config.IMPORT_JOB_DIR, exist_ok=True)
+        file_path = os.path.join(config.IMPORT_JOB_DIR, f"upload_{uuid.uuid4().hex}{ext}")
+        catalog_file.save(file_path)
+        
+        job_id = start_import_job(file_path, catalog_file.filename,
+                                  activation_code=session.get('activation_code'),
+                                  on_duplicate=on_duplicate, allow_missing=allow_missing)
+        return jsonify({
+            'success': True,
+            'message': '导入任务已开始',
+            'job_id': job_id
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'导入失败: {str(e)}'
+        })
+
+@app.route('/api/admin/drawings/import/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    """查询批量导入进度API"""
+    job = load_import_job(job_id)
+    if not job or job.get('activation_code') != session.get('activation_code'):
+        return jsonify({
+            'success': False,
+            'message': '导入任务不存在'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': job
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    运行指标（Prometheus 文本格式，合并所有工作进程）
+    设置 METRICS_TOKEN 时需要 Authorization: Bearer <TOKEN>；
+    未设置时只允许本机直接访问（经反向代理转发的请求不算本机），开发模式下不限制
+    """
+    if not config.METRICS_ENABLED:
+        abort(404)
+    if config.METRICS_TOKEN:
+        expected = f"Bearer {config.METRICS_TOKEN}".encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return jsonify({'success': False, 'message': '未授权'}), 401
+    elif not config.DEBUG:
+        local = request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+        if not local:
+            return jsonify({'success': False, 'message': '未设置 METRICS_TOKEN 时只允许本机访问'}), 403
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found(error):
     """404错误处理"""
@@ -885,7 +1237,6 @@ if __name__ == '__main__':
     # 尝试自动配置防火墙
     check_and_open_firewall_port(port)
     
-    # 开发模式运行
     print(f"🚀 启动 {config.APP_NAME} Web版本 v{config.VERSION}")
     print(f"🌐 本地访问: http://localhost:{port}")
     print(f"🌐 局域网访问: http://{local_ip}:{port}")
@@ -895,9 +1246,6 @@ if __name__ == '__main__':
     if port != 5000:
         print(f"⚠️  注意: 5000端口被占用，已自动切换到端口 {port}")
     
-    app.run(
-        host='0.0.0.0',
-        port=port,
-        debug=config.DEBUG,
-        threaded=True
-    )
\ No newline at end of file
+    # 按 config.WEB_SERVER 选择开发服务器或生产服务器
+    from web_server import serve
+    serve(app, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -38,10 +38,98 @@ class Config:
         DB_CHARSET = "utf8mb4"
         print("🚀 当前环境: 生产环境 (服务器MySQL)")
     
+    # ==================== 数据库连接池配置 ====================
+    DB_POOL_ENABLED = True           # 关闭后每次操作新建连接（旧行为）
+    DB_POOL_MAX_PER_DB = 10          # 每个数据库（主库/租户库）最大连接数
+    DB_POOL_MAX_TOTAL = 50           # 全局最大连接数
+    DB_POOL_IDLE_TIMEOUT = 300       # 空闲连接回收时间（秒）
+    DB_POOL_MAX_LIFETIME = 3600      # 连接最大存活时间（秒），需小于MySQL wait_timeout
+    DB_POOL_PING_AFTER = 5           # 空闲超过该秒数的连接在取出时先ping检查
+    DB_POOL_ACQUIRE_TIMEOUT = 10     # 连接池满时的最长等待时间（秒）
+    DB_BULK_CHUNK_SIZE = 1000        # 批量导入时每个多行INSERT事务的行数
+    
+    # ==================== 多租户存储配置 ====================
+    # 'database'：每个激活码一个独立数据库（DB_NAME_t_<hash>）
+    # 'shared'：所有租户共用 TENANT_SHARED_DB 中的一张 drawings 表，按 tenant_id 区分
+    #           （从独立库迁移: python scripts/migrate_tenants_to_shared.py）
+    TENANT_STORAGE_MODE = 'database'
+    TENANT_SHARED_DB = DB_NAME + "_shared"
+    TENANT_WARM_CONNECTIONS = 2      # 登录/首次访问租户时后台预建的连接数（0为不预建）
+    TENANT_WARM_INTERVAL = 300       # 同一租户的最短预热间隔（秒）
+    
+    # ==================== 目录批量导入配置 ====================
+    IMPORT_VERIFY_WORKERS = 16       # 检查PDF文件是否存在的并发线程数（网络共享目录延迟较高）
+    IMPORT_MAX_ERRORS = 1000         # 导入报告中保留的问题行明细条数
+    IMPORT_JOB_DIR = "data/imports"  # Web导入任务的上传文件与进度状态
+    IMPORT_HEARTBEAT_SECONDS = 10    # 导入任务更新心跳的周期（秒）
+    IMPORT_STALE_SECONDS = 60        # 心跳超过该时间未更新的任务视为执行进程已退出
+    
+    # ==================== 查询缓存配置 ====================
+    QUERY_CACHE_ENABLED = True       # 产品号精确查询结果缓存
+    QUERY_CACHE_MAX_ENTRIES = 10000  # 最大缓存条目数（所有租户合计）
+    QUERY_CACHE_TTL = 300            # 缓存有效期（秒）
+    
+    # ==================== 统计与推送配置 ====================
+    STATS_ENABLED = True             # 统计数据保存在内存中增量更新（关闭则每次查询 COUNT(*)）
+    STATS_DAYS = 30                  # 每日上传数统计的天数
+    STATS_RECENT_ACTIVITY = 20       # 保留的最近操作条数
+    STATS_RESEED_SECONDS = 300       # 从数据库重新校准的周期（秒），兼顾其他进程的写入
+    # 推送连接上限（每个进程）：每个连接在 SSE_MAX_STREAM_SECONDS 内一直占用一个工作线程（空闲时只是阻塞等待，不占CPU），
+    # 实际不超过 WEB_THREADS 的一半，保证普通请求始终有线程可用；超出时页面改为定时请求。
+    # 实际容量：gunicorn 为 WEB_WORKERS × SSE_MAX_CLIENTS（默认 4 × 16 = 64 个同时打开的页面），waitress 为 SSE_MAX_CLIENTS
+    SSE_MAX_CLIENTS = 16
+    SSE_FALLBACK_POLL_SECONDS = 30   # 推送不可用时页面定时请求的间隔（秒）
+    SSE_HEARTBEAT_SECONDS = 15       # 空闲时发送心跳的间隔（秒），防止代理断开
+    SSE_MAX_STREAM_SECONDS = 600     # 单个推送连接的最长时间（秒），到期后浏览器自动重连
+    CHANGE_FEED_ENABLED = True       # 图纸变更事件推送
+    CHANGE_FEED_BUFFER = 1000        # 断线重连时最多补发的变更事件数（未启用变更日志时为每个进程在内存中保留的条数）
+    CHANGE_LOG_ENABLED = True        # 写操作记入主库 drawing_changes 表，各进程据此同步缓存、索引与统计（多进程/多台桌面端必须开启）
+    CHANGE_LOG_POLL_SECONDS = 5      # Web工作进程读取变更日志的周期（秒），即其他进程写入后最长的缓存/推送滞后；桌面端只在窗口获得焦点时读取
+    CHANGE_LOG_RETENTION_SECONDS = 24 * 3600  # 变更日志保留时间（秒）
+    
+    # ==================== 管理端分页配置 ====================
+    ADMIN_PAGE_SIZE = 50             # 默认每页条数
+    ADMIN_PAGE_MAX_SIZE = 500        # 每页最大条数
+    ADMIN_COUNT_TTL = 60             # 总数缓存有效期（秒），写操作后立即失效
+    ADMIN_COUNT_CAP = 100000         # 带筛选条件时最多数到该条数，超过则返回近似值
+    DESKTOP_PAGE_SIZE = 200          # 桌面端数据管理表格每次加载的行数
+    DESKTOP_QUERY_THREADS = 4        # 桌面端后台查询线程数（不超过 DB_POOL_MAX_PER_DB）
+    
+    # ==================== 模糊查询索引配置 ====================
+    FUZZY_INDEX_ENABLED = True             # 模糊查询使用内存三元组索引（加载完成前回退到SQL）
+    FUZZY_INDEX_MAX_ROWS = 2000000         # 单租户超过该条数不建索引
+    FUZZY_INDEX_REFRESH_SECONDS = 600      # 索引后台重建周期（秒），用于同步其他进程的写入
+    FUZZY_INDEX_SCAN_THRESHOLD = 20000     # 候选集超过该数量时改为按序扫描
+    
     # ==================== PDF文件配置 ====================
     # PDF保存在本地
     PDF_NETWORK_PATH = "data/pdf/NR/"
     
+    # PDF存在性索引：定期扫描目录代替逐个 stat（网络共享目录上效果明显）
+    PDF_INDEX_ENABLED = True
+    PDF_INDEX_REFRESH_SECONDS = 60   # 全量扫描周期（秒）
+    
+    # 相同内容的PDF只保存一份（各激活码目录下为硬链接），文件系统不支持硬链接时自动回退
+    # 硬链接共享内容：任何程序原地修改一个文件会改掉所有租户的同内容文件，
+    # 只有确认所有写入方都是“写临时文件后 os.replace 替换”时才开启
+    PDF_DEDUP_ENABLED = False
+    PDF_BLOB_DIR = '.blobs'          # 位于PDF根目录下
+    
+    # 上传大小上限（字节）；上传的PDF边接收边写盘，不占用内存
+    UPLOAD_MAX_CONTENT_LENGTH = 512 * 1024 * 1024
+    
+    # ==================== 缩略图配置 ====================
+    # 需要 PyMuPDF（pip install PyMuPDF）或 poppler 的 pdftoppm 命令
+    THUMBNAIL_ENABLED = True
+    THUMBNAIL_CACHE_PATH = None      # None 表示 PDF目录同级的 thumbnails 文件夹
+    THUMBNAIL_WIDTH = 320            # 缩略图宽度（像素）
+    THUMBNAIL_FORMAT = 'webp'        # 'webp'（需Pillow）或 'png'
+    THUMBNAIL_QUALITY = 70           # WebP质量
+    THUMBNAIL_WORKERS = 2            # 后台生成线程数
+    THUMBNAIL_MAX_AGE_DAYS = 30      # 超过该天数未访问的缩略图被清理（PDF替换/删除后留下的旧缩略图）
+    THUMBNAIL_CACHE_MAX_MB = 1024    # 缩略图缓存总大小上限（MB），超出时删除最久未访问的；0 表示不限
+    THUMBNAIL_EVICT_SECONDS = 24 * 3600  # 清理周期（秒）
+    
     # ==================== 查询配置 ====================
     MAX_SEARCH_RESULTS = 100
     
@@ -53,6 +141,17 @@ class Config:
     WEB_HOST = '0.0.0.0'  # 允许外部访问
     WEB_PORT = 5000       # 固定端口
 
+    # 服务器模式：'auto'（DEBUG时用开发服务器，否则Linux用gunicorn、Windows用waitress）
+    #           'development' / 'gunicorn' / 'waitress'
+    WEB_SERVER = 'auto'
+    WEB_WORKERS = 4             # 工作进程数（waitress为单进程，线程数 = 进程数 × 线程数）
+    WEB_THREADS = 32            # 每个进程的线程数（其中最多 SSE_MAX_CLIENTS 个用于推送连接，其余处理普通请求）
+    WEB_KEEPALIVE = 5           # keep-alive 等待时间（秒）
+    WEB_TIMEOUT = 120           # 请求超时（秒），大文件下载需留足时间
+    WEB_GRACEFUL_TIMEOUT = 30   # 平滑重载/停止时等待请求完成的时间（秒）
+    WEB_MAX_REQUESTS = 0        # 每个进程处理多少请求后自动重启（0为不重启）
+    # 注意：连接池上限按进程计算，总连接数约为 WEB_WORKERS × DB_POOL_MAX_TOTAL
+
     # 固定IP配置（可选，用于生成访问链接）
     FIXED_LOCAL_IP = None  # 如需固定IP，设置为具体IP如 '192.168.1.100'
 
@@ -61,9 +160,34 @@ class Config:
     SECRET_KEY = "change-this-to-a-strong-random-secret"
     MOBILE_TOKEN_EXP_SECONDS = 7 * 24 * 3600
 
+    # ==================== 用户登录配置 ====================
+    PASSWORD_HASH_SCHEME = 'scrypt'  # 新密码哈希方案：'scrypt'（标准库）或 'argon2'（需安装 argon2-cffi）
+    PASSWORD_SCRYPT_N = 2 ** 14      # scrypt 开销参数（调大后旧哈希在登录时自动升级）
+    PASSWORD_SCRYPT_R = 8
+    PASSWORD_SCRYPT_P = 1
+    PASSWORD_HASH_CONCURRENCY = 4    # 每个进程同时计算密码哈希的上限（scrypt 每次约16MB内存，超出的登录排队等待）
+    LOGIN_CACHE_TTL = 300            # 登录成功结果缓存（秒），期间同一用户名+密码再次登录不再计算哈希（仍按主键核对账号状态）；0 表示不缓存
+    LOGIN_CACHE_MAX_ENTRIES = 10000
+    LAST_LOGIN_FLUSH_SECONDS = 5     # 最后登录时间批量写入周期（秒）
+    ACTIVATION_CACHE_TTL = 300       # 激活码“有效”结果缓存（秒）
+    ACTIVATION_NEGATIVE_TTL = 30     # 激活码“无效”结果缓存（秒），新增激活码后本进程立即失效
+    ACTIVATION_CACHE_MAX_ENTRIES = 10000
+
     # ==================== 日志配置 ====================
     ENABLE_LOGGING = True
     LOG_DIR = "data/logs"
+    SLOW_REQUEST_LOG_ENABLED = True        # 慢请求日志（LOG_DIR/slow_requests.jsonl）
+    SLOW_REQUEST_THRESHOLD_MS = 500        # 总耗时超过该值（毫秒）的请求记录各阶段耗时
+    SLOW_REQUEST_SAMPLE_RATE = 0.0         # 未超过阈值的请求按该比例随机记录（0 表示不采样）
+    SLOW_REQUEST_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_REQUEST_LOG_BACKUPS = 5
+
+    # ==================== 监控指标配置 ====================
+    METRICS_ENABLED = True           # 是否记录指标并开放 GET /metrics（Prometheus 文本格式）
+    METRICS_DIR = "data/metrics"     # 多进程部署时各工作进程的指标快照目录（只有Web进程写入；已退出进程的计数累计在 exited.json）
+    METRICS_FLUSH_SECONDS = 5        # 工作进程写入快照的周期（秒）
+    METRICS_STALE_SECONDS = 60       # 快照超过该时间未更新视为进程已退出
+    METRICS_TOKEN = None             # 设置后 /metrics 需要 Authorization: Bearer <TOKEN>；未设置时（非开发模式）只允许本机访问
     
     # ==================== 开发模式 ====================
     DEBUG = True if ENVIRONMENT == 'development' else False
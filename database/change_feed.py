@@ -0,0 +1,130 @@
+"""
+图纸变更事件流
+按租户发布变更事件（insert/update/delete），供 SSE 推送给浏览器，客户端断线重连时凭 Last-Event-ID 补发：
+- 启用变更日志（CHANGE_LOG_ENABLED）时，事件来自主库 drawing_changes 表，各工作进程都能收到所有进程的写入，
+  event_id 为表中的行ID，补发时从表中读取（最多 CHANGE_FEED_BUFFER 条）
+- 未启用时只发布本进程的写入，每个租户在内存中保留最近 CHANGE_FEED_BUFFER 条事件（只适合单进程部署）
+"""
+import os
+import time
+import threading
+from collections import deque
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+def changes_topic(tenant_db):
+    """变更推送的事件主题"""
+    return ('drawings', tenant_db)
+
+
+class ChangeFeed:
+    """按租户发布图纸变更事件"""
+
+    def __init__(self, broker, buffer_size=None, change_log=None):
+        """
+        参数:
+            broker: EventBroker，事件发布到 changes_topic(tenant_db)
+            buffer_size: 每个租户保留的最近事件数（使用变更日志时为最多补发的事件数）
+            change_log: ChangeLog（可选），提供后由其轮询线程发布事件，补发时从变更日志读取
+        """
+        self.broker = broker
+        self.buffer_size = buffer_size or config.CHANGE_FEED_BUFFER
+        self.change_log = change_log
+        self._buffers = {}    # tenant_db -> deque[(序号, 事件)]
+        self._evicted = {}    # tenant_db -> 已被挤出缓冲区的最大序号
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._new_epoch()
+        register_after_fork(self)
+
+    def publish(self, tenant_db, action, drawing_id=None, product_code=None, pdf_path=None,
+                old_product_code=None):
+        """
+        发布一条本进程的变更事件（未使用变更日志时）
+
+        返回:
+            dict: 事件
+        """
+        with self._lock:
+            self._seq += 1
+            event = self._event(f"{self.epoch}-{self._seq}", action, drawing_id, product_code, pdf_path,
+                                old_product_code, time.time())
+            buffer = self._buffers.get(tenant_db)
+            if buffer is None:
+                buffer = self._buffers[tenant_db] = deque(maxlen=self.buffer_size)
+            if len(buffer) == buffer.maxlen:
+                self._evicted[tenant_db] = buffer[0][0]
+            buffer.append((self._seq, event))
+        self.broker.publish(changes_topic(tenant_db), event)
+        return event
+
+    def publish_logged(self, change):
+        """
+        发布一条变更日志中的事件（由变更日志轮询线程调用，包括本进程与其他进程的写入）
+
+        参数:
+            change: 变更日志事件（字段见 change_log.EVENT_FIELDS）
+        """
+        event = self._logged_event(change)
+        self.broker.publish(changes_topic(change['tenant_db']), event)
+        return event
+
+    def since(self, tenant_db, last_event_id):
+        """
+        断线重连时需要补发的事件
+
+        参数:
+            last_event_id: 客户端收到的最后一个 event_id
+
+        返回:
+            list: 需补发的事件；无法补全（已超出缓冲区/已从变更日志清理/来自其他进程的内存缓冲区）时返回None，
+                  客户端应整体刷新
+        """
+        if self.change_log is not None:
+            if not (last_event_id or '').isdigit():
+                return None
+            try:
+                changes = self.change_log.since(tenant_db, int(last_event_id), self.buffer_size)
+            except Exception as e:
+                print(f"⚠️  读取变更日志失败: {e}")
+                return None
+            if changes is None:
+                return None
+            return [self._logged_event(change) for change in changes]
+        epoch, _, seq = (last_event_id or '').rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            if self._evicted.get(tenant_db, 0) > seq:
+                # 部分缺失事件已被挤出缓冲区
+                return None
+            return [event for event_seq, event in self._buffers.get(tenant_db, ()) if event_seq > seq]
+
+    @staticmethod
+    def _event(event_id, action, drawing_id, product_code, pdf_path, old_product_code, at):
+        return {
+            'event_id': event_id,
+            'action': action,
+            'id': drawing_id,
+            'product_code': product_code,
+            'pdf_path': pdf_path,
+            'old_product_code': old_product_code,
+            'at': at,
+        }
+
+    def _logged_event(self, change):
+        return self._event(str(change['id']), change['action'], change['drawing_id'], change['product_code'],
+                           change['pdf_path'], change['old_product_code'], change['at'])
+
+    def _new_epoch(self):
+        # 进程标识：重启或 fork 后旧的 event_id 不再有效
+        self.epoch = f"{os.getpid():x}{int(time.time()):x}"
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._evicted = {}
+        self._seq = 0
+        self._new_epoch()
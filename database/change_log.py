@@ -0,0 +1,255 @@
+"""
+跨进程图纸变更日志
+多进程部署（gunicorn）或多台桌面端共用一个数据库时，各进程的查询缓存、模糊查询索引、统计都在本进程内存中，
+只靠本进程的写操作无法得知其他进程的修改。写操作在同一事务中向主库 drawing_changes 表追加一行，
+Web工作进程的后台线程每隔 CHANGE_LOG_POLL_SECONDS 秒按自增ID读取新行（主键范围查询），交给回调处理
+（桌面端不常驻轮询，只在窗口获得焦点时读取一次）：
+- 其他进程的变更：失效本进程的缓存、更新索引与统计
+- 所有变更（含本进程）：推送给浏览器（行ID即事件ID，断线重连时按ID从表中补发）
+
+超过 CHANGE_LOG_RETENTION_SECONDS 的行由各进程定期删除
+"""
+import os
+import time
+import uuid
+import threading
+import pymysql
+from config import config
+from utils.fork_safe import register_after_fork
+
+# 变更行的字段（与回调收到的事件字典一致）
+EVENT_FIELDS = ('id', 'tenant_db', 'action', 'drawing_id', 'product_code', 'old_product_code', 'pdf_path',
+                'storage_delta', 'origin', 'at')
+
+
+class ChangeLog:
+    """drawing_changes 表的写入与轮询"""
+
+    def __init__(self, connect, on_change, on_gap=None, poll_seconds=None, retention_seconds=None):
+        """
+        参数:
+            connect: 返回主库连接上下文管理器的函数（如 db_manager.get_connection）
+            on_change: 回调 on_change(event, local)，event 字段见 EVENT_FIELDS，local 表示是否为本进程的写入
+            on_gap: 回调 on_gap()，轮询落后太多（未读的行已被清理）时调用，应清空本进程的缓存
+            poll_seconds: 轮询周期（秒）
+            retention_seconds: 变更行保留时间（秒）
+        """
+        self.connect = connect
+        self.on_change = on_change
+        self.on_gap = on_gap
+        self.poll_seconds = poll_seconds or config.CHANGE_LOG_POLL_SECONDS
+        self.retention_seconds = retention_seconds or config.CHANGE_LOG_RETENTION_SECONDS
+        self._table_ready = False
+        self._last_id = None
+        self._poller = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # 写操作事务中使用（租户库连接上按库名访问主库的表）
+        self.table = f"`{config.DB_NAME}`.drawing_changes"
+        self._new_origin()
+        register_after_fork(self)
+
+    # ==================== 写入 ====================
+
+    def ensure_table(self):
+        """创建 drawing_changes 表（每个进程只执行一次）"""
+        if self._table_ready:
+            return
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS drawing_changes (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    tenant_db VARCHAR(64) NOT NULL DEFAULT '' COMMENT '租户库名（主库为空）',
+                    action VARCHAR(10) NOT NULL COMMENT 'insert/update/delete/storage',
+                    drawing_id BIGINT NULL,
+                    product_code VARCHAR(100) NULL,
+                    old_product_code VARCHAR(100) NULL,
+                    pdf_path VARCHAR(500) NULL,
+                    storage_delta BIGINT NOT NULL DEFAULT 0 COMMENT 'PDF占用空间变化（字节）',
+                    origin VARCHAR(64) NOT NULL COMMENT '写入进程',
+                    created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+                    KEY idx_tenant_id (tenant_db, id),
+                    KEY idx_created_at (created_at)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            cursor.close()
+        self._table_ready = True
+
+    def append(self, changes, cursor=None):
+        """
+        记录变更（多条变更合并为一条 INSERT）
+
+        参数:
+            changes: [(租户库名, 动作, 图纸ID, 产品号, 原产品号, PDF路径, 占用空间变化), ...]
+            cursor: 写操作所在事务的游标（提交前调用）：变更行与写操作一起提交或回滚，写入失败时异常向上抛出；
+                    为None时在写操作提交后调用，使用单独的主库连接写入
+        """
+        if not changes:
+            return
+        sql = (f"INSERT INTO {self.table} "
+               "(tenant_db, action, drawing_id, product_code, old_product_code, pdf_path, storage_delta, origin) "
+               "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
+        rows = [(tenant_db or '', *change, self.origin) for tenant_db, *change in changes]
+        if cursor is not None:
+            self.ensure_table()
+            cursor.executemany(sql, rows)
+            return
+        try:
+            self.ensure_table()
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(sql, rows)
+                cursor.close()
+        except Exception as e:
+            # 写入失败时其他进程要等缓存过期才能看到本次修改
+            print(f"⚠️  写入变更日志失败: {e}")
+
+    # ==================== 读取 ====================
+
+    def since(self, tenant_db, after_id, limit):
+        """
+        租户在 after_id 之后的图纸变更（断线重连时补发，不含占用空间变化）
+
+        返回:
+            list: 事件列表；after_id 之后的行已被清理或超过 limit 条时返回None（客户端应整体刷新）
+        """
+        self.ensure_table()
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MIN(id), 0) FROM drawing_changes")
+            oldest = cursor.fetchone()[0]
+            if oldest and after_id < oldest - 1:
+                cursor.close()
+                return None
+            cursor.execute(
+                f"SELECT {self._columns()} FROM drawing_changes "
+                f"WHERE tenant_db = %s AND id > %s AND action <> 'storage' ORDER BY id LIMIT %s",
+                (tenant_db or '', after_id, limit + 1)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        if len(rows) > limit:
+            return None
+        return [self._event(row) for row in rows]
+
+    def last_id(self):
+        """本进程已处理到的变更ID（尚未开始轮询时为None）"""
+        return self._last_id
+
+    @staticmethod
+    def _columns():
+        return ("id, tenant_db, action, drawing_id, product_code, old_product_code, pdf_path, storage_delta, "
+                "origin, UNIX_TIMESTAMP(created_at)")
+
+    @staticmethod
+    def _event(row):
+        event = dict(zip(EVENT_FIELDS, row))
+        event['tenant_db'] = event['tenant_db'] or None
+        event['at'] = float(event['at'])
+        return event
+
+    # ==================== 轮询 ====================
+
+    def start(self):
+        """启动后台轮询线程（已启动时不做任何事；fork 后的子进程首次调用时启动）"""
+        if self._poller is not None:
+            return
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poller.start()
+
+    def poll_async(self):
+        """
+        在后台线程读取一次新的变更（不常驻轮询的进程使用，如桌面端窗口获得焦点时；
+        已在轮询或正在读取时不做任何事）
+        """
+        if self._poller is not None or not self._sync_lock.acquire(blocking=False):
+            return
+
+        def worker():
+            try:
+                while self.poll_once():
+                    pass
+            except pymysql.MySQLError as e:
+                print(f"⚠️  读取变更日志失败: {e}")
+            finally:
+                self._sync_lock.release()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def poll_once(self, batch_size=1000):
+        """
+        读取并处理新的变更
+
+        返回:
+            int: 处理的行数
+        """
+        self.ensure_table()
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            if self._last_id is None:
+                # 首次轮询从当前位置开始（之前的变更已反映在数据库中，缓存此时为空）
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM drawing_changes")
+                self._last_id = cursor.fetchone()[0]
+                cursor.close()
+                return 0
+            cursor.execute(
+                f"SELECT {self._columns()} FROM drawing_changes WHERE id > %s ORDER BY id LIMIT %s",
+                (self._last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if rows and rows[0][0] > self._last_id + 1:
+                # 中间的ID可能只是回滚/并发留下的空洞；只有比最早保留的行还旧时才确认丢失
+                cursor.execute("SELECT COALESCE(MIN(id), 0) FROM drawing_changes")
+                if self._last_id < cursor.fetchone()[0] - 1 and self.on_gap:
+                    self.on_gap()
+            cursor.close()
+        for row in rows:
+            event = self._event(row)
+            try:
+                self.on_change(event, event['origin'] == self.origin)
+            except Exception as e:
+                print(f"⚠️  处理变更失败 {event['id']}: {e}")
+            self._last_id = event['id']
+        return len(rows)
+
+    def prune(self):
+        """删除超过保留时间的变更"""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM drawing_changes WHERE created_at < NOW(3) - INTERVAL %s SECOND LIMIT 10000",
+                (self.retention_seconds,)
+            )
+            cursor.close()
+
+    def _poll_loop(self):
+        last_prune = time.monotonic()
+        failures = 0
+        while True:
+            try:
+                # 有积压时立即继续读取
+                if self.poll_once() == 0:
+                    time.sleep(self.poll_seconds)
+                failures = 0
+                if time.monotonic() - last_prune > 3600:
+                    last_prune = time.monotonic()
+                    self.prune()
+            except pymysql.MySQLError as e:
+                failures += 1
+                # 数据库不可用时逐步放慢重试，只在首次失败时输出
+                if failures == 1:
+                    print(f"⚠️  读取变更日志失败: {e}")
+                time.sleep(min(self.poll_seconds * failures, 30))
+
+    def _new_origin(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:16]}"
+
+    def _after_fork(self):
+        """子进程使用新的来源标识，从父进程的位置继续轮询"""
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._poller = None
+        self._new_origin()
@@ -0,0 +1,301 @@
+"""
+数据库连接池
+按数据库名（主库/各租户库）分组复用 pymysql 连接，避免每次请求重新握手
+"""
+import time
+import threading
+from collections import deque
+import pymysql
+from utils.fork_safe import register_after_fork
+
+
+class PoolExhaustedError(Exception):
+    """连接池已满且等待超时"""
+
+
+class _PooledConnection:
+    """池内连接记录：原始连接 + 创建时间 + 最近归还时间"""
+
+    __slots__ = ('conn', 'database', 'created_at', 'last_used')
+
+    def __init__(self, conn, database):
+        self.conn = conn
+        self.database = database
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    按数据库名分组的连接池（线程安全）
+    - 每个库最多 max_per_db 个连接，全局最多 max_total 个连接
+    - 空闲超过 idle_timeout 秒的连接被回收
+    - 存活超过 max_lifetime 秒的连接不再复用
+    - 取出时若空闲超过 ping_after 秒，先 ping 检查连接健康
+    """
+
+    def __init__(self, connection_config, max_per_db=10, max_total=50,
+                 idle_timeout=300, max_lifetime=3600, ping_after=5,
+                 acquire_timeout=10):
+        self.connection_config = dict(connection_config)
+        self.max_per_db = max_per_db
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.acquire_timeout = acquire_timeout
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = {}        # database -> deque[_PooledConnection]（右端最新）
+        self._in_use = {}      # id(conn) -> _PooledConnection
+        self._counts = {}      # database -> 该库已打开连接数（空闲 + 使用中）
+        self._total = 0
+        self._last_evict = time.monotonic()
+
+        # 统计
+        self.created_count = 0
+        self.reused_count = 0
+        self.closed_count = 0
+        register_after_fork(self)
+
+    # ==================== 对外接口 ====================
+
+    def acquire(self, database=None):
+        """
+        从池中取出指定数据库的连接，必要时新建
+
+        参数:
+            database: 数据库名，None 表示使用 connection_config 中的默认库
+
+        返回:
+            pymysql.connections.Connection
+        """
+        database = database or self.connection_config.get('database')
+        self._maybe_evict()
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._lock:
+                record = self._take_idle(database)
+                if record is None and not self._reserve_slot(database):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(f"数据库连接池已满: {database}")
+                    self._available.wait(remaining)
+                    continue
+
+            if record is not None:
+                # 健康检查放在锁外，避免阻塞其他线程
+                if self._is_healthy(record):
+                    with self._lock:
+                        self._in_use[id(record.conn)] = record
+                        self.reused_count += 1
+                    return record.conn
+                self._discard(record)
+                continue
+
+            # 已预留名额，新建连接
+            try:
+                record = _PooledConnection(self._connect(database), database)
+            except Exception:
+                with self._lock:
+                    self._release_slot(database)
+                raise
+            with self._lock:
+                self._in_use[id(record.conn)] = record
+                self.created_count += 1
+            return record.conn
+
+    def release(self, conn, discard=False):
+        """
+        归还连接
+
+        参数:
+            conn: acquire 取得的连接
+            discard: 为True时直接关闭（连接已出错或状态未知）
+        """
+        with self._lock:
+            record = self._in_use.pop(id(conn), None)
+        if record is None:
+            # 非池内连接，直接关闭
+            self._close_quietly(conn)
+            return
+
+        now = time.monotonic()
+        if discard or not conn.open or now - record.created_at > self.max_lifetime:
+            self._discard(record)
+            return
+
+        record.last_used = now
+        with self._lock:
+            self._idle.setdefault(record.database, deque()).append(record)
+            self._available.notify()
+
+    def prewarm(self, database, count):
+        """
+        预先建立连接放入空闲队列，直到该库共有 count 个连接
+        （不挤占其他库的空闲连接，达到上限即停止）
+
+        返回:
+            int: 新建的连接数
+        """
+        database = database or self.connection_config.get('database')
+        created = 0
+        while True:
+            with self._lock:
+                opened = self._counts.get(database, 0)
+                if (opened >= min(count, self.max_per_db)
+                        or self._total >= self.max_total):
+                    return created
+                self._counts[database] = opened + 1
+                self._total += 1
+            try:
+                record = _PooledConnection(self._connect(database), database)
+            except Exception:
+                with self._lock:
+                    self._release_slot(database)
+                raise
+            with self._lock:
+                self._idle.setdefault(database, deque()).append(record)
+                self.created_count += 1
+                self._available.notify()
+            created += 1
+
+    def evict_idle(self):
+        """回收空闲超时或超过最大存活时间的连接"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for database, queue in self._idle.items():
+                keep = deque()
+                for record in queue:
+                    if (now - record.last_used > self.idle_timeout
+                            or now - record.created_at > self.max_lifetime):
+                        expired.append(record)
+                    else:
+                        keep.append(record)
+                self._idle[database] = keep
+        for record in expired:
+            self._discard(record)
+        return len(expired)
+
+    def _maybe_evict(self):
+        """按空闲超时的一半为周期顺带执行回收"""
+        now = time.monotonic()
+        if now - self._last_evict < self.idle_timeout / 2:
+            return
+        self._last_evict = now
+        self.evict_idle()
+
+    def close_all(self):
+        """关闭所有空闲连接（使用中的连接归还时会按正常流程处理）"""
+        with self._lock:
+            records = [r for queue in self._idle.values() for r in queue]
+            self._idle.clear()
+        for record in records:
+            self._discard(record)
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._lock:
+            return {
+                'total': self._total,
+                'in_use': len(self._in_use),
+                'idle': sum(len(q) for q in self._idle.values()),
+                'databases': dict(self._counts),
+                'created': self.created_count,
+                'reused': self.reused_count,
+                'closed': self.closed_count,
+            }
+
+    # ==================== 内部实现 ====================
+
+    def _after_fork(self):
+        """子进程中丢弃继承自父进程的连接（不关闭，套接字仍归父进程使用）"""
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = {}
+        self._in_use = {}
+        self._counts = {}
+        self._total = 0
+        # 统计从零开始（各工作进程的指标会相加）
+        self.created_count = self.reused_count = self.closed_count = 0
+
+    def _connect(self, database):
+        cfg = dict(self.connection_config)
+        if database:
+            cfg['database'] = database
+        return pymysql.connect(**cfg)
+
+    def _take_idle(self, database):
+        """（持锁调用）取出该库最近归还的空闲连接"""
+        queue = self._idle.get(database)
+        if queue:
+            return queue.pop()
+        return None
+
+    def _reserve_slot(self, database):
+        """（持锁调用）为新连接预留名额，满额时尝试腾出其他库的空闲连接"""
+        if self._counts.get(database, 0) >= self.max_per_db:
+            return False
+        if self._total >= self.max_total:
+            victim = self._oldest_idle_other(database)
+            if victim is None:
+                return False
+            # 腾出名额（close 只发送 QUIT 包，不等待服务器响应）
+            self._release_slot(victim.database)
+            self._close_quietly(victim.conn)
+            self.closed_count += 1
+        self._counts[database] = self._counts.get(database, 0) + 1
+        self._total += 1
+        return True
+
+    def _oldest_idle_other(self, database):
+        """（持锁调用）找出其他库中最久未使用的空闲连接并移出队列"""
+        oldest_db = None
+        oldest = None
+        for db, queue in self._idle.items():
+            if db == database or not queue:
+                continue
+            if oldest is None or queue[0].last_used < oldest.last_used:
+                oldest_db, oldest = db, queue[0]
+        if oldest is not None:
+            self._idle[oldest_db].popleft()
+        return oldest
+
+    def _release_slot(self, database):
+        """（持锁调用）释放名额"""
+        count = self._counts.get(database, 0) - 1
+        if count > 0:
+            self._counts[database] = count
+        else:
+            self._counts.pop(database, None)
+        self._total -= 1
+        self._available.notify()
+
+    def _is_healthy(self, record):
+        now = time.monotonic()
+        if now - record.created_at > self.max_lifetime:
+            return False
+        if now - record.last_used > self.idle_timeout:
+            return False
+        if now - record.last_used >= self.ping_after:
+            try:
+                record.conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, record):
+        self._close_quietly(record.conn)
+        with self._lock:
+            self._release_slot(record.database)
+            self.closed_count += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
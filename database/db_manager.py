@@ -5,9 +5,27 @@
 import pymysql
 from contextlib import contextmanager
 import time
+import json
+import base64
 import hashlib
 import threading
+import functools
+import hmac
+import os
 from config import config
+from database.connection_pool import ConnectionPool
+from database.query_cache import LRUCache
+from database.fuzzy_index import FuzzyIndexManager, collation_key
+from database.tenant_stats import TenantStatsManager
+from database.change_feed import ChangeFeed
+from database.change_log import ChangeLog
+from database.tenant_registry import TenantRegistry, DrawingScope
+from database.last_login import LastLoginRecorder
+from database.schema_probe import SchemaProbe
+from utils.event_broker import event_broker
+from utils.metrics import metrics
+from utils.request_trace import request_tracer
+from utils.password_hasher import password_hasher
 try:
     # Web 场景下从会话读取激活码/租户信息
     from flask import has_request_context, session
@@ -17,6 +35,35 @@ except Exception:
     session = {}
 
 
+# 数据库指标（按操作统计耗时，不含缓存命中）
+DB_QUERY_SECONDS = metrics.histogram(
+    'db_query_duration_seconds', '数据库操作耗时（秒，含取连接）', ['operation'])
+DB_ACQUIRE_SECONDS = metrics.histogram(
+    'db_connection_acquire_seconds', '取得数据库连接的等待时间（秒）',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+FUZZY_SEARCH_TOTAL = metrics.counter(
+    'fuzzy_search_total', '模糊查询次数（path=index 内存索引 / sql 回退到数据库）', ['path'])
+
+
+@contextmanager
+def _timed_operation(operation):
+    """把耗时记入 db_query_duration_seconds{operation=...}，操作名同时记入慢请求日志"""
+    request_tracer.tag('db_operations', operation)
+    with DB_QUERY_SECONDS.time(operation=operation):
+        yield
+
+
+def _timed(operation):
+    """装饰器：按 _timed_operation 记录整个方法的耗时"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timed_operation(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class DatabaseManager:
     """数据库管理器 - 单例模式"""
     
@@ -45,6 +92,80 @@ class DatabaseManager:
             'autocommit': False  # 手动控制事务
         }
         
+        # 连接池（按数据库名分组，主库与各租户库共用）
+        self.pool = None
+        if config.DB_POOL_ENABLED:
+            self.pool = ConnectionPool(
+                self.connection_config,
+                max_per_db=config.DB_POOL_MAX_PER_DB,
+                max_total=config.DB_POOL_MAX_TOTAL,
+                idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                ping_after=config.DB_POOL_PING_AFTER,
+                acquire_timeout=config.DB_POOL_ACQUIRE_TIMEOUT
+            )
+        
+        # 产品号精确查询缓存，key 为 (租户库名, 产品号)
+        self.code_cache = None
+        if config.QUERY_CACHE_ENABLED:
+            self.code_cache = LRUCache(
+                max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+                ttl=config.QUERY_CACHE_TTL
+            )
+        
+        # 模糊查询内存索引（按租户懒加载）
+        self.fuzzy_index = None
+        if config.FUZZY_INDEX_ENABLED:
+            self.fuzzy_index = FuzzyIndexManager(self._load_fuzzy_rows)
+        
+        # 租户注册表（库名缓存、建库去重、连接预热）
+        self._shared_ready = False
+        self._shared_lock = threading.Lock()
+        self.tenants = TenantRegistry(
+            self._tenant_db_name,
+            self._provision_tenant,
+            pool=self.pool,
+            warmers=[self.fuzzy_index.warm] if self.fuzzy_index else None,
+            route=self.physical_db
+        )
+        
+        # 租户统计（内存中增量维护）
+        self.stats = None
+        if config.STATS_ENABLED:
+            self.stats = TenantStatsManager(self._load_stats_seed, broker=event_broker)
+        
+        # 管理端分页总数缓存，key 为 (租户库名, 写操作代数, 筛选关键词)
+        self.count_cache = LRUCache(max_entries=1000, ttl=config.ADMIN_COUNT_TTL)
+        self._write_generation = {}   # 租户库名 -> 写操作代数（每次写入后递增，使总数缓存失效）
+        self._uncommitted = {}        # 连接id -> 已写入事务、待提交后同步的变更
+        
+        # 跨进程变更日志：其他工作进程/桌面端的写操作通过主库 drawing_changes 表同步到本进程的缓存
+        self.change_log = None
+        if config.CHANGE_LOG_ENABLED:
+            self.change_log = ChangeLog(self.get_connection, self._on_logged_change,
+                                        on_gap=self._on_change_log_gap)
+        
+        # 图纸变更事件推送（有变更日志时推送所有进程的写入）
+        self.change_feed = None
+        if config.CHANGE_FEED_ENABLED:
+            self.change_feed = ChangeFeed(event_broker, change_log=self.change_log)
+        
+        # 登录成功结果缓存，key 为用户名，值含密码的 HMAC（密钥每个进程随机生成，不保存密码本身）
+        self.login_cache = None
+        if config.LOGIN_CACHE_TTL:
+            self.login_cache = LRUCache(max_entries=config.LOGIN_CACHE_MAX_ENTRIES, ttl=config.LOGIN_CACHE_TTL)
+        self._login_cache_key = os.urandom(32)
+        # 最后登录时间批量写入
+        self.last_login = LastLoginRecorder(self.get_connection)
+        
+        # 主库表结构（旧库缺少的列），每个进程探测一次
+        self.schema = SchemaProbe(self.get_connection, config.DB_NAME)
+        # 激活码校验结果缓存（有效/无效分别设置过期时间）
+        self.activation_cache = LRUCache(max_entries=config.ACTIVATION_CACHE_MAX_ENTRIES,
+                                         ttl=config.ACTIVATION_CACHE_TTL)
+        
+        metrics.register_collector(self._collect_metrics)
+        
         self._initialized = True
         # 多租户：线程覆盖（桌面/脚本可用）
         self._tenant_override = threading.local()
@@ -63,42 +184,297 @@ class DatabaseManager:
                 cursor.close()
             if config.DEBUG:
                 print(f"✅ 数据库连接成功: {config.DB_HOST}")
+            self.schema.probe()
         except Exception as e:
             print(f"❌ 数据库连接失败: {e}")
     
+    def _acquire(self, conn_cfg):
+        """按连接配置取得连接：启用连接池时从池中取出，否则新建"""
+        with DB_ACQUIRE_SECONDS.time(), request_tracer.span('db_connect'):
+            if self.pool:
+                return self.pool.acquire(conn_cfg.get('database'))
+            return pymysql.connect(**conn_cfg)
+    
+    def _release(self, connection, discard=False):
+        """归还连接：启用连接池时放回池中，否则关闭"""
+        if self.pool:
+            self.pool.release(connection, discard=discard)
+        else:
+            connection.close()
+    
     @contextmanager
-    def get_connection(self):
-        """
-        获取数据库连接（上下文管理器）
-        使用with语句自动管理连接
-        """
-        connection = None
+    def _managed(self, connection):
+        """统一的事务与归还处理：正常结束提交，异常回滚，出错的连接不再复用"""
+        discard = False
+        committed = None
         try:
-            connection = pymysql.connect(**self.connection_config)
-            yield connection
-            connection.commit()
+            # 取得连接到提交完成的时间计为数据库操作（慢请求日志）
+            with request_tracer.span('db_query'):
+                yield connection
+                connection.commit()
+            committed = self._uncommitted.pop(id(connection), None)
         except Exception as e:
-            if connection:
+            self._uncommitted.pop(id(connection), None)
+            if isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                discard = True
+            try:
                 connection.rollback()
+            except Exception:
+                discard = True
             raise e
         finally:
-            if connection:
-                connection.close()
+            self._release(connection, discard)
+        # 提交后再同步本进程的缓存与索引，避免并发查询把旧值重新写回
+        for change in committed or ():
+            self._apply_change(*change)
+    
+    def _collect_metrics(self):
+        """连接池与缓存的统计（供 /metrics 输出）"""
+        samples = []
+        if self.pool:
+            pool_stats = self.pool.stats()
+            for state in ('idle', 'in_use'):
+                samples.append(('db_pool_connections', 'gauge', '连接池中的连接数',
+                                {'state': state}, pool_stats[state]))
+            for event in ('created', 'reused', 'closed'):
+                samples.append((f'db_pool_{event}_total', 'counter', f'连接池累计 {event} 的连接数',
+                                {}, pool_stats[event]))
+        caches = {'code': self.code_cache, 'count': self.count_cache}
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            cache_stats = cache.stats()
+            samples.append(('cache_hits_total', 'counter', '缓存命中次数', {'cache': name}, cache_stats['hits']))
+            samples.append(('cache_misses_total', 'counter', '缓存未命中次数', {'cache': name}, cache_stats['misses']))
+            samples.append(('cache_entries', 'gauge', '缓存条目数', {'cache': name}, cache_stats['size']))
+        return samples
+    
+    @contextmanager
+    def get_connection(self):
+        """
+        获取数据库连接（上下文管理器）
+        使用with语句自动管理连接
+        """
+        connection = self._acquire(self.connection_config)
+        with self._managed(connection) as conn:
+            yield conn
 
     # ==================== 多租户支持（按激活码独立数据库） ====================
     def _normalize_code(self, code: str) -> str:
         return (code or '').strip().upper().replace('-', '')
 
     def tenant_db_from_code(self, code: str) -> str:
-        """根据激活码生成稳定的租户数据库名"""
+        """根据激活码生成稳定的租户数据库名（结果缓存在租户注册表中）"""
+        return self.tenants.db_name(code)
+
+    def _tenant_db_name(self, code: str) -> str:
         norm = self._normalize_code(code)
         h = hashlib.sha256(norm.encode()).hexdigest()[:8]
         return f"{config.DB_NAME}_t_{h}"
 
+    def tenant_id(self, tenant_db: str) -> str:
+        """共享表模式下租户在 tenant_id 列中的取值（租户库名去掉前缀后的哈希）"""
+        prefix = f"{config.DB_NAME}_t_"
+        return tenant_db[len(prefix):] if tenant_db.startswith(prefix) else tenant_db
+
+    def physical_db(self, tenant_db):
+        """租户数据实际所在的数据库（共享表模式下所有租户共用 TENANT_SHARED_DB）"""
+        if tenant_db and config.TENANT_STORAGE_MODE == 'shared':
+            return config.TENANT_SHARED_DB
+        return tenant_db
+
+    def drawing_scope(self, activation_code: str | None = None):
+        """
+        当前租户在 drawings 表中的范围，拼接SQL时使用（见 DrawingScope）
+        
+        参数:
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        
+        返回:
+            DrawingScope: 独立库模式或主库下为空范围
+        """
+        tenant_db = self.resolve_tenant_db(activation_code)
+        if tenant_db and config.TENANT_STORAGE_MODE == 'shared':
+            return DrawingScope(self.tenant_id(tenant_db))
+        return DrawingScope()
+
     def set_tenant_override(self, tenant_db: str | None):
         """显式设置当前线程的租户数据库覆盖（用于桌面/脚本）"""
         self._tenant_override.value = tenant_db
 
+    def get_tenant_override(self):
+        """当前线程的租户数据库覆盖（未设置时返回None）"""
+        return getattr(self._tenant_override, 'value', None)
+
+    def resolve_tenant_db(self, activation_code: str | None = None):
+        """
+        解析当前租户数据库名（与 get_tenant_connection 的优先级一致）
+        
+        返回:
+            str: 租户库名，无租户信息时返回None（即主库）
+        """
+        with request_tracer.span('tenant_resolve'):
+            if activation_code:
+                return self.tenant_db_from_code(activation_code)
+            if getattr(self._tenant_override, 'value', None):
+                return self._tenant_override.value
+            if has_request_context():
+                tenant_db = session.get('tenant_db')
+                if not tenant_db and session.get('activation_code'):
+                    tenant_db = self.tenant_db_from_code(session.get('activation_code'))
+                return tenant_db
+            return None
+
+    def invalidate_code_cache(self, *product_codes, activation_code: str | None = None):
+        """
+        使当前租户下指定产品号的查询缓存失效
+        
+        参数:
+            product_codes: 一个或多个产品号
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        """
+        if self.code_cache is None:
+            return
+        self._drop_cached_codes(self.resolve_tenant_db(activation_code), product_codes)
+
+    def _drop_cached_codes(self, tenant_db, product_codes):
+        if self.code_cache is None:
+            return
+        for product_code in product_codes:
+            if product_code:
+                self.code_cache.delete((tenant_db, product_code.casefold()))
+
+    def notify_drawing_changed(self, action, drawing_id=None, product_code=None, pdf_path=None,
+                               old_product_code=None, activation_code: str | None = None, storage_delta=0,
+                               cursor=None):
+        """
+        图纸写操作后调用，同步本进程的查询缓存与模糊查询索引，并写入变更日志通知其他进程
+        
+        参数:
+            action: 'insert' / 'update' / 'delete'
+            drawing_id: 图纸ID（未知时为None，按产品号定位）
+            product_code: 产品号（更新时为新产品号）
+            pdf_path: PDF路径（删除时可省略）
+            old_product_code: 更新前的产品号（产品号被修改时提供）
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+            storage_delta: 租户文件夹PDF占用空间的变化（字节），如上传为新文件大小、替换为新旧文件大小之差
+            cursor: 写操作所在事务的游标（在 get_tenant_connection 的 with 块内、提交前调用）：
+                    变更日志随写操作一起提交，本进程在连接提交后同步；为None时须在提交后调用
+        """
+        change = (self.resolve_tenant_db(activation_code), action, drawing_id, product_code,
+                  old_product_code, pdf_path, storage_delta)
+        if cursor is not None:
+            self._log_changes(cursor, [change])
+            return
+        self._apply_change(*change)
+        if self.change_log:
+            self.change_log.append([change])
+
+    def _log_changes(self, cursor, changes):
+        """（提交前调用）变更日志写入当前事务，本进程的同步由 _managed 在提交后进行"""
+        if self.change_log:
+            self.change_log.append(changes, cursor)
+        self._uncommitted.setdefault(id(cursor.connection), []).extend(changes)
+
+    def notify_storage_changed(self, storage_delta, activation_code: str | None = None):
+        """
+        租户文件夹PDF占用空间变化（未伴随图纸写操作时，如删除记录后在后台清理文件）
+        
+        参数:
+            storage_delta: 变化的字节数（删除为负数）
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        """
+        if not storage_delta:
+            return
+        change = (self.resolve_tenant_db(activation_code), 'storage', None, None, None, None, storage_delta)
+        self._apply_change(*change)
+        if self.change_log:
+            self.change_log.append([change])
+
+    def _apply_change(self, tenant_db, action, drawing_id, product_code, old_product_code, pdf_path,
+                      storage_delta=0):
+        """按一条变更同步本进程的缓存、统计、索引与推送"""
+        if self.stats and storage_delta:
+            self.stats.add_storage(tenant_db, storage_delta)
+        if action == 'storage':
+            return
+        self._drop_cached_codes(tenant_db, (old_product_code, product_code))
+        self._write_generation[tenant_db] = self._write_generation.get(tenant_db, 0) + 1
+        if self.stats:
+            self.stats.record(tenant_db, action, product_code)
+        if self.change_feed and not self.change_log:
+            self.change_feed.publish(tenant_db, action, drawing_id, product_code, pdf_path, old_product_code)
+        if self.fuzzy_index:
+            if action == 'delete':
+                self.fuzzy_index.remove(tenant_db, drawing_id, product_code)
+            else:
+                self.fuzzy_index.upsert(tenant_db, drawing_id, product_code, pdf_path)
+
+    def _on_logged_change(self, event, local):
+        """变更日志回调：同步其他进程的写操作（本进程的写入已在提交时同步），推送图纸变更"""
+        if not local:
+            self._apply_change(event['tenant_db'], event['action'], event['drawing_id'], event['product_code'],
+                               event['old_product_code'], event['pdf_path'], event['storage_delta'])
+        if self.change_feed and event['action'] != 'storage':
+            self.change_feed.publish_logged(event)
+
+    def _on_change_log_gap(self):
+        """变更日志中有未读的行已被清理，无法逐条同步时清空本进程的缓存"""
+        print("⚠️  变更日志不连续，清空本进程缓存")
+        if self.code_cache is not None:
+            self.code_cache.clear()
+        self.count_cache.clear()
+        if self.stats:
+            self.stats.invalidate()
+        if self.fuzzy_index:
+            self.fuzzy_index.invalidate()
+
+    def start_change_log(self):
+        """开始常驻轮询变更日志（Web工作进程启动后调用；重复调用无影响）"""
+        if self.change_log:
+            self.change_log.start()
+
+    def sync_change_log(self):
+        """在后台读取一次变更日志（桌面端启动和窗口获得焦点时调用，代替常驻轮询）"""
+        if self.change_log:
+            self.change_log.poll_async()
+
+    def _load_fuzzy_rows(self, tenant_db, limit):
+        """加载租户全部产品号（供模糊查询索引使用，在后台线程执行），按 product_code 排序，索引沿用数据库的排序"""
+        self.set_tenant_override(tenant_db)
+        try:
+            scope = self.drawing_scope()
+            with self.get_tenant_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT id, product_code, pdf_path FROM drawings{scope.where} "
+                               f"ORDER BY product_code LIMIT %s",
+                               scope.params + (limit,))
+                rows = cursor.fetchall()
+                cursor.close()
+                return rows
+        finally:
+            self.set_tenant_override(None)
+
+    def _load_stats_seed(self, tenant_db, days):
+        """读取租户统计的初始值：图纸总数与最近几天的每日新增数"""
+        self.set_tenant_override(tenant_db)
+        try:
+            scope = self.drawing_scope()
+            with self.get_tenant_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT COUNT(*) FROM drawings{scope.where}", scope.params)
+                total = cursor.fetchone()[0]
+                cursor.execute(
+                    f"SELECT DATE(created_at), COUNT(*) FROM drawings "
+                    f"WHERE {scope.filter}created_at >= CURDATE() - INTERVAL %s DAY GROUP BY DATE(created_at)",
+                    scope.params + (days,)
+                )
+                per_day = {str(day): count for day, count in cursor.fetchall()}
+                cursor.close()
+                return (total, per_day)
+        finally:
+            self.set_tenant_override(None)
+
     @contextmanager
     def get_tenant_connection(self, activation_code: str | None = None):
         """
@@ -107,63 +483,96 @@ class DatabaseManager:
         - 其次使用当前会话中的 session['tenant_db'] 或 session['activation_code']
         - 再次使用线程覆盖（desktop场景）
         - 若均不可用，回退到主库
-        - 若连接报 Unknown database，则自动创建租户库后重试
-        """
-        tenant_db = None
-        # 解析激活码和租户库名
-        if activation_code:
-            tenant_db = self.tenant_db_from_code(activation_code)
-        elif getattr(self._tenant_override, 'value', None):
-            tenant_db = self._tenant_override.value
-        elif has_request_context():
-            tenant_db = session.get('tenant_db')
-            if not tenant_db and session.get('activation_code'):
-                activation_code = session.get('activation_code')
-                tenant_db = self.tenant_db_from_code(activation_code)
+        - 共享表模式下所有租户连接 TENANT_SHARED_DB，SQL 需按 drawing_scope() 限定租户
+        - 若连接报 Unknown database，则自动创建租户库后重试（同一租户只建一次）
+        - 首次连接某租户时在后台预建连接、加载索引
+        """
+        tenant_db = self.resolve_tenant_db(activation_code)
+        if not activation_code and not getattr(self._tenant_override, 'value', None) and has_request_context():
+            activation_code = session.get('activation_code')
 
         conn_cfg = dict(self.connection_config)
         if tenant_db:
-            conn_cfg['database'] = tenant_db
+            conn_cfg['database'] = self.physical_db(tenant_db)
+        first_visit = bool(tenant_db) and not self.tenants.is_provisioned(tenant_db)
 
-        connection = None
+        # 首次尝试连接
         try:
-            # 首次尝试连接
-            try:
-                connection = pymysql.connect(**conn_cfg)
-            except pymysql.err.OperationalError as oe:
-                # Unknown database
-                if getattr(oe, 'args', None) and oe.args and oe.args[0] == 1049 and tenant_db:
-                    # 有激活码时自动创建租户库并重试
-                    code_to_use = activation_code
-                    if not code_to_use and has_request_context():
-                        code_to_use = session.get('activation_code')
-                    if code_to_use:
-                        try:
-                            self.ensure_tenant_database(code_to_use)
-                            connection = pymysql.connect(**conn_cfg)
-                        except Exception:
-                            # 创建失败则抛出原错误
-                            raise oe
-                    else:
-                        # 没有激活码无法创建，抛出原错误
+            connection = self._acquire(conn_cfg)
+        except pymysql.err.OperationalError as oe:
+            # Unknown database
+            if getattr(oe, 'args', None) and oe.args and oe.args[0] == 1049 and tenant_db:
+                # 有激活码时自动创建租户库并重试
+                code_to_use = activation_code
+                if not code_to_use and has_request_context():
+                    code_to_use = session.get('activation_code')
+                if code_to_use:
+                    self.tenants.forget(tenant_db)
+                    try:
+                        self.ensure_tenant_database(code_to_use)
+                        connection = self._acquire(conn_cfg)
+                    except Exception:
+                        # 创建失败则抛出原错误
                         raise oe
                 else:
-                    # 其他错误直接抛出
-                    raise
+                    # 没有激活码无法创建，抛出原错误
+                    raise oe
+            else:
+                # 其他错误直接抛出
+                raise
 
-            # 正常使用连接
-            yield connection
-            connection.commit()
-        except Exception as e:
-            if connection:
-                connection.rollback()
-            raise e
-        finally:
-            if connection:
-                connection.close()
+        if first_visit:
+            self.tenants.mark_provisioned(tenant_db)
+            self.tenants.warm_up(tenant_db)
+
+        # 正常使用连接
+        with self._managed(connection) as conn:
+            yield conn
 
     def ensure_tenant_database(self, activation_code: str):
-        """创建并初始化租户数据库（若不存在）"""
+        """创建并初始化租户数据库（若不存在；已确认存在的租户直接返回库名）"""
+        return self.tenants.ensure(activation_code)
+
+    def _provision_tenant(self, activation_code: str):
+        """租户注册表的建库函数：共享表模式下只需确保共享库存在"""
+        if config.TENANT_STORAGE_MODE == 'shared':
+            self.ensure_shared_database()
+        else:
+            self._create_tenant_database(activation_code)
+
+    def ensure_shared_database(self):
+        """创建共享表模式使用的数据库与 drawings 表（若不存在，每个进程只执行一次）"""
+        with self._shared_lock:
+            if self._shared_ready:
+                return config.TENANT_SHARED_DB
+            server_cfg = dict(self.connection_config)
+            server_cfg.pop('database', None)
+            with pymysql.connect(**server_cfg) as conn:
+                cur = conn.cursor()
+                cur.execute(f"CREATE DATABASE IF NOT EXISTS `{config.TENANT_SHARED_DB}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+                cur.execute(f"USE `{config.TENANT_SHARED_DB}`")
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS drawings (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        tenant_id VARCHAR(64) CHARACTER SET ascii NOT NULL,
+                        product_code VARCHAR(100) NOT NULL,
+                        pdf_path VARCHAR(500) NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        UNIQUE KEY uk_tenant_code (tenant_id, product_code),
+                        KEY idx_tenant_id (tenant_id, id),
+                        KEY idx_tenant_created (tenant_id, created_at)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                    """
+                )
+                cur.close()
+                conn.commit()
+            self._shared_ready = True
+            return config.TENANT_SHARED_DB
+
+    def _create_tenant_database(self, activation_code: str):
+        """创建租户数据库与表（CREATE ... IF NOT EXISTS）"""
         tenant_db = self.tenant_db_from_code(activation_code)
         server_cfg = dict(self.connection_config)
         server_cfg.pop('database', None)
@@ -200,21 +609,34 @@ class DatabaseManager:
         """
         start_time = time.time()
         
+        # 先查缓存（只缓存命中结果，未找到的产品号每次都回源，避免新增后查不到）
+        cache_key = None
+        if self.code_cache is not None:
+            # 产品号比较不区分大小写（utf8mb4_unicode_ci），缓存键与之保持一致
+            cache_key = (self.resolve_tenant_db(), product_code.casefold())
+            cached = self.code_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+        
         try:
-            with self.get_tenant_connection() as conn:
+            scope = self.drawing_scope()
+            with _timed_operation('search_by_code'), self.get_tenant_connection() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)  # 返回字典格式
                 
-                sql = """
+                sql = f"""
                     SELECT id, product_code, pdf_path
                     FROM drawings
-                    WHERE product_code = %s
+                    WHERE {scope.filter}product_code = %s
                     LIMIT 1
                 """
                 
-                cursor.execute(sql, (product_code,))
+                cursor.execute(sql, scope.params + (product_code,))
                 result = cursor.fetchone()
                 cursor.close()
                 
+                if result and cache_key is not None:
+                    self.code_cache.set(cache_key, dict(result))
+                
                 # 记录查询时间
                 query_time = (time.time() - start_time) * 1000
                 if config.DEBUG:
@@ -242,20 +664,36 @@ class DatabaseManager:
         
         start_time = time.time()
         
+        # 优先使用内存索引（索引未就绪时返回None，回退到SQL）
+        if self.fuzzy_index:
+            try:
+                results = self.fuzzy_index.search(self.resolve_tenant_db(), keyword, limit)
+            except Exception as e:
+                print(f"❌ 模糊查询索引失败: {e}")
+                results = None
+            if results is not None:
+                FUZZY_SEARCH_TOTAL.inc(path='index')
+                query_time = (time.time() - start_time) * 1000
+                if config.DEBUG:
+                    print(f"⚡ 模糊查询耗时(索引): {query_time:.2f}ms, 找到 {len(results)} 条")
+                return results
+        
+        FUZZY_SEARCH_TOTAL.inc(path='sql')
         try:
-            with self.get_tenant_connection() as conn:
+            scope = self.drawing_scope()
+            with _timed_operation('search_fuzzy'), self.get_tenant_connection() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
                 
-                sql = """
+                sql = f"""
                     SELECT id, product_code, pdf_path
                     FROM drawings
-                    WHERE product_code LIKE %s
+                    WHERE {scope.filter}product_code LIKE %s
                     ORDER BY product_code
                     LIMIT %s
                 """
                 
                 search_pattern = f"%{keyword}%"
-                cursor.execute(sql, (search_pattern, limit))
+                cursor.execute(sql, scope.params + (search_pattern, limit))
                 results = cursor.fetchall()
                 cursor.close()
                 
@@ -269,8 +707,32 @@ class DatabaseManager:
             print(f"❌ 模糊查询失败: {e}")
             return []
     
+    @_timed('get_drawing_by_id')
+    def get_drawing_by_id(self, drawing_id, activation_code: str | None = None):
+        """
+        按ID查询当前租户的图纸（数据库出错时抛出异常）
+        
+        参数:
+            drawing_id: 图纸ID
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        
+        返回:
+            dict: {'id', 'product_code', 'pdf_path'}，不存在返回None
+        """
+        scope = self.drawing_scope(activation_code)
+        with self.get_tenant_connection(activation_code) as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            cursor.execute(
+                f"SELECT id, product_code, pdf_path FROM drawings WHERE {scope.filter}id = %s",
+                scope.params + (drawing_id,)
+            )
+            result = cursor.fetchone()
+            cursor.close()
+        return result
+    
     # ==================== 添加操作 ====================
     
+    @_timed('add_drawing')
     def add_drawing(self, product_code, pdf_path):
         """
         添加单个图纸
@@ -283,21 +745,23 @@ class DatabaseManager:
             bool: 成功返回True，失败返回False
         """
         try:
+            scope = self.drawing_scope()
             with self.get_tenant_connection() as conn:
                 cursor = conn.cursor()
                 
-                sql = """
-                    INSERT INTO drawings (product_code, pdf_path)
-                    VALUES (%s, %s)
+                sql = f"""
+                    INSERT INTO drawings ({scope.columns}product_code, pdf_path)
+                    VALUES ({scope.values}%s, %s)
                 """
                 
-                cursor.execute(sql, (product_code, pdf_path))
+                cursor.execute(sql, scope.params + (product_code, pdf_path))
+                self.notify_drawing_changed('insert', cursor.lastrowid, product_code, pdf_path, cursor=cursor)
                 cursor.close()
-                
-                if config.DEBUG:
-                    print(f"✅ 添加成功: {product_code}")
-                
-                return True
+            
+            if config.DEBUG:
+                print(f"✅ 添加成功: {product_code}")
+            
+            return True
                 
         except pymysql.IntegrityError:
             print(f"❌ 产品号已存在: {product_code}")
@@ -343,6 +807,8 @@ class DatabaseManager:
                 finally:
                     cursor.close()
                 
+                # 可能缓存了“无效”的结果
+                self.activation_cache.delete(code)
                 if config.DEBUG:
                     print(f"✅ 添加激活码成功: {code}")
                 
@@ -355,9 +821,11 @@ class DatabaseManager:
             print(f"❌ 添加激活码失败: {e}")
             return False
     
+    @_timed('check_activation_code')
     def check_activation_code(self, code):
         """
-        检查激活码是否有效
+        检查激活码是否有效（激活码存在即有效，与 is_active / is_activated 无关）
+        结果缓存：有效 ACTIVATION_CACHE_TTL 秒，无效 ACTIVATION_NEGATIVE_TTL 秒
         
         参数:
             code: 激活码
@@ -365,46 +833,24 @@ class DatabaseManager:
         返回:
             bool: 有效返回True，无效返回False
         """
+        if not code:
+            return False
+        cached = self.activation_cache.get(code)
+        if cached is not None:
+            return cached
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                
-                # 先按新列名 is_active 检查（不依赖 id 列，直接 SELECT 1）
-                try:
-                    sql = """
-                        SELECT 1 FROM activation_codes
-                        WHERE code = %s AND is_active = TRUE
-                        LIMIT 1
-                    """
-                    cursor.execute(sql, (code,))
-                except Exception as e:
-                    # 兼容旧库：按 is_activated 检查
-                    if "Unknown column 'is_active'" in str(e):
-                        sql = """
-                            SELECT 1 FROM activation_codes
-                            WHERE code = %s AND is_activated = TRUE
-                            LIMIT 1
-                        """
-                        cursor.execute(sql, (code,))
-                    else:
-                        raise
-                result = cursor.fetchone()
+                # code 列有唯一索引
+                cursor.execute("SELECT 1 FROM activation_codes WHERE code = %s LIMIT 1", (code,))
+                valid = cursor.fetchone() is not None
                 cursor.close()
-                
-                # 若仍无结果，作为兜底：只要存在该激活码则视为有效
-                if not result:
-                    with self.get_connection() as conn2:
-                        c2 = conn2.cursor()
-                        c2.execute("SELECT 1 FROM activation_codes WHERE code = %s LIMIT 1", (code,))
-                        r2 = c2.fetchone()
-                        c2.close()
-                        return r2 is not None
-                
-                return True
-                
         except Exception as e:
+            # 查询出错不缓存
             print(f"❌ 检查激活码失败: {e}")
             return False
+        self.activation_cache.set(code, valid, None if valid else config.ACTIVATION_NEGATIVE_TTL)
+        return valid
     
     def get_all_activation_codes(self):
         """
@@ -447,6 +893,7 @@ class DatabaseManager:
     
     # ==================== 用户管理 ====================
     
+    @_timed('register_user')
     def register_user(self, username, password, email, activation_code):
         """
         注册用户
@@ -466,29 +913,21 @@ class DatabaseManager:
             return False
         
         # 密码哈希
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_hash = password_hasher.hash(password)
         
         try:
             # 确保对应租户库存在
             tenant_db = self.ensure_tenant_database(activation_code)
+            has_tenant_col = self._ensure_users_tenant_column()
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                # 尝试写入租户库名（如旧库无该列则动态添加）
-                try:
-                    cursor.execute("SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME='users' AND COLUMN_NAME='tenant_db'", (self.connection_config['database'],))
-                    has_col = cursor.fetchone() is not None
-                    if not has_col:
-                        cursor.execute("ALTER TABLE users ADD COLUMN tenant_db VARCHAR(64) NULL COMMENT '租户数据库名'")
-                except Exception:
-                    pass
-
-                try:
+                if has_tenant_col:
                     sql = """
                         INSERT INTO users (username, password_hash, email, activation_code, tenant_db)
                         VALUES (%s, %s, %s, %s, %s)
                     """
                     cursor.execute(sql, (username, password_hash, email, activation_code, tenant_db))
-                except Exception:
+                else:
                     sql2 = """
                         INSERT INTO users (username, password_hash, email, activation_code)
                         VALUES (%s, %s, %s, %s)
@@ -508,6 +947,28 @@ class DatabaseManager:
             print(f"❌ 用户注册失败: {e}")
             return False
 
+    def _ensure_users_tenant_column(self):
+        """
+        确保 users 表有 tenant_db 列（旧库动态添加，按缓存的表结构判断，不再每次查询 INFORMATION_SCHEMA）
+        
+        返回:
+            bool: 该列是否可用
+        """
+        if self.schema.has_column('users', 'tenant_db'):
+            return True
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("ALTER TABLE users ADD COLUMN tenant_db VARCHAR(64) NULL COMMENT '租户数据库名'")
+                cursor.close()
+        except pymysql.err.OperationalError as e:
+            # 1060: 其他进程已添加
+            if e.args[0] != 1060:
+                print(f"⚠️  添加 users.tenant_db 列失败: {e}")
+                return False
+        self.schema.column_added('users', 'tenant_db')
+        return True
+    
     def username_exists(self, username):
         """
         检查用户名是否已存在
@@ -529,9 +990,15 @@ class DatabaseManager:
             print(f"❌ 检查用户名失败: {e}")
             return False
     
+    @_timed('login_user')
     def login_user(self, username, password):
         """
         用户登录
+        - 按用户名查询后在本进程校验密码（不占用数据库连接计算哈希）
+        - 旧格式或参数已过时的密码哈希在登录成功后按当前方案重新生成
+        - 最后登录时间批量异步写入
+        - 登录成功的结果缓存 LOGIN_CACHE_TTL 秒，期间同一用户名+密码再次登录不再计算哈希，
+          只按主键核对账号仍启用、密码哈希未变（被禁用/改密码后缓存立即失效，包括其他进程或直接改库）
         
         参数:
             username: 用户名
@@ -540,51 +1007,92 @@ class DatabaseManager:
         返回:
             dict: 用户信息，登录失败返回None
         """
-        # 密码哈希
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_mac = hmac.new(self._login_cache_key, password.encode(), hashlib.sha256).digest()
+        if self.login_cache is not None:
+            cached = self.login_cache.get(username)
+            if cached is not None and hmac.compare_digest(cached[0], password_mac):
+                if self._login_still_valid(cached[2]['id'], cached[1]):
+                    user = dict(cached[2])
+                    self._after_login(user)
+                    return user
+                self.login_cache.delete(username)
         
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
                 
-                # 查询用户
-                sql = """
-                    SELECT id, username, email, activation_code, tenant_db, created_at, last_login, is_active
+                # 查询用户（兼容旧库无tenant_db列）
+                tenant_col = "tenant_db, " if self.schema.has_column('users', 'tenant_db') else ""
+                sql = f"""
+                    SELECT id, username, password_hash, email, activation_code, {tenant_col}created_at, last_login, is_active
                     FROM users
-                    WHERE username = %s AND password_hash = %s AND is_active = TRUE
+                    WHERE username = %s AND is_active = TRUE
                     LIMIT 1
                 """
-                try:
-                    cursor.execute(sql, (username, password_hash))
-                except Exception:
-                    # 兼容旧库无tenant_db列
-                    sql_fallback = """
-                        SELECT id, username, email, activation_code, created_at, last_login, is_active
-                        FROM users
-                        WHERE username = %s AND password_hash = %s AND is_active = TRUE
-                        LIMIT 1
-                    """
-                    cursor.execute(sql_fallback, (username, password_hash))
+                cursor.execute(sql, (username,))
                 user = cursor.fetchone()
-                
-                # 更新最后登录时间
-                if user:
-                    update_sql = """
-                        UPDATE users
-                        SET last_login = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    """
-                    cursor.execute(update_sql, (user['id'],))
-                
                 cursor.close()
-                # 附加租户库名（旧库兼容）
-                if user and (user.get('tenant_db') is None):
-                    user['tenant_db'] = self.tenant_db_from_code(user.get('activation_code'))
-                return user
-                
         except Exception as e:
             print(f"❌ 用户登录失败: {e}")
             return None
+        
+        if not user:
+            password_hasher.verify_dummy(password)
+            return None
+        password_hash = user.pop('password_hash')
+        valid, needs_rehash = password_hasher.verify(password, password_hash)
+        if not valid:
+            return None
+        if needs_rehash:
+            password_hash = self._rehash_password(user['id'], password) or password_hash
+        
+        # 附加租户库名（旧库兼容）
+        if user.get('tenant_db') is None:
+            user['tenant_db'] = self.tenant_db_from_code(user.get('activation_code'))
+        if self.login_cache is not None:
+            self.login_cache.set(username, (password_mac, password_hash, dict(user)))
+        self._after_login(user)
+        return user
+    
+    def _login_still_valid(self, user_id, password_hash):
+        """登录缓存命中时核对账号仍启用且密码哈希未变（主键查询，不计算哈希）"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT password_hash, is_active FROM users WHERE id = %s", (user_id,))
+                row = cursor.fetchone()
+                cursor.close()
+        except Exception as e:
+            print(f"❌ 用户登录失败: {e}")
+            return False
+        return row is not None and bool(row[1]) and hmac.compare_digest(row[0], password_hash)
+    
+    def _after_login(self, user):
+        """登录成功后：记录最后登录时间，预热租户库"""
+        self.last_login.record(user['id'])
+        if user.get('tenant_db'):
+            # 登录后马上会访问租户库：后台预建连接、加载索引
+            self.tenants.warm_up(user['tenant_db'], user.get('activation_code'))
+    
+    def _rehash_password(self, user_id, password):
+        """
+        按当前方案重新生成密码哈希（失败不影响本次登录，下次登录时再试）
+        
+        返回:
+            str: 新的密码哈希，失败时返回None
+        """
+        try:
+            password_hash = password_hasher.hash(password)
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
+                cursor.close()
+            if config.DEBUG:
+                print(f"🔐 已升级密码哈希: 用户 {user_id}")
+            return password_hash
+        except Exception as e:
+            print(f"⚠️  升级密码哈希失败: {e}")
+            return None
     
     def get_user_activation_code(self, username):
         """
@@ -619,7 +1127,7 @@ class DatabaseManager:
     
     def batch_add_drawings(self, drawings_list):
         """
-        批量添加图纸
+        批量添加图纸（已存在的产品号跳过）
         
         参数:
             drawings_list: [(product_code, pdf_path), ...]
@@ -627,40 +1135,134 @@ class DatabaseManager:
         返回:
             tuple: (成功数量, 失败数量)
         """
-        success_count = 0
-        fail_count = 0
+        result = self.bulk_upsert_drawings(drawings_list, on_duplicate='skip')
+        return (len(result['inserted']), len(result['skipped']) + len(result['failed']))
+    
+    @_timed('bulk_upsert_drawings')
+    def bulk_upsert_drawings(self, drawings_list, on_duplicate='skip', chunk_size=None,
+                             activation_code: str | None = None):
+        """
+        批量写入图纸：按块执行多行 INSERT ... ON DUPLICATE KEY UPDATE，每块一个事务
+        
+        参数:
+            drawings_list: [(product_code, pdf_path), ...]
+            on_duplicate: 产品号已存在时的处理方式，'skip' 跳过 / 'update' 更新PDF路径
+            chunk_size: 每块行数（默认 config.DB_BULK_CHUNK_SIZE）
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        
+        返回:
+            dict: {'inserted': [产品号], 'updated': [产品号], 'skipped': [产品号], 'failed': [产品号]}
+                  批内重复的产品号计入 skipped（skip 保留第一条，update 保留最后一条）
+        """
+        if on_duplicate not in ('skip', 'update'):
+            raise ValueError(f"on_duplicate 只能是 'skip' 或 'update': {on_duplicate}")
+        chunk_size = chunk_size or config.DB_BULK_CHUNK_SIZE
+        result = {'inserted': [], 'updated': [], 'skipped': [], 'failed': []}
+        
+        # 批内去重（与数据库排序规则一致：不区分大小写、忽略末尾空格）
+        rows = {}
+        for product_code, pdf_path in drawings_list:
+            key = collation_key(product_code)
+            if key in rows:
+                if on_duplicate == 'update':
+                    result['skipped'].append(rows[key][0])
+                    rows[key] = (product_code, pdf_path)
+                else:
+                    result['skipped'].append(product_code)
+            else:
+                rows[key] = (product_code, pdf_path)
+        rows = list(rows.values())
+        done_rows = 0  # 已处理完（提交或确认失败）的行数
+        scope = self.drawing_scope(activation_code)
+        tenant_db = self.resolve_tenant_db(activation_code)
+        
+        if on_duplicate == 'update':
+            insert_sql = f"""
+                INSERT INTO drawings ({scope.columns}product_code, pdf_path)
+                VALUES ({scope.values}%s, %s)
+                ON DUPLICATE KEY UPDATE pdf_path = VALUES(pdf_path)
+            """
+        else:
+            # 不用 INSERT IGNORE：它会把截断等数据错误也降级为警告
+            insert_sql = f"""
+                INSERT INTO drawings ({scope.columns}product_code, pdf_path)
+                VALUES ({scope.values}%s, %s)
+                ON DUPLICATE KEY UPDATE id = id
+            """
         
         try:
-            with self.get_tenant_connection() as conn:
+            with self.get_tenant_connection(activation_code) as conn:
                 cursor = conn.cursor()
-                
-                sql = """
-                    INSERT INTO drawings (product_code, pdf_path)
-                    VALUES (%s, %s)
-                """
-                
-                for product_code, pdf_path in drawings_list:
+                for i in range(0, len(rows), chunk_size):
+                    chunk = rows[i:i + chunk_size]
+                    codes = [code for code, _ in chunk]
+                    placeholders = ', '.join(['%s'] * len(chunk))
                     try:
-                        cursor.execute(sql, (product_code, pdf_path))
-                        success_count += 1
-                    except pymysql.IntegrityError:
-                        fail_count += 1
-                        if config.DEBUG:
-                            print(f"⚠️ 跳过重复: {product_code}")
-                
+                        # 锁定本块涉及的产品号（含不存在的），保证分类结果准确
+                        cursor.execute(
+                            f"SELECT product_code, pdf_path FROM drawings "
+                            f"WHERE {scope.filter}product_code IN ({placeholders}) FOR UPDATE",
+                            scope.params + tuple(codes)
+                        )
+                        existing = {collation_key(code): path for code, path in cursor.fetchall()}
+                        
+                        new_rows, changed_rows = [], []
+                        for code, pdf_path in chunk:
+                            key = collation_key(code)
+                            if key not in existing:
+                                new_rows.append((code, pdf_path))
+                            elif on_duplicate == 'update' and existing[key] != pdf_path:
+                                changed_rows.append((code, pdf_path))
+                            else:
+                                result['skipped'].append(code)
+                        
+                        # pymysql 的 executemany 会把 INSERT ... VALUES 合并为多行语句
+                        if new_rows or changed_rows:
+                            cursor.executemany(insert_sql, [scope.params + row for row in new_rows + changed_rows])
+                        
+                        new_ids = {}
+                        if new_rows:
+                            cursor.execute(
+                                f"SELECT id, product_code FROM drawings WHERE {scope.filter}product_code IN "
+                                f"({', '.join(['%s'] * len(new_rows))})",
+                                scope.params + tuple(code for code, _ in new_rows)
+                            )
+                            new_ids = {collation_key(code): new_id for new_id, code in cursor.fetchall()}
+                        
+                        # 整块变更用一条 INSERT 写入变更日志，随本块一起提交
+                        changes = [(tenant_db, 'insert', new_ids.get(collation_key(code)), code, None, pdf_path, 0)
+                                   for code, pdf_path in new_rows]
+                        changes += [(tenant_db, 'update', None, code, None, pdf_path, 0)
+                                    for code, pdf_path in changed_rows]
+                        if self.change_log:
+                            self.change_log.append(changes, cursor)
+                        conn.commit()
+                    except pymysql.MySQLError as e:
+                        conn.rollback()
+                        result['failed'].extend(codes)
+                        done_rows = i + len(chunk)
+                        print(f"❌ 批量写入第 {i // chunk_size + 1} 块失败: {e}")
+                        continue
+                    done_rows = i + len(chunk)
+                    
+                    # 提交后再同步缓存与索引
+                    result['inserted'].extend(code for code, _ in new_rows)
+                    result['updated'].extend(code for code, _ in changed_rows)
+                    for change in changes:
+                        self._apply_change(*change)
                 cursor.close()
-                
-                if config.DEBUG:
-                    print(f"✅ 批量添加完成: 成功 {success_count}, 失败 {fail_count}")
-                
-                return (success_count, fail_count)
-                
         except Exception as e:
             print(f"❌ 批量添加失败: {e}")
-            return (success_count, fail_count)
+            result['failed'].extend(code for code, _ in rows[done_rows:])
+        
+        if config.DEBUG:
+            print(f"✅ 批量写入完成: 新增 {len(result['inserted'])}, 更新 {len(result['updated'])}, "
+                  f"跳过 {len(result['skipped'])}, 失败 {len(result['failed'])}")
+        return result
     
     # ==================== 更新操作 ====================
     
+    @_timed('update_drawing')
     def update_drawing(self, product_code, new_pdf_path):
         """
         更新图纸路径
@@ -673,26 +1275,29 @@ class DatabaseManager:
             bool: 成功返回True
         """
         try:
+            scope = self.drawing_scope()
             with self.get_tenant_connection() as conn:
                 cursor = conn.cursor()
                 
-                sql = """
+                sql = f"""
                     UPDATE drawings
                     SET pdf_path = %s
-                    WHERE product_code = %s
+                    WHERE {scope.filter}product_code = %s
                 """
                 
-                cursor.execute(sql, (new_pdf_path, product_code))
+                cursor.execute(sql, (new_pdf_path,) + scope.params + (product_code,))
                 affected_rows = cursor.rowcount
-                cursor.close()
-                
                 if affected_rows > 0:
-                    if config.DEBUG:
-                        print(f"✅ 更新成功: {product_code}")
-                    return True
-                else:
-                    print(f"⚠️ 产品号不存在: {product_code}")
-                    return False
+                    self.notify_drawing_changed('update', None, product_code, new_pdf_path, cursor=cursor)
+                cursor.close()
+            
+            if affected_rows > 0:
+                if config.DEBUG:
+                    print(f"✅ 更新成功: {product_code}")
+                return True
+            else:
+                print(f"⚠️ 产品号不存在: {product_code}")
+                return False
                     
         except Exception as e:
             print(f"❌ 更新失败: {e}")
@@ -700,6 +1305,7 @@ class DatabaseManager:
     
     # ==================== 删除操作 ====================
     
+    @_timed('delete_drawing')
     def delete_drawing(self, product_code):
         """
         删除图纸
@@ -711,29 +1317,108 @@ class DatabaseManager:
             bool: 成功返回True
         """
         try:
+            scope = self.drawing_scope()
             with self.get_tenant_connection() as conn:
                 cursor = conn.cursor()
                 
-                sql = "DELETE FROM drawings WHERE product_code = %s"
+                sql = f"DELETE FROM drawings WHERE {scope.filter}product_code = %s"
                 
-                cursor.execute(sql, (product_code,))
+                cursor.execute(sql, scope.params + (product_code,))
                 affected_rows = cursor.rowcount
-                cursor.close()
-                
                 if affected_rows > 0:
-                    if config.DEBUG:
-                        print(f"✅ 删除成功: {product_code}")
-                    return True
-                else:
-                    print(f"⚠️ 产品号不存在: {product_code}")
-                    return False
+                    self.notify_drawing_changed('delete', None, product_code, cursor=cursor)
+                cursor.close()
+            
+            if affected_rows > 0:
+                if config.DEBUG:
+                    print(f"✅ 删除成功: {product_code}")
+                return True
+            else:
+                print(f"⚠️ 产品号不存在: {product_code}")
+                return False
                     
         except Exception as e:
             print(f"❌ 删除失败: {e}")
             return False
     
+    @_timed('delete_drawings_by_ids')
+    def delete_drawings_by_ids(self, ids, activation_code: str | None = None):
+        """
+        按ID批量删除图纸（单个事务，WHERE id IN (...) 按块执行）
+        
+        参数:
+            ids: 图纸ID列表
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        
+        返回:
+            tuple: (已删除的记录列表 [{'id', 'product_code', 'pdf_path'}],
+                    不再被任何记录引用的 pdf_path 列表)
+        """
+        ids = sorted({int(i) for i in ids})
+        if not ids:
+            return ([], [])
+        chunk_size = config.DB_BULK_CHUNK_SIZE
+        deleted = []
+        scope = self.drawing_scope(activation_code)
+        
+        with self.get_tenant_connection(activation_code) as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f"SELECT id, product_code, pdf_path FROM drawings WHERE {scope.filter}id IN ({placeholders}) FOR UPDATE",
+                    scope.params + tuple(chunk)
+                )
+                deleted.extend(
+                    {'id': row[0], 'product_code': row[1], 'pdf_path': row[2]} for row in cursor.fetchall()
+                )
+                cursor.execute(f"DELETE FROM drawings WHERE {scope.filter}id IN ({placeholders})",
+                               scope.params + tuple(chunk))
+            
+            # 同一文件可能被其他记录引用，只返回已无引用的路径
+            paths = sorted({d['pdf_path'] for d in deleted})
+            still_used = set()
+            for i in range(0, len(paths), chunk_size):
+                chunk = paths[i:i + chunk_size]
+                cursor.execute(
+                    f"SELECT DISTINCT pdf_path FROM drawings "
+                    f"WHERE {scope.filter}pdf_path IN ({', '.join(['%s'] * len(chunk))})",
+                    scope.params + tuple(chunk)
+                )
+                still_used.update(row[0] for row in cursor.fetchall())
+            
+            # 变更日志随删除一起提交（一条 INSERT），本进程的缓存与索引在提交后同步
+            tenant_db = self.resolve_tenant_db(activation_code)
+            self._log_changes(cursor, [(tenant_db, 'delete', d['id'], d['product_code'], None, None, 0)
+                                       for d in deleted])
+            cursor.close()
+        
+        if config.DEBUG:
+            print(f"✅ 批量删除完成: {len(deleted)} 条")
+        return (deleted, [p for p in paths if p not in still_used])
+    
     # ==================== 统计操作 ====================
     
+    def get_statistics(self, activation_code: str | None = None):
+        """
+        获取当前租户的统计数据（内存中增量维护，不再每次查询 COUNT(*)）
+        
+        参数:
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+        
+        返回:
+            dict: {'total_drawings', 'storage_bytes', 'uploads_per_day', 'recent_activity', 'updated_at'}
+        """
+        if not self.stats:
+            return {'total_drawings': self.get_total_count(), 'storage_bytes': None,
+                    'uploads_per_day': [], 'recent_activity': [], 'updated_at': time.time()}
+        from utils.pdf_handler import pdf_handler
+        tenant_db = self.resolve_tenant_db(activation_code)
+        if not activation_code and has_request_context():
+            activation_code = session.get('activation_code')
+        return self.stats.get(tenant_db, pdf_handler.get_folder(activation_code))
+    
     def get_total_count(self):
         """
         获取图纸总数
@@ -742,9 +1427,10 @@ class DatabaseManager:
             int: 图纸总数
         """
         try:
+            scope = self.drawing_scope()
             with self.get_tenant_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM drawings")
+                cursor.execute(f"SELECT COUNT(*) FROM drawings{scope.where}", scope.params)
                 count = cursor.fetchone()[0]
                 cursor.close()
                 return count
@@ -798,6 +1484,10 @@ class DatabaseManager:
                 """)
                 
                 cursor.close()
+                # 表可能是刚创建的，下次使用时重新探测表结构
+                self.schema.reset()
+                if self.change_log:
+                    self.change_log.ensure_table()
                 
                 if config.DEBUG:
                     print("✅ 数据库初始化成功")
@@ -808,6 +1498,7 @@ class DatabaseManager:
             print(f"❌ 数据库初始化失败: {e}")
             return False
     
+    @_timed('get_all_drawings')
     def get_all_drawings(self, limit=1000):
         """
         获取所有图纸（用于数据管理）
@@ -819,17 +1510,18 @@ class DatabaseManager:
             list: 图纸列表
         """
         try:
+            scope = self.drawing_scope()
             with self.get_tenant_connection() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
                 
-                sql = """
+                sql = f"""
                     SELECT id, product_code, pdf_path
-                    FROM drawings
+                    FROM drawings{scope.where}
                     ORDER BY id
                     LIMIT %s
                 """
                 
-                cursor.execute(sql, (limit,))
+                cursor.execute(sql, scope.params + (limit,))
                 results = cursor.fetchall()
                 cursor.close()
                 
@@ -839,6 +1531,124 @@ class DatabaseManager:
             print(f"❌ 查询失败: {e}")
             return []
 
+    @_timed('get_drawings_page')
+    def get_drawings_page(self, cursor=None, limit=None, keyword=None, sort='id', order='asc',
+                          activation_code: str | None = None, with_total=True):
+        """
+        分页获取图纸（游标/keyset分页，翻到任意深度都只扫描一页数据）
+        
+        参数:
+            cursor: 上一页返回的 next_cursor（None 表示第一页）
+            limit: 每页条数
+            keyword: 产品号筛选（包含匹配，不支持通配符）
+            sort: 排序字段 'id' / 'product_code'（两者均唯一，可直接作为游标）
+            order: 'asc' / 'desc'
+            activation_code: 激活码（可选，未提供时按当前会话/线程解析租户）
+            with_total: 是否统计总数（不需要总数时省去 COUNT，total 为None）
+        
+        返回:
+            dict: {'items', 'next_cursor', 'has_more', 'total', 'total_exact'}
+        """
+        if sort not in ('id', 'product_code'):
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"不支持的排序方向: {order}")
+        limit = max(1, min(int(limit or config.ADMIN_PAGE_SIZE), config.ADMIN_PAGE_MAX_SIZE))
+        keyword = (keyword or '').strip()
+        
+        conditions, params = [], []
+        if keyword:
+            escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("product_code LIKE %s")
+            params.append(f"%{escaped}%")
+        where_filter = list(conditions)
+        filter_params = list(params)
+        if cursor is not None:
+            conditions.append(f"{sort} {'>' if order == 'asc' else '<'} %s")
+            params.append(self._decode_page_cursor(cursor, sort, order))
+        scope = self.drawing_scope(activation_code)
+        if scope.condition:
+            conditions.insert(0, scope.condition)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        tenant_db = self.resolve_tenant_db(activation_code)
+        with self.get_tenant_connection(activation_code) as conn:
+            cur = conn.cursor(pymysql.cursors.DictCursor)
+            # 多取一条判断是否还有下一页
+            cur.execute(
+                f"SELECT id, product_code, pdf_path FROM drawings {where} "
+                f"ORDER BY {sort} {order.upper()} LIMIT %s",
+                list(scope.params) + params + [limit + 1]
+            )
+            items = cur.fetchall()
+            cur.close()
+        
+        has_more = len(items) > limit
+        items = items[:limit]
+        next_cursor = self._encode_page_cursor(items[-1][sort], sort, order) if has_more else None
+        total, total_exact = None, False
+        if with_total:
+            total, total_exact = self._count_drawings(tenant_db, keyword, where_filter, filter_params,
+                                                      activation_code)
+        return {
+            'items': items,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'total': total,
+            'total_exact': total_exact,
+        }
+    
+    def _count_drawings(self, tenant_db, keyword, conditions, params, activation_code):
+        """
+        分页总数：优先取内存索引条数，其次取缓存，最后查库（带筛选时最多数到 ADMIN_COUNT_CAP）
+        
+        返回:
+            tuple: (总数, 是否精确)
+        """
+        if not keyword and self.fuzzy_index:
+            count = self.fuzzy_index.count(tenant_db)
+            if count is not None:
+                return (count, True)
+        key = (tenant_db, self._write_generation.get(tenant_db, 0), keyword.casefold())
+        cached = self.count_cache.get(key)
+        if cached is not None:
+            return cached
+        scope = self.drawing_scope(activation_code)
+        with self.get_tenant_connection(activation_code) as conn:
+            cur = conn.cursor()
+            if conditions:
+                cap = config.ADMIN_COUNT_CAP
+                cur.execute(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM drawings "
+                    f"WHERE {scope.filter}{' AND '.join(conditions)} LIMIT %s) t",
+                    list(scope.params) + params + [cap + 1]
+                )
+                count = cur.fetchone()[0]
+                result = (cap, False) if count > cap else (count, True)
+            else:
+                cur.execute(f"SELECT COUNT(*) FROM drawings{scope.where}", scope.params)
+                result = (cur.fetchone()[0], True)
+            cur.close()
+        self.count_cache.set(key, result)
+        return result
+    
+    @staticmethod
+    def _encode_page_cursor(value, sort, order):
+        payload = json.dumps([sort, order, value], separators=(',', ':'), ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def _decode_page_cursor(cursor, sort, order):
+        """解析游标（排序方式与游标不一致时视为无效）"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            c_sort, c_order, value = json.loads(base64.urlsafe_b64decode(padded).decode())
+        except (ValueError, TypeError):
+            raise ValueError("无效的分页游标")
+        if c_sort != sort or c_order != order:
+            raise ValueError("分页游标与排序方式不一致")
+        return value
+
 
 # 创建全局单例实例
 db_manager = DatabaseManager()
\ No newline at end of file
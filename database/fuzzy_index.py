@@ -0,0 +1,362 @@
+"""
+模糊查询索引
+按租户在内存中维护产品号的三元组(trigram)倒排索引，替代 LIKE '%kw%' 全表扫描
+"""
+import time
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+def fold(text):
+    """
+    按 utf8mb4_unicode_ci 的比较规则折叠字符串：不区分大小写、重音（é = e）、全角半角（Ａ = A）
+    用于子串匹配，与 SQL 的 LIKE '%kw%' 结果一致
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def collation_key(product_code):
+    """按 utf8mb4_unicode_ci 判断两个产品号是否相等的键（同时忽略末尾空格，PAD SPACE）"""
+    return fold(product_code.rstrip(' '))
+
+
+def trigrams(text):
+    """返回字符串的所有三元组（已去重）"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    单个租户的产品号索引（非线程安全，由 FuzzyIndexManager 加锁）
+    - rows: id -> (product_code, pdf_path, 折叠后的产品号, 排序位次)
+    - postings: 三元组 -> id 集合
+    - ordered: 按排序位次有序的 (位次, id) 列表，用于按 product_code 顺序输出
+
+    排序位次取自加载时数据库 ORDER BY product_code 的顺序，与SQL查询的排序完全一致；
+    加载后新增的记录（含修改了产品号的记录）排在末尾，下次重建（FUZZY_INDEX_REFRESH_SECONDS）时回到正确位置
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.by_code = {}
+        self.postings = {}
+        self.ordered = []
+        self.built_at = time.monotonic()
+
+    def add(self, drawing_id, product_code, pdf_path):
+        """添加或覆盖一条记录"""
+        previous = self.rows.get(drawing_id)
+        if previous is not None:
+            self.remove(drawing_id)
+            if previous[0] == product_code:
+                # 只修改了PDF路径，保留原位次
+                self._add_row(drawing_id, product_code, pdf_path, previous[2], previous[3])
+                insort(self.ordered, (previous[3], drawing_id))
+                return
+        # 新记录追加到末尾：Python 无法复现数据库排序规则，在按位次有序的列表中也无从二分定位
+        rank = self.ordered[-1][0] + 1 if self.ordered else 0.0
+        self._add_row(drawing_id, product_code, pdf_path, fold(product_code), rank)
+        self.ordered.append((rank, drawing_id))
+
+    def load(self, rows, max_rows):
+        """
+        批量加载
+
+        参数:
+            rows: 按 product_code 排序的 (id, product_code, pdf_path)
+
+        返回:
+            bool: 超过 max_rows 时返回False
+        """
+        for rank, (drawing_id, product_code, pdf_path) in enumerate(rows):
+            if len(self.rows) >= max_rows:
+                return False
+            self._add_row(drawing_id, product_code, pdf_path, fold(product_code), float(rank))
+            self.ordered.append((float(rank), drawing_id))
+        return True
+
+    def _add_row(self, drawing_id, product_code, pdf_path, folded, rank):
+        self.rows[drawing_id] = (product_code, pdf_path, folded, rank)
+        self.by_code[collation_key(product_code)] = drawing_id
+        for gram in trigrams(folded):
+            self.postings.setdefault(gram, set()).add(drawing_id)
+
+    def remove(self, drawing_id):
+        """删除一条记录"""
+        row = self.rows.pop(drawing_id, None)
+        if row is None:
+            return
+        product_code, _, folded, rank = row
+        key = collation_key(product_code)
+        if self.by_code.get(key) == drawing_id:
+            del self.by_code[key]
+        for gram in trigrams(folded):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(drawing_id)
+                if not ids:
+                    del self.postings[gram]
+        entry = (rank, drawing_id)
+        pos = bisect_left(self.ordered, entry)
+        if pos < len(self.ordered) and self.ordered[pos] == entry:
+            del self.ordered[pos]
+
+    def id_for_code(self, product_code):
+        """按产品号查找id（与数据库唯一索引的比较规则一致）"""
+        return self.by_code.get(collation_key(product_code or ''))
+
+    def candidates(self, keyword, scan_threshold):
+        """
+        （持锁调用）确定查询方式
+
+        参数:
+            keyword: 关键词（不含 LIKE 通配符）
+            scan_threshold: 候选集超过该数量时改为有序扫描（命中密集，扫描很快结束）
+
+        返回:
+            tuple: (折叠后的关键词, 候选id集合；None 表示需要用 scan 按序扫描)
+        """
+        kw = fold(keyword)
+        grams = trigrams(kw)
+        if grams:
+            postings = []
+            for gram in grams:
+                ids = self.postings.get(gram)
+                if not ids:
+                    return (kw, set())
+                postings.append(ids)
+            postings.sort(key=len)
+            if len(postings[0]) <= scan_threshold:
+                return (kw, set(postings[0]).intersection(*postings[1:]))
+        # 关键词少于3个字符或命中过多：按产品号顺序扫描
+        return (kw, None)
+
+    def match(self, kw, candidate_ids, limit):
+        """
+        在候选集中做子串匹配（可在锁外调用；期间被删除的记录自动跳过），结果按产品号排序
+
+        参数:
+            kw, candidate_ids: candidates 的返回值
+            limit: 最大返回条数
+        """
+        rows = self.rows
+        matched = []
+        for drawing_id in candidate_ids:
+            row = rows.get(drawing_id)
+            if row is not None and kw in row[2]:
+                matched.append((row[3], drawing_id, row))
+        matched.sort(key=lambda item: item[0])
+        return [self._as_dict(drawing_id, row) for _, drawing_id, row in matched[:limit]]
+
+    def scan(self, kw, limit, after=None, max_entries=None):
+        """
+        （持锁调用）按产品号顺序扫描，凑满 limit 即停止；可分段调用，每段之间释放锁
+
+        参数:
+            kw: 折叠后的关键词
+            limit: 本段最多返回的条数
+            after: 上一段返回的位置（None 表示从头开始）；按 (位次, id) 定位，期间的增删不影响续扫
+            max_entries: 本段最多检查的记录数（None 表示不限）
+
+        返回:
+            tuple: (结果列表, 下一段的起始位置；扫描到末尾时为None)
+        """
+        ordered = self.ordered
+        rows = self.rows
+        pos = 0 if after is None else bisect_right(ordered, after)
+        end = len(ordered) if max_entries is None else min(len(ordered), pos + max_entries)
+        results = []
+        while pos < end:
+            entry = ordered[pos]
+            pos += 1
+            row = rows[entry[1]]
+            if kw in row[2]:
+                results.append(self._as_dict(entry[1], row))
+                if len(results) >= limit:
+                    return (results, entry)
+        return (results, ordered[pos - 1] if pos < len(ordered) else None)
+
+    def search(self, keyword, limit, scan_threshold):
+        """子串查询，结果按产品号排序（单线程使用）"""
+        kw, candidate_ids = self.candidates(keyword, scan_threshold)
+        if candidate_ids is not None:
+            return self.match(kw, candidate_ids, limit)
+        return self.scan(kw, limit)[0]
+
+    @staticmethod
+    def _as_dict(drawing_id, row):
+        product_code, pdf_path, _, _ = row
+        return {'id': drawing_id, 'product_code': product_code, 'pdf_path': pdf_path}
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class FuzzyIndexManager:
+    """
+    按租户管理 TrigramIndex
+    - 首次模糊查询时在后台线程加载，加载完成前返回None（调用方回退到SQL）
+    - 写操作通过 upsert/remove 同步到索引
+    - 超过 refresh_seconds 后在后台重建（兼顾其他进程的写入）
+    - 超过 max_rows 的租户不建索引
+    """
+
+    # 按序扫描时每次持锁检查的记录数
+    SCAN_SLICE = 50000
+
+    def __init__(self, loader, max_rows=None, refresh_seconds=None, scan_threshold=None):
+        """
+        参数:
+            loader: 函数 loader(tenant_db, limit) -> (id, product_code, pdf_path) 列表
+        """
+        self.loader = loader
+        self.max_rows = max_rows or config.FUZZY_INDEX_MAX_ROWS
+        self.refresh_seconds = refresh_seconds or config.FUZZY_INDEX_REFRESH_SECONDS
+        self.scan_threshold = scan_threshold or config.FUZZY_INDEX_SCAN_THRESHOLD
+        self._indexes = {}        # tenant_db -> TrigramIndex
+        self._building = set()
+        self._pending = {}        # tenant_db -> 加载期间的写操作
+        self._oversized = {}      # tenant_db -> 判定过大的时间
+        self._lock = threading.RLock()
+        register_after_fork(self)
+
+    def search(self, tenant_db, keyword, limit):
+        """
+        查询索引
+
+        返回:
+            list: 结果列表；索引不可用（未加载/过大/关键词含通配符）时返回None
+        """
+        if any(ch in keyword for ch in '%_\\'):
+            # LIKE 通配符语义交给数据库处理
+            return None
+        with self._lock:
+            index = self._indexes.get(tenant_db)
+            if index is None or time.monotonic() - index.built_at > self.refresh_seconds:
+                self._schedule_build(tenant_db)
+            if index is None:
+                return None
+            kw, candidate_ids = index.candidates(keyword, self.scan_threshold)
+        if candidate_ids is not None:
+            # 候选集已复制，逐条匹配在锁外进行
+            return index.match(kw, candidate_ids, limit)
+        # 按序扫描：每段持锁检查 SCAN_SLICE 条，段间释放锁，不长时间阻塞其他租户的查询与写入
+        results, after = [], None
+        while True:
+            with self._lock:
+                found, after = index.scan(kw, limit - len(results), after, self.SCAN_SLICE)
+            results.extend(found)
+            if after is None or len(results) >= limit:
+                return results
+
+    def warm(self, tenant_db):
+        """预先在后台加载租户索引（已加载时不做任何事）"""
+        with self._lock:
+            if tenant_db not in self._indexes:
+                self._schedule_build(tenant_db)
+
+    def upsert(self, tenant_db, drawing_id, product_code, pdf_path):
+        """同步新增/修改；drawing_id 为None时按产品号定位"""
+        self._record(tenant_db, 'upsert', (drawing_id, product_code, pdf_path))
+
+    def remove(self, tenant_db, drawing_id=None, product_code=None):
+        """同步删除（按id或产品号）"""
+        self._record(tenant_db, 'remove', (drawing_id, product_code))
+
+    def _record(self, tenant_db, op, args):
+        with self._lock:
+            if tenant_db in self._building:
+                self._pending.setdefault(tenant_db, []).append((op, args))
+            index = self._indexes.get(tenant_db)
+            if index is not None:
+                self._apply(index, tenant_db, op, args)
+
+    def _apply(self, index, tenant_db, op, args):
+        """
+        （持锁调用）把一次写操作应用到索引
+
+        返回:
+            bool: 无法定位记录（索引已不可信）时返回False
+        """
+        if op == 'upsert':
+            drawing_id, product_code, pdf_path = args
+            if drawing_id is None:
+                drawing_id = index.id_for_code(product_code)
+                if drawing_id is None:
+                    # 无法定位，丢弃索引等待重建
+                    self._indexes.pop(tenant_db, None)
+                    return False
+            index.add(drawing_id, product_code, pdf_path)
+        else:
+            drawing_id, product_code = args
+            if drawing_id is None:
+                drawing_id = index.id_for_code(product_code)
+            if drawing_id is not None:
+                index.remove(drawing_id)
+        return True
+
+    def count(self, tenant_db):
+        """已加载索引的记录数（索引未加载时返回None，不触发加载）"""
+        with self._lock:
+            index = self._indexes.get(tenant_db)
+            return len(index) if index is not None else None
+
+    def invalidate(self, tenant_db=None):
+        """丢弃指定租户（或全部）的索引"""
+        with self._lock:
+            if tenant_db is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(tenant_db, None)
+
+    def stats(self):
+        """索引统计信息"""
+        with self._lock:
+            return {str(t): len(i) for t, i in self._indexes.items()}
+
+    def _after_fork(self):
+        """子进程中重建锁；父进程的加载线程不会被继承，清除加载中标记"""
+        self._lock = threading.RLock()
+        self._building = set()
+        self._pending = {}
+
+    def _schedule_build(self, tenant_db):
+        """（持锁调用）启动后台加载"""
+        if tenant_db in self._building:
+            return
+        oversized_at = self._oversized.get(tenant_db)
+        if oversized_at and time.monotonic() - oversized_at < self.refresh_seconds:
+            return
+        self._building.add(tenant_db)
+        threading.Thread(target=self._build, args=(tenant_db,), daemon=True).start()
+
+    def _build(self, tenant_db):
+        start_time = time.time()
+        try:
+            index = TrigramIndex()
+            # 多取一条用于判断是否超过上限
+            if not index.load(self.loader(tenant_db, self.max_rows + 1), self.max_rows):
+                with self._lock:
+                    self._oversized[tenant_db] = time.monotonic()
+                    self._indexes.pop(tenant_db, None)
+                if config.DEBUG:
+                    print(f"⚠️ 租户 {tenant_db} 图纸超过 {self.max_rows} 条，模糊查询不使用内存索引")
+                return
+            with self._lock:
+                # 重放加载期间发生的写操作
+                pending = self._pending.pop(tenant_db, [])
+                if all(self._apply(index, tenant_db, op, args) for op, args in pending):
+                    self._indexes[tenant_db] = index
+                    self._oversized.pop(tenant_db, None)
+            if config.DEBUG:
+                print(f"✅ 模糊查询索引加载完成: {tenant_db}, {len(index)} 条, 耗时 {(time.time() - start_time):.2f}s")
+        except Exception as e:
+            print(f"❌ 模糊查询索引加载失败: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(tenant_db)
+                self._pending.pop(tenant_db, None)
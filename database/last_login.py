@@ -0,0 +1,89 @@
+"""
+最后登录时间批量写入
+登录时只在内存中记录，由后台线程每隔 LAST_LOGIN_FLUSH_SECONDS 秒用一条 UPDATE 写入一批用户，
+避免登录高峰时每次登录都更新 users 表的同一批行
+"""
+import time
+import atexit
+import datetime
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+class LastLoginRecorder:
+    """缓冲 users.last_login 的更新"""
+
+    def __init__(self, connect, flush_seconds=None, batch_size=500):
+        """
+        参数:
+            connect: 返回数据库连接上下文管理器的函数（如 db_manager.get_connection）
+            flush_seconds: 写入周期（秒）
+            batch_size: 每条 UPDATE 包含的最大用户数
+        """
+        self.connect = connect
+        self.flush_seconds = flush_seconds or config.LAST_LOGIN_FLUSH_SECONDS
+        self.batch_size = batch_size
+        self._pending = {}     # 用户ID -> 最后登录时间
+        self._lock = threading.Lock()
+        self._flusher = None
+        register_after_fork(self)
+        # 进程正常退出前写入剩余记录
+        atexit.register(self.flush)
+
+    def record(self, user_id):
+        """记录一次登录（稍后写入数据库）"""
+        with self._lock:
+            self._pending[user_id] = datetime.datetime.now().replace(microsecond=0)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        """
+        立即写入所有待更新的记录（失败的记录保留到下次）
+
+        返回:
+            int: 写入的用户数
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        items = list(pending.items())
+        written = 0
+        try:
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                for start in range(0, len(items), self.batch_size):
+                    batch = items[start:start + self.batch_size]
+                    cases = " ".join("WHEN %s THEN %s" for _ in batch)
+                    placeholders = ", ".join(["%s"] * len(batch))
+                    params = [value for item in batch for value in item] + [user_id for user_id, _ in batch]
+                    cursor.execute(
+                        f"UPDATE users SET last_login = CASE id {cases} END WHERE id IN ({placeholders})",
+                        params
+                    )
+                    written += len(batch)
+                cursor.close()
+        except Exception as e:
+            print(f"⚠️  写入最后登录时间失败: {e}")
+            with self._lock:
+                # 期间又登录的用户保留较新的时间
+                for user_id, logged_in_at in pending.items():
+                    self._pending.setdefault(user_id, logged_in_at)
+            return 0
+        if config.DEBUG:
+            print(f"🕒 已写入最后登录时间: {written} 个用户")
+        return written
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _after_fork(self):
+        """子进程不继承父进程未写入的记录（由父进程负责写入）"""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flusher = None
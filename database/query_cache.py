@@ -0,0 +1,90 @@
+"""
+查询缓存
+进程内 LRU + TTL 缓存，用于产品号精确查询等高频读操作
+"""
+import time
+import threading
+from collections import OrderedDict
+from utils.fork_safe import register_after_fork
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，条目带过期时间
+    - 超过 max_entries 时淘汰最久未访问的条目
+    - 条目写入 ttl 秒后过期
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_after_fork(self)
+
+    def get(self, key, default=None):
+        """读取缓存，未命中或已过期返回 default"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """写入缓存"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """删除单个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """删除所有 key 满足 predicate 的条目，返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        """清空缓存（不重置命中统计）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / total) if total else 0.0,
+            }
+
+    def _after_fork(self):
+        """子进程中重建锁（fork 时锁可能正被其他线程持有），命中统计从零开始"""
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
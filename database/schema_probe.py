@@ -0,0 +1,71 @@
+"""
+主库表结构探测
+旧库可能缺少后来增加的列（如 users.tenant_db），以前每次注册/登录都查询 INFORMATION_SCHEMA 或先试错再回退；
+现在每个进程只用一条查询读取相关表的列，结果缓存，之后直接按缓存选择SQL
+"""
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+# 需要探测的表
+PROBED_TABLES = ('users', 'activation_codes')
+
+
+class SchemaProbe:
+    """缓存主库中 PROBED_TABLES 的列（首次使用时探测一次，失败时下次再试）"""
+
+    def __init__(self, connect, database):
+        """
+        参数:
+            connect: 返回数据库连接上下文管理器的函数（如 db_manager.get_connection）
+            database: 主库名
+        """
+        self.connect = connect
+        self.database = database
+        self._columns = None     # (表名, 列名) 集合
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def probe(self):
+        """
+        读取表结构（已探测过时直接返回缓存）
+
+        返回:
+            set: {(表名, 列名), ...}
+        """
+        columns = self._columns
+        if columns is not None:
+            return columns
+        with self._lock:
+            if self._columns is None:
+                placeholders = ", ".join(["%s"] * len(PROBED_TABLES))
+                with self.connect() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        f"SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+                        f"WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})",
+                        (self.database,) + PROBED_TABLES
+                    )
+                    self._columns = {(table, column) for table, column in cursor.fetchall()}
+                    cursor.close()
+                if config.DEBUG:
+                    print(f"🔎 表结构探测完成: {len(self._columns)} 列")
+            return self._columns
+
+    def has_column(self, table, column):
+        """表中是否有该列（探测失败时抛出异常）"""
+        return (table, column) in self.probe()
+
+    def column_added(self, table, column):
+        """本进程执行 ALTER TABLE 加列后更新缓存"""
+        with self._lock:
+            if self._columns is not None:
+                self._columns = self._columns | {(table, column)}
+
+    def reset(self):
+        """表结构被外部修改后调用，下次使用时重新探测"""
+        with self._lock:
+            self._columns = None
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
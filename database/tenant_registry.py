@@ -0,0 +1,166 @@
+"""
+租户注册表
+缓存激活码 → 租户库名的映射和已确认存在的租户库：
+- 租户库名只计算一次（SHA-256）
+- 租户库不存在时由一个线程负责创建，其他线程等待结果，避免并发重复建库
+- 登录/首次访问租户时在后台预建连接、预加载索引，减少首个请求的等待
+"""
+import time
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+class DrawingScope:
+    """
+    drawings 表的租户范围（供拼接SQL使用）
+    - 独立库模式或主库：不需要额外条件，各属性均为空
+    - 共享表模式：查询带 tenant_id 条件，插入时写入 tenant_id
+
+    用法（租户参数在前）:
+        cursor.execute(f"SELECT ... FROM drawings WHERE {scope.filter}product_code = %s",
+                       scope.params + (product_code,))
+        cursor.execute(f"SELECT COUNT(*) FROM drawings{scope.where}", scope.params)
+        cursor.execute(f"INSERT INTO drawings ({scope.columns}product_code, pdf_path) "
+                       f"VALUES ({scope.values}%s, %s)", scope.params + (product_code, pdf_path))
+    """
+
+    __slots__ = ('tenant_id', 'params', 'condition', 'filter', 'where', 'columns', 'values')
+
+    def __init__(self, tenant_id=None):
+        self.tenant_id = tenant_id
+        if tenant_id:
+            self.params = (tenant_id,)
+            self.condition = "tenant_id = %s"
+            self.filter = "tenant_id = %s AND "
+            self.where = " WHERE tenant_id = %s"
+            self.columns = "tenant_id, "
+            self.values = "%s, "
+        else:
+            self.params = ()
+            self.condition = None
+            self.filter = self.where = self.columns = self.values = ""
+
+
+class TenantRegistry:
+    """租户库名与建库状态（线程安全）"""
+
+    def __init__(self, namer, provisioner, pool=None, warmers=None, route=None, max_names=100000):
+        """
+        参数:
+            namer: 函数 namer(activation_code) -> 租户库名
+            provisioner: 函数 provisioner(activation_code)，创建并初始化租户库
+            pool: ConnectionPool，预热时预建连接（None 表示不预建）
+            warmers: 预热时额外调用的函数列表 warmer(tenant_db)（如加载模糊查询索引）
+            route: 函数 route(tenant_db) -> 实际连接的数据库名（共享表模式下各租户共用一个库）
+            max_names: 库名缓存上限（超过后清空重建）
+        """
+        self.namer = namer
+        self.provisioner = provisioner
+        self.pool = pool
+        self.warmers = list(warmers or [])
+        self.route = route or (lambda tenant_db: tenant_db)
+        self.max_names = max_names
+        self._names = {}            # 激活码 -> 租户库名
+        self._provisioned = set()   # 已确认存在的租户库
+        self._locks = {}            # 租户库名 -> 建库锁
+        self._warmed = {}           # 租户库名 -> 最近一次预热时间
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def db_name(self, activation_code):
+        """激活码对应的租户库名（缓存）"""
+        tenant_db = self._names.get(activation_code)
+        if tenant_db is None:
+            tenant_db = self.namer(activation_code)
+            with self._lock:
+                if len(self._names) >= self.max_names:
+                    self._names.clear()
+                self._names[activation_code] = tenant_db
+        return tenant_db
+
+    def is_provisioned(self, tenant_db):
+        return tenant_db in self._provisioned
+
+    def mark_provisioned(self, tenant_db):
+        """记录租户库已存在（成功连接后调用）"""
+        with self._lock:
+            self._provisioned.add(tenant_db)
+
+    def forget(self, tenant_db):
+        """租户库被外部删除后调用，下次访问时重新建库"""
+        with self._lock:
+            self._provisioned.discard(tenant_db)
+            self._warmed.pop(tenant_db, None)
+
+    def ensure(self, activation_code):
+        """
+        确保租户库存在（同一租户并发调用时只建一次库）
+
+        返回:
+            str: 租户库名
+        """
+        tenant_db = self.db_name(activation_code)
+        if tenant_db in self._provisioned:
+            return tenant_db
+        with self._lock:
+            lock = self._locks.setdefault(tenant_db, threading.Lock())
+        with lock:
+            # 等待期间其他线程可能已建好
+            if tenant_db not in self._provisioned:
+                start_time = time.time()
+                self.provisioner(activation_code)
+                self.mark_provisioned(tenant_db)
+                if config.DEBUG:
+                    print(f"🏗️  租户库已初始化: {tenant_db}，耗时 {time.time() - start_time:.2f}s")
+        with self._lock:
+            self._locks.pop(tenant_db, None)
+        return tenant_db
+
+    def warm_up(self, tenant_db, activation_code=None, connections=None):
+        """
+        在后台预热租户：必要时建库，预建连接，调用 warmers
+        同一租户在 TENANT_WARM_INTERVAL 秒内只预热一次
+
+        参数:
+            tenant_db: 租户库名（None 表示主库，只预建连接）
+            activation_code: 激活码（提供时可建库）
+            connections: 预建连接数，默认 TENANT_WARM_CONNECTIONS
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._warmed.get(tenant_db)
+            if last is not None and now - last < config.TENANT_WARM_INTERVAL:
+                return
+            self._warmed[tenant_db] = now
+        count = config.TENANT_WARM_CONNECTIONS if connections is None else connections
+        threading.Thread(target=self._warm, args=(tenant_db, activation_code, count),
+                         daemon=True).start()
+
+    def _warm(self, tenant_db, activation_code, count):
+        try:
+            if tenant_db and activation_code:
+                self.ensure(activation_code)
+            if self.pool and count:
+                created = self.pool.prewarm(self.route(tenant_db), count)
+                if tenant_db:
+                    self.mark_provisioned(tenant_db)
+                if config.DEBUG and created:
+                    print(f"🔥 预建连接: {tenant_db or '主库'} × {created}")
+            for warmer in self.warmers:
+                warmer(tenant_db)
+        except Exception as e:
+            # 预热失败不影响正常请求（请求中会按原流程重试）
+            with self._lock:
+                self._warmed.pop(tenant_db, None)
+            print(f"⚠️  租户预热失败 {tenant_db}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'names': len(self._names), 'provisioned': len(self._provisioned)}
+
+    def _after_fork(self):
+        """子进程中重建锁；库名与建库状态仍然有效，连接需要重新预建"""
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._warmed = {}
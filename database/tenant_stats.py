@@ -0,0 +1,213 @@
+"""
+租户统计
+每个租户的统计数据（图纸总数、PDF占用空间、每日上传数、最近操作）保存在内存中：
+- 首次访问时从数据库初始化一次，PDF占用空间在后台扫描文件夹（完成前 storage_pending 为True）
+- 之后由写操作增量更新（notify_drawing_changed，包括其他进程经变更日志同步来的写操作）
+- 每隔 STATS_RESEED_SECONDS 在后台重新校准（兼顾其他进程的写入）
+更新后通过事件广播推送给 SSE 订阅者
+"""
+import os
+import time
+import datetime
+import threading
+from collections import deque
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+def stats_topic(tenant_db):
+    """统计推送的事件主题"""
+    return ('stats', tenant_db)
+
+
+class _TenantStats:
+    """单个租户的统计数据"""
+
+    def __init__(self):
+        self.total_drawings = 0
+        self.storage_bytes = 0
+        self.uploads_per_day = {}       # 'YYYY-MM-DD' -> 新增数量
+        self.recent = deque(maxlen=config.STATS_RECENT_ACTIVITY)
+        self.seeded_at = 0.0
+        self.updated_at = 0.0
+        self.reseeding = False
+        self.storage_pending = False    # 首次扫描文件夹尚未完成
+
+    def snapshot(self):
+        today = datetime.date.today()
+        days = [(today - datetime.timedelta(days=i)).isoformat() for i in range(config.STATS_DAYS - 1, -1, -1)]
+        return {
+            'total_drawings': self.total_drawings,
+            'storage_bytes': self.storage_bytes,
+            'storage_pending': self.storage_pending,
+            'uploads_per_day': [{'date': d, 'count': self.uploads_per_day.get(d, 0)} for d in days],
+            'recent_activity': list(self.recent),
+            'updated_at': self.updated_at,
+        }
+
+
+class TenantStatsManager:
+    """按租户维护统计数据"""
+
+    def __init__(self, loader, broker=None, reseed_seconds=None):
+        """
+        参数:
+            loader: 函数 loader(tenant_db, days) -> (图纸总数, {'YYYY-MM-DD': 数量})
+            broker: EventBroker，更新后向 stats_topic(tenant_db) 发布快照
+        """
+        self.loader = loader
+        self.broker = broker
+        self.reseed_seconds = reseed_seconds or config.STATS_RESEED_SECONDS
+        self._tenants = {}     # tenant_db -> _TenantStats
+        self._folders = {}     # tenant_db -> PDF文件夹（计算占用空间）
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def get(self, tenant_db, folder=None):
+        """
+        获取租户统计快照（首次访问时同步初始化，过期后在后台校准）
+
+        参数:
+            tenant_db: 租户库名（None 表示主库）
+            folder: 该租户的PDF文件夹
+
+        返回:
+            dict: 统计快照
+        """
+        if folder:
+            self._folders[tenant_db] = folder
+        with self._lock:
+            stats = self._tenants.get(tenant_db)
+        if stats is None:
+            stats = self._seed(tenant_db)
+        elif time.time() - stats.seeded_at > self.reseed_seconds and not stats.reseeding:
+            stats.reseeding = True
+            threading.Thread(target=self._reseed, args=(tenant_db,), daemon=True).start()
+        with self._lock:
+            return stats.snapshot()
+
+    def record(self, tenant_db, action, product_code=None):
+        """
+        记录一次写操作（提交后调用）
+
+        参数:
+            action: 'insert' / 'update' / 'delete'
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._tenants.get(tenant_db)
+            if stats is None:
+                # 尚未初始化的租户在首次访问时从数据库读取，无需增量
+                return
+            if action == 'insert':
+                stats.total_drawings += 1
+                day = datetime.date.today().isoformat()
+                stats.uploads_per_day[day] = stats.uploads_per_day.get(day, 0) + 1
+            elif action == 'delete':
+                stats.total_drawings = max(0, stats.total_drawings - 1)
+            stats.recent.appendleft({'action': action, 'product_code': product_code, 'at': now})
+            stats.updated_at = now
+        self._publish(tenant_db)
+
+    def add_storage(self, tenant_db, delta_bytes):
+        """记录PDF占用空间变化（上传/删除文件后调用）"""
+        with self._lock:
+            stats = self._tenants.get(tenant_db)
+            if stats is None:
+                return
+            stats.storage_bytes = max(0, stats.storage_bytes + delta_bytes)
+            stats.updated_at = time.time()
+        self._publish(tenant_db)
+
+    def invalidate(self, tenant_db=None):
+        """丢弃指定租户（或全部）的统计，下次访问时重新初始化"""
+        with self._lock:
+            if tenant_db is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant_db, None)
+
+    def _seed(self, tenant_db):
+        stats = _TenantStats()
+        # 请求中只查询数据库，文件夹（可能是网络共享目录）在后台扫描
+        self._load_into(stats, tenant_db, with_storage=False)
+        stats.storage_pending = True
+        with self._lock:
+            # 并发初始化时保留先完成的那份
+            seeded = self._tenants.setdefault(tenant_db, stats)
+        if seeded is stats:
+            threading.Thread(target=self._scan_storage, args=(tenant_db, stats), daemon=True).start()
+        return seeded
+
+    def _scan_storage(self, tenant_db, stats):
+        """后台计算首次初始化的占用空间（扫描期间的增量已包含在扫描结果中，直接覆盖）"""
+        try:
+            size = self._folder_size(self._folders.get(tenant_db))
+        except OSError as e:
+            print(f"❌ 统计PDF占用空间失败: {e}")
+            size = None
+        with self._lock:
+            if size is not None:
+                stats.storage_bytes = size
+            stats.storage_pending = False
+            stats.updated_at = time.time()
+        self._publish(tenant_db)
+
+    def _reseed(self, tenant_db):
+        fresh = _TenantStats()
+        try:
+            self._load_into(fresh, tenant_db)
+        except Exception as e:
+            print(f"❌ 统计校准失败: {e}")
+            with self._lock:
+                stats = self._tenants.get(tenant_db)
+                if stats is not None:
+                    stats.reseeding = False
+                    stats.seeded_at = time.time()   # 稍后再试
+            return
+        with self._lock:
+            old = self._tenants.get(tenant_db)
+            if old is not None:
+                fresh.recent = old.recent
+            self._tenants[tenant_db] = fresh
+        self._publish(tenant_db)
+
+    def _load_into(self, stats, tenant_db, with_storage=True):
+        start_time = time.time()
+        stats.total_drawings, stats.uploads_per_day = self.loader(tenant_db, config.STATS_DAYS)
+        if with_storage:
+            stats.storage_bytes = self._folder_size(self._folders.get(tenant_db))
+        stats.seeded_at = stats.updated_at = time.time()
+        if config.DEBUG:
+            print(f"📊 统计初始化: {tenant_db or '主库'} 共 {stats.total_drawings} 条, "
+                  f"耗时 {stats.seeded_at - start_time:.2f}s")
+
+    @staticmethod
+    def _folder_size(folder):
+        """PDF文件夹占用空间（只统计该文件夹下的PDF，不含子目录）"""
+        total = 0
+        if not folder or not os.path.isdir(folder):
+            return total
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                    try:
+                        total += entry.stat().st_size
+                    except OSError:
+                        continue
+        return total
+
+    def _publish(self, tenant_db):
+        if self.broker is None or not self.broker.has_subscribers(stats_topic(tenant_db)):
+            return
+        with self._lock:
+            stats = self._tenants.get(tenant_db)
+            snapshot = stats.snapshot() if stats is not None else None
+        if snapshot is not None:
+            self.broker.publish(stats_topic(tenant_db), snapshot)
+
+    def _after_fork(self):
+        """子进程中重建锁（统计数据沿用父进程的快照，过期后自动校准）"""
+        self._lock = threading.Lock()
+        for stats in self._tenants.values():
+            stats.reseeding = False
@@ -7,6 +7,7 @@ import socket
 import subprocess
 from app import app
 from config import config
+from web_server import serve
 
 def find_available_port(start_port=5000, max_attempts=20):
     """查找可用端口"""
@@ -107,14 +108,9 @@ def main():
     print("\n按 Ctrl+C 停止服务器")
     print("=" * 60)
     
-    # 启动Flask应用
+    # 启动Web服务（开发服务器或生产服务器，见 config.WEB_SERVER）
     try:
-        app.run(
-            host='0.0.0.0',
-            port=port,
-            debug=config.DEBUG,
-            threaded=True
-        )
+        serve(app, host='0.0.0.0', port=port)
     except KeyboardInterrupt:
         print("\n👋 服务器已停止")
     except Exception as e:
@@ -0,0 +1,421 @@
+"""
+性能基准测试
+在 config 配置的 MySQL/MariaDB 中为每个规模创建一个合成租户（激活码 VB-BENCH<规模>-0000，重复执行时复用），
+按指定并发测量各操作的吞吐量与延迟分位数，结果写入 JSON 供不同提交之间对比
+
+用法:
+    python scripts/benchmark.py                                   # 规模 10k，并发 1/8/32
+    python scripts/benchmark.py --sizes 10000,100000,1000000 --concurrency 1,16 --requests 5000
+    python scripts/benchmark.py --targets search_code,api_pdf --output data/benchmarks/before.json
+    python scripts/benchmark.py --compare data/benchmarks/before.json data/benchmarks/after.json
+
+测试项:
+    search_code   db_manager.search_by_code（--miss-ratio 比例的产品号不存在）
+    search_fuzzy  db_manager.search_fuzzy（内存索引启用时先等待加载完成）
+    api_search    POST /api/search
+    api_pdf       GET /api/pdf/<id>（读取完整响应）
+    upload        POST /api/admin/drawings/upload（结束后删除上传的记录与文件）
+
+HTTP 测试项在进程内通过 Flask 测试客户端执行：包含路由、会话、数据库与文件读取，
+不包含网络与 WSGI 服务器本身的开销
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# 让脚本可以导入项目根目录的模块
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import config
+from database.db_manager import db_manager
+from utils.pdf_handler import pdf_handler
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLE_PDF = os.path.join(ROOT_DIR, "test_assets", "sample.pdf")
+BENCH_PDF_NAME = "bench_sample.pdf"
+ALL_TARGETS = ['search_code', 'search_fuzzy', 'api_search', 'api_pdf', 'upload']
+
+
+def bench_code(size):
+    """规模对应的租户激活码"""
+    return f"VB-BENCH{size:07d}-0000"
+
+
+def product_code(i):
+    return f"BM-{i:07d}"
+
+
+# ==================== 准备数据 ====================
+
+def seed_tenant(size, batch_size=10000):
+    """
+    确保合成租户中有 size 条图纸（产品号 BM-0000000 起，全部指向同一个示例PDF）
+
+    返回:
+        tuple: (激活码, 租户库名)
+    """
+    code = bench_code(size)
+    tenant_db = db_manager.ensure_tenant_database(code)
+    db_manager.set_tenant_override(tenant_db)
+    try:
+        existing = db_manager.get_total_count()
+    finally:
+        db_manager.set_tenant_override(None)
+    if existing >= size:
+        print(f"♻️  复用租户 {tenant_db}: {existing} 条")
+        return (code, tenant_db)
+
+    print(f"🌱 写入租户 {tenant_db}: 目标 {size} 条（已有 {existing} 条）")
+    start_time = time.time()
+    for start in range(0, size, batch_size):
+        rows = [(product_code(i), BENCH_PDF_NAME) for i in range(start, min(start + batch_size, size))]
+        result = db_manager.bulk_upsert_drawings(rows, on_duplicate='skip', activation_code=code)
+        if result['failed']:
+            raise RuntimeError(f"写入失败 {len(result['failed'])} 条")
+        print(f"\r  {min(start + batch_size, size)}/{size}", end='', flush=True)
+    print(f"\n✅ 写入完成，耗时 {time.time() - start_time:.1f}s")
+    return (code, tenant_db)
+
+
+def ensure_sample_pdf():
+    """在PDF根目录放置示例PDF（/api/pdf 按根目录查找文件）"""
+    path = pdf_handler.get_full_path(BENCH_PDF_NAME)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(SAMPLE_PDF, path)
+        pdf_handler.mark_saved(path)
+    return path
+
+
+def sample_ids(code, count):
+    """取前 count 条图纸的ID（供 api_pdf 使用）"""
+    ids = []
+    cursor = None
+    while len(ids) < count:
+        page = db_manager.get_drawings_page(cursor=cursor, limit=config.ADMIN_PAGE_MAX_SIZE,
+                                            activation_code=code)
+        ids.extend(item['id'] for item in page['items'])
+        if not page['has_more']:
+            break
+        cursor = page['next_cursor']
+    return ids[:count]
+
+
+def wait_fuzzy_index(tenant_db, timeout=300):
+    """等待模糊查询索引加载完成（未启用索引时直接返回）"""
+    if not db_manager.fuzzy_index:
+        return False
+    db_manager.fuzzy_index.warm(tenant_db)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if db_manager.fuzzy_index.count(tenant_db) is not None:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+# ==================== 压测 ====================
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def run_load(op, concurrency, total, warmup=0):
+    """
+    用 concurrency 个线程共执行 total 次 op(i)
+
+    参数:
+        op: 执行一次操作的函数，失败时抛出异常
+        warmup: 正式计时前先执行的次数（不计入结果）
+
+    返回:
+        dict: {'requests', 'errors', 'throughput', 'latency_ms': {...}}
+    """
+    for i in range(warmup):
+        try:
+            op(i)
+        except Exception:
+            pass
+
+    # 正式请求的序号接在预热之后（避免重复的查询键命中缓存、上传产品号重复）
+    counter = iter(range(warmup, warmup + total))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                op(i)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            **{f"p{p}": round(percentile(latencies, p), 3) if latencies else None
+               for p in (50, 90, 95, 99)},
+            'max': round(latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+class _Clients(threading.local):
+    """每个线程一个已登录的 Flask 测试客户端"""
+
+    def __init__(self, app, code, tenant_db):
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 0
+            sess['username'] = 'benchmark'
+            sess['activation_code'] = code
+            sess['tenant_db'] = tenant_db
+
+
+def build_ops(target, ctx, args, rng):
+    """
+    生成测试项的操作函数
+
+    返回:
+        function: op(i)
+    """
+    size, tenant_db = ctx['size'], ctx['tenant_db']
+    n = args.requests + args.warmup
+    if target in ('search_code', 'api_search'):
+        keys = [product_code(rng.randrange(size)) if rng.random() >= args.miss_ratio
+                else f"MISS-{rng.randrange(10 ** 9)}" for _ in range(n)]
+    if target == 'search_code':
+        def op(i):
+            db_manager.set_tenant_override(tenant_db)
+            try:
+                db_manager.search_by_code(keys[i % n])
+            finally:
+                db_manager.set_tenant_override(None)
+        return op
+    if target == 'search_fuzzy':
+        # 产品号中间的连续数字，命中条数随规模变化
+        keywords = [f"{rng.randrange(size):07d}"[1:5] for _ in range(n)]
+
+        def op(i):
+            db_manager.set_tenant_override(tenant_db)
+            try:
+                db_manager.search_fuzzy(keywords[i % n])
+            finally:
+                db_manager.set_tenant_override(None)
+        return op
+
+    clients = ctx['clients']
+    if target == 'api_search':
+        def op(i):
+            response = clients.client.post('/api/search', json={'product_code': keys[i % n]})
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+        return op
+    if target == 'api_pdf':
+        ids = ctx['ids']
+
+        def op(i):
+            response = clients.client.get(f"/api/pdf/{ids[i % len(ids)]}")
+            try:
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                response.get_data()
+            finally:
+                response.close()
+        return op
+    if target == 'upload':
+        with open(SAMPLE_PDF, 'rb') as f:
+            pdf_bytes = f.read()
+        prefix = ctx['upload_prefix']
+
+        def op(i):
+            response = clients.client.post('/api/admin/drawings/upload', data={
+                'product_code': f"{prefix}{i:07d}",
+                'pdf_file': (io.BytesIO(pdf_bytes), 'bench.pdf'),
+            }, content_type='multipart/form-data')
+            if not (response.get_json(silent=True) or {}).get('success'):
+                raise RuntimeError((response.get_json(silent=True) or {}).get('message', response.status_code))
+        return op
+    raise ValueError(f"未知的测试项: {target}")
+
+
+def cleanup_uploads(code, prefix):
+    """删除 upload 测试写入的记录与文件"""
+    ids = []
+    cursor = None
+    while True:
+        page = db_manager.get_drawings_page(cursor=cursor, limit=config.ADMIN_PAGE_MAX_SIZE,
+                                            keyword=prefix, activation_code=code)
+        ids.extend(item['id'] for item in page['items'])
+        if not page['has_more']:
+            break
+        cursor = page['next_cursor']
+    if not ids:
+        return 0
+    deleted, unused_paths = db_manager.delete_drawings_by_ids(ids, activation_code=code)
+    for pdf_path in unused_paths:
+        # 上传接口把文件保存在PDF根目录
+        pdf_handler.remove_file(pdf_handler.get_full_path(pdf_path))
+    return len(deleted)
+
+
+# ==================== 结果 ====================
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(before_path, after_path):
+    """对比两次结果（按 规模/测试项/并发 配对）"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+    key = lambda r: (r['size'], r['target'], r['concurrency'])
+    old = {key(r): r for r in before['results']}
+    print(f"📊 {(before['meta'].get('commit') or '?')[:10]} → {(after['meta'].get('commit') or '?')[:10]}")
+    print(f"{'规模':>9} {'测试项':<13} {'并发':>4} {'吞吐/s':>18} {'p50 ms':>20} {'p99 ms':>20}")
+    for r in after['results']:
+        o = old.get(key(r))
+        if o is None:
+            continue
+
+        def cell(a, b):
+            if a is None or b is None:
+                return f"{'-':>20}"
+            change = (b - a) / a * 100 if a else 0.0
+            return f"{a:>8.1f}→{b:<8.1f}{change:+.0f}%"
+        print(f"{r['size']:>9} {r['target']:<13} {r['concurrency']:>4} "
+              f"{cell(o['throughput'], r['throughput'])} "
+              f"{cell(o['latency_ms']['p50'], r['latency_ms']['p50'])} "
+              f"{cell(o['latency_ms']['p99'], r['latency_ms']['p99'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询、PDF下载与上传的性能基准测试")
+    parser.add_argument('--sizes', default='10000', help="租户图纸数量，逗号分隔（如 10000,100000,1000000）")
+    parser.add_argument('--concurrency', default='1,8,32', help="并发线程数，逗号分隔")
+    parser.add_argument('--targets', default=','.join(ALL_TARGETS), help="测试项，逗号分隔")
+    parser.add_argument('--requests', type=int, default=2000, help="每组（规模×测试项×并发）的请求数")
+    parser.add_argument('--warmup', type=int, default=100, help="每组正式计时前的预热请求数")
+    parser.add_argument('--miss-ratio', type=float, default=0.1, help="精确查询中不存在的产品号比例")
+    parser.add_argument('--no-cache', action='store_true', help="关闭产品号查询缓存（测量数据库路径）")
+    parser.add_argument('--seed', type=int, default=20240601, help="随机数种子（保证多次运行请求序列一致）")
+    parser.add_argument('--seed-only', action='store_true', help="只准备数据，不测试")
+    parser.add_argument('--output', help="结果文件（默认 data/benchmarks/bench-<时间>.json）")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="对比两次结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    levels = [int(c) for c in args.concurrency.split(',') if c]
+    targets = [t for t in args.targets.split(',') if t]
+    unknown = set(targets) - set(ALL_TARGETS)
+    if unknown:
+        parser.error(f"未知的测试项: {', '.join(sorted(unknown))}")
+    if args.no_cache:
+        db_manager.code_cache = None
+
+    ensure_sample_pdf()
+    tenants = {size: seed_tenant(size) for size in sizes}
+    if args.seed_only:
+        return
+
+    from app import app
+    meta = {
+        'commit': _git_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': f"{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}",
+        'storage_mode': config.TENANT_STORAGE_MODE,
+        'query_cache': db_manager.code_cache is not None,
+        'fuzzy_index': db_manager.fuzzy_index is not None,
+        'pool': config.DB_POOL_ENABLED,
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'miss_ratio': args.miss_ratio,
+        'seed': args.seed,
+    }
+    results = []
+    for size in sizes:
+        code, tenant_db = tenants[size]
+        ctx = {
+            'size': size,
+            'tenant_db': tenant_db,
+            'clients': _Clients(app, code, tenant_db),
+            'ids': sample_ids(code, min(size, 10000)) if 'api_pdf' in targets else [],
+        }
+        if 'search_fuzzy' in targets:
+            meta.setdefault('fuzzy_index_ready', {})[size] = wait_fuzzy_index(tenant_db)
+        try:
+            for target in targets:
+                for concurrency in levels:
+                    rng = random.Random(f"{args.seed}-{size}-{target}")
+                    # 每组上传使用不同前缀，避免产品号重复
+                    ctx['upload_prefix'] = f"BU-{int(time.time())}-{concurrency}-"
+                    op = build_ops(target, ctx, args, rng)
+                    result = run_load(op, concurrency, args.requests, args.warmup)
+                    result.update(size=size, target=target, concurrency=concurrency)
+                    results.append(result)
+                    lat = result['latency_ms']
+                    print(f"⚡ {size:>8} {target:<13} 并发 {concurrency:>3}: {result['throughput']}/s, "
+                          f"p50 {lat['p50']}ms, p99 {lat['p99']}ms, 错误 {result['errors']}")
+        finally:
+            if 'upload' in targets:
+                removed = cleanup_uploads(code, "BU-")
+                print(f"🧹 已清理上传测试数据 {removed} 条")
+            db_manager.set_tenant_override(None)
+
+    output = args.output or os.path.join('data', 'benchmarks', f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"📄 结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
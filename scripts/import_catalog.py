@@ -0,0 +1,86 @@
+"""
+从 CSV / XLSX 批量导入图纸目录（产品号, PDF路径）
+
+用法:
+    python scripts/import_catalog.py catalog.csv                       # 导入主库/PDF根目录
+    python scripts/import_catalog.py catalog.xlsx -c VB-XXXX-XXXX      # 导入指定租户
+    python scripts/import_catalog.py catalog.csv --update --report problems.csv
+
+说明:
+- 第一行含 产品号/图号/product_code、PDF路径/文件名/pdf_path 等表头时按表头定位列，否则按第1、2列读取
+- CSV 支持 UTF-8（含BOM）与 GBK，整个文件须使用同一编码（开始写入前会完整检查）；XLSX 需要 openpyxl
+- PDF路径为相对于租户PDF目录的路径；文件不存在的行默认不导入（--allow-missing 时照常导入）
+- 按块（--chunk-size，默认 DB_BULK_CHUNK_SIZE）写入，每块一个事务；中途失败时已提交的块保留，
+  产品号已存在时跳过（--update 时更新PDF路径），因此可以用同一文件重新执行
+- 问题行（格式无效、文件缺失、写入失败）汇总输出，--report 导出全部明细
+"""
+import os
+import sys
+import argparse
+
+# 让脚本可以导入项目根目录的模块
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.catalog_import import CatalogImporter
+
+
+def print_progress(stats):
+    print(f"\r⏳ 已读取 {stats['read']} 行 | 新增 {stats['inserted']} | 更新 {stats['updated']} | "
+          f"跳过 {stats['skipped']} | 文件缺失 {stats['missing']} | 无效 {stats['invalid']} | "
+          f"失败 {stats['failed']} | {stats['elapsed']:.1f}s", end='', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从 CSV / XLSX 批量导入图纸目录（产品号, PDF路径）")
+    parser.add_argument("file", help="目录文件路径（.csv / .xlsx）")
+    parser.add_argument("-c", "--activation-code", help="目标租户激活码，省略则导入主库/PDF根目录")
+    parser.add_argument("--update", action="store_true", help="产品号已存在时更新PDF路径（默认跳过）")
+    parser.add_argument("--allow-missing", action="store_true", help="PDF文件不存在时仍然导入")
+    parser.add_argument("--chunk-size", type=int, help="每批写入行数")
+    parser.add_argument("--workers", type=int, help="文件检查并发线程数")
+    parser.add_argument("--report", help="把问题行明细写入该CSV文件")
+    args = parser.parse_args()
+
+    code = args.activation_code.strip().upper() if args.activation_code else None
+    importer = CatalogImporter(
+        activation_code=code,
+        on_duplicate='update' if args.update else 'skip',
+        allow_missing=args.allow_missing,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        progress=print_progress,
+    )
+    print(f"🚚 开始导入: {args.file}")
+    try:
+        stats = importer.run(args.file)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print()
+
+    print("✅ 导入完成")
+    print(f"  • 读取行数: {stats['read']}")
+    print(f"  • 新增: {stats['inserted']}")
+    print(f"  • 更新: {stats['updated']}")
+    print(f"  • 跳过（已存在/重复）: {stats['skipped']}")
+    print(f"  • PDF文件缺失: {stats['missing']}")
+    print(f"  • 格式无效: {stats['invalid']}")
+    print(f"  • 写入失败: {stats['failed']}")
+
+    if importer.errors:
+        if args.report:
+            import csv
+            with open(args.report, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.DictWriter(f, fieldnames=['line', 'product_code', 'message'])
+                writer.writeheader()
+                writer.writerows(importer.errors)
+            print(f"📄 问题行明细已写入: {args.report}")
+        else:
+            for err in importer.errors[:20]:
+                print(f"  ⚠️ 第 {err['line']} 行 {err['product_code']}: {err['message']}")
+            if len(importer.errors) > 20:
+                print(f"  ... 共 {len(importer.errors)} 条，使用 --report 导出全部")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,222 @@
+"""
+把主库 drawings 表（含 activation_code 列）中的图纸迁移到各租户（按激活码）
+
+用法:
+    python scripts/migrate_drawings_to_tenants.py               # 迁移（中断后再次执行会从断点继续）
+    python scripts/migrate_drawings_to_tenants.py --workers 8   # 并行进程数
+    python scripts/migrate_drawings_to_tenants.py --restart     # 忽略断点，从头迁移
+    python scripts/migrate_drawings_to_tenants.py --verify-only # 只核对
+
+说明:
+- 每个租户由一个工作进程迁移：按 id 顺序流式读取主库（服务端游标，不把整表读入内存），
+  每批用 bulk_upsert_drawings 多行写入，提交后记录断点（该租户已迁移到的最大 id）
+- 断点保存在 --state-dir 下，每个租户一个 JSON 文件
+- 目标租户中已存在的产品号跳过，不覆盖
+- 迁移结束后逐租户核对：主库中该激活码的每一行在租户中都存在且PDF路径一致（行数 + 校验和）
+- 目标存储方式（独立库/共享表）由 config.TENANT_STORAGE_MODE 决定
+"""
 import os
 import sys
+import json
+import time
+import argparse
+import multiprocessing
 
 # 让脚本可以导入项目根目录的模块
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pymysql
+from config import config
 from database.db_manager import db_manager
 
+DEFAULT_STATE_DIR = "data/migrations/drawings_to_tenants"
 
-def main():
-    print("🚚 开始迁移图纸数据到各租户数据库（按激活码）...")
-    total = 0
-    migrated = 0
-    skipped = 0
-    tenants = {}
-
-    # 从主库读取所有图纸（需包含 activation_code 列）
-    with db_manager.get_connection() as conn:
+
+def _connect(cursorclass=pymysql.cursors.Cursor):
+    cfg = dict(db_manager.connection_config)
+    cfg['cursorclass'] = cursorclass
+    return pymysql.connect(**cfg)
+
+
+# ==================== 断点 ====================
+
+def _state_path(state_dir, tenant_db):
+    return os.path.join(state_dir, f"{tenant_db}.json")
+
+
+def load_state(state_dir, tenant_db):
+    """读取租户断点（不存在时返回初始状态）"""
+    try:
+        with open(_state_path(state_dir, tenant_db), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'last_id': 0, 'migrated': 0, 'skipped': 0, 'done': False}
+
+
+def save_state(state_dir, tenant_db, state):
+    """写入租户断点（先写临时文件再替换，中途被杀也不会留下半个文件）"""
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path(state_dir, tenant_db)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# ==================== 迁移（工作进程） ====================
+
+def migrate_tenant(task):
+    """
+    迁移一个激活码的全部图纸（在工作进程中执行）
+
+    参数:
+        task: (激活码, 断点目录, 每批行数)
+
+    返回:
+        dict: {'code', 'tenant_db', 'migrated', 'skipped', 'error', 'elapsed'}
+    """
+    code, state_dir, batch_size = task
+    start_time = time.time()
+    tenant_db = db_manager.tenant_db_from_code(code)
+    state = load_state(state_dir, tenant_db)
+    result = {'code': code, 'tenant_db': tenant_db, 'error': None}
+    try:
+        db_manager.ensure_tenant_database(code)
+    except Exception as e:
+        result.update(error=f"创建租户失败: {e}", migrated=state['migrated'], skipped=state['skipped'], elapsed=0.0)
+        return result
+    if state['done']:
+        result.update(migrated=state['migrated'], skipped=state['skipped'], elapsed=0.0)
+        return result
+
+    conn = _connect(pymysql.cursors.SSCursor)
+    try:
         cur = conn.cursor()
-        try:
-            cur.execute("SELECT product_code, pdf_path, activation_code FROM drawings")
-        except Exception as e:
-            print(f"❌ 主库 drawings 表不包含 activation_code 列，无法自动迁移: {e}")
-            return
-        rows = cur.fetchall()
+        cur.execute(
+            "SELECT id, product_code, pdf_path FROM drawings "
+            "WHERE activation_code = %s AND id > %s ORDER BY id",
+            (code, state['last_id'])
+        )
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            outcome = db_manager.bulk_upsert_drawings(
+                [(product_code, pdf_path) for _, product_code, pdf_path in rows],
+                on_duplicate='skip', chunk_size=batch_size, activation_code=code
+            )
+            if outcome['failed']:
+                # 断点停在失败批次之前，修复后重新执行即可继续
+                result['error'] = f"{len(outcome['failed'])} 条写入失败（如 {outcome['failed'][0]}）"
+                break
+            state['last_id'] = rows[-1][0]
+            state['migrated'] += len(outcome['inserted'])
+            state['skipped'] += len(outcome['skipped'])
+            save_state(state_dir, tenant_db, state)
         cur.close()
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        conn.close()
+
+    if result['error'] is None:
+        state['done'] = True
+        save_state(state_dir, tenant_db, state)
+    result.update(migrated=state['migrated'], skipped=state['skipped'], elapsed=time.time() - start_time)
+    return result
+
+
+# ==================== 核对 ====================
+
+def verify_tenant(conn, code):
+    """
+    核对主库中该激活码的图纸是否都已迁移（产品号与PDF路径均一致）
+
+    返回:
+        tuple: ((源行数, 源校验和), (已迁移的一致行数, 校验和))
+    """
+    digest = "COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT(s.product_code, '|', s.pdf_path))), 0)"
+    tenant_db = db_manager.tenant_db_from_code(code)
+    scope = db_manager.drawing_scope(code)
+    target_db = db_manager.physical_db(tenant_db)
+    tenant_filter = "t.tenant_id = %s AND " if scope.tenant_id else ""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {digest} FROM drawings s WHERE s.activation_code = %s", (code,))
+        source = cur.fetchone()
+        cur.execute(
+            f"SELECT {digest} FROM drawings s "
+            f"JOIN `{target_db}`.drawings t ON {tenant_filter}"
+            f"t.product_code = s.product_code AND t.pdf_path = s.pdf_path "
+            f"WHERE s.activation_code = %s",
+            scope.params + (code,)
+        )
+        matched = cur.fetchone()
+    return ((source[0], int(source[1])), (matched[0], int(matched[1])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把主库图纸按激活码迁移到各租户")
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1),
+                        help="并行迁移的进程数")
+    parser.add_argument('--batch', type=int, default=config.DB_BULK_CHUNK_SIZE, help="每批写入行数")
+    parser.add_argument('--state-dir', default=DEFAULT_STATE_DIR, help="断点目录")
+    parser.add_argument('--restart', action='store_true', help="清除断点，从头迁移")
+    parser.add_argument('--verify-only', action='store_true', help="不迁移，只核对")
+    args = parser.parse_args()
+
+    print("🚚 开始迁移图纸数据到各租户（按激活码）...")
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT activation_code, COUNT(*) FROM drawings GROUP BY activation_code")
+            except Exception as e:
+                print(f"❌ 主库 drawings 表不包含 activation_code 列，无法自动迁移: {e}")
+                return
+            groups = cur.fetchall()
+    no_code = sum(count for code, count in groups if not code)
+    codes = sorted(code for code, _ in groups if code)
+    print(f"📊 主库共 {sum(count for _, count in groups)} 条图纸记录，{len(codes)} 个激活码"
+          f"（无激活码 {no_code} 条，不迁移）")
+
+    if args.restart and os.path.isdir(args.state_dir):
+        for name in os.listdir(args.state_dir):
+            os.remove(os.path.join(args.state_dir, name))
+
+    failed = []
+    if not args.verify_only:
+        tasks = [(code, args.state_dir, args.batch) for code in codes]
+        totals = {'migrated': 0, 'skipped': 0}
+        start_time = time.time()
+        # 子进程中的连接池等由 fork 后的钩子重建
+        with multiprocessing.Pool(processes=max(1, args.workers)) as pool:
+            for done, result in enumerate(pool.imap_unordered(migrate_tenant, tasks), 1):
+                totals['migrated'] += result['migrated']
+                totals['skipped'] += result['skipped']
+                if result['error']:
+                    failed.append(result['code'])
+                    print(f"  ❌ [{done}/{len(tasks)}] {result['tenant_db']}: {result['error']}")
+                else:
+                    print(f"  ✅ [{done}/{len(tasks)}] {result['tenant_db']}: 迁移 {result['migrated']}, "
+                          f"跳过 {result['skipped']}, 耗时 {result['elapsed']:.1f}s")
+        print(f"✅ 迁移完成: 成功迁移 {totals['migrated']}, 跳过（已存在） {totals['skipped']}, "
+              f"涉及租户 {len(codes)} 个, 耗时 {time.time() - start_time:.1f}s")
 
-    total = len(rows)
-    print(f"📊 主库共 {total} 条图纸记录")
-
-    # 按激活码分组
-    from collections import defaultdict
-    grouped = defaultdict(list)
-    for product_code, pdf_path, activation_code in rows:
-        if not activation_code:
-            skipped += 1
-            continue
-        grouped[activation_code].append((product_code, pdf_path))
-
-    # 迁移到各租户库
-    for code, items in grouped.items():
-        tenant_db = db_manager.ensure_tenant_database(code)
-        tenants[code] = tenant_db
-        with db_manager.get_tenant_connection(activation_code=code) as tconn:
-            tcur = tconn.cursor()
-            for product_code, pdf_path in items:
-                try:
-                    tcur.execute(
-                        "INSERT INTO drawings (product_code, pdf_path) VALUES (%s, %s)",
-                        (product_code, pdf_path)
-                    )
-                    migrated += 1
-                except pymysql.IntegrityError:
-                    skipped += 1
-            tcur.close()
-
-    print("✅ 迁移完成")
-    print(f"  • 成功迁移: {migrated}")
-    print(f"  • 跳过/重复或无激活码: {skipped}")
-    print(f"  • 涉及租户: {len(tenants)} 个")
+    print("🔍 核对各租户...")
+    mismatched = []
+    with _connect() as conn:
+        for code in codes:
+            if code in failed:
+                continue
+            source, matched = verify_tenant(conn, code)
+            if source != matched:
+                mismatched.append(code)
+                print(f"  ❌ {db_manager.tenant_db_from_code(code)}: 主库 {source[0]} 条, "
+                      f"租户中一致 {matched[0]} 条（已存在且PDF路径不同的产品号被跳过）")
+    if failed or mismatched:
+        print(f"❌ 失败 {len(failed)} 个租户，核对不一致 {len(mismatched)} 个租户；修复后重新执行即可从断点继续")
+        sys.exit(1)
+    print(f"✅ 核对通过: {len(codes)} 个租户")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
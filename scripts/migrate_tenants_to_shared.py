@@ -0,0 +1,134 @@
+"""
+把各租户独立库（DB_NAME_t_<hash>）中的图纸迁移到共享表（TENANT_SHARED_DB.drawings，按 tenant_id 区分）
+
+用法:
+    python scripts/migrate_tenants_to_shared.py                # 迁移全部租户库
+    python scripts/migrate_tenants_to_shared.py --tenant drawing_system_t_0cbff82c
+    python scripts/migrate_tenants_to_shared.py --verify-only  # 只核对行数与校验和
+
+说明:
+- 同一 MySQL 实例内用 INSERT ... SELECT 按ID区间分批复制，每批一个事务，不经过本机内存
+- 已迁移的行按 (tenant_id, product_code) 覆盖，可重复执行
+- 迁移完成后核对每个租户的行数与校验和，全部一致后再把 config.TENANT_STORAGE_MODE 改为 'shared'
+- 原租户库不会被删除（可用于回退），确认无误后再手动清理
+- 共享表的图纸ID重新分配，迁移前生成的带ID链接（如移动端PDF链接）需要重新获取
+"""
+import os
+import sys
+import time
+import argparse
+
+# 让脚本可以导入项目根目录的模块
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pymysql
+from config import config
+from database.db_manager import db_manager
+
+
+def _connect():
+    server_cfg = dict(db_manager.connection_config)
+    server_cfg.pop('database', None)
+    server_cfg['autocommit'] = False
+    return pymysql.connect(**server_cfg)
+
+
+def list_tenant_databases(conn):
+    """列出所有租户库"""
+    prefix = f"{config.DB_NAME}_t_"
+    pattern = prefix.replace('\\', '\\\\').replace('_', '\\_') + '%'
+    with conn.cursor() as cur:
+        cur.execute("SHOW DATABASES LIKE %s", (pattern,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def copy_tenant(conn, tenant_db, batch_size):
+    """
+    按ID区间把一个租户库的图纸复制到共享表
+
+    返回:
+        int: 源库行数
+    """
+    shared = config.TENANT_SHARED_DB
+    tenant_id = db_manager.tenant_id(tenant_db)
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM `{tenant_db}`.drawings")
+        total, max_id = cur.fetchone()
+        last_id = 0
+        while last_id < max_id:
+            upper = last_id + batch_size
+            cur.execute(
+                f"""
+                INSERT INTO `{shared}`.drawings (tenant_id, product_code, pdf_path, created_at, updated_at)
+                SELECT %s, product_code, pdf_path, created_at, updated_at
+                FROM `{tenant_db}`.drawings
+                WHERE id > %s AND id <= %s
+                ON DUPLICATE KEY UPDATE pdf_path = VALUES(pdf_path), updated_at = VALUES(updated_at)
+                """,
+                (tenant_id, last_id, upper)
+            )
+            conn.commit()
+            last_id = upper
+    return total
+
+
+def checksum(conn, database, tenant_id=None):
+    """
+    行数与校验和（产品号+PDF路径的 CRC32 异或，与行顺序无关）
+
+    返回:
+        tuple: (行数, 校验和)
+    """
+    sql = (f"SELECT COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT(product_code, '|', pdf_path))), 0) "
+           f"FROM `{database}`.drawings")
+    params = ()
+    if tenant_id is not None:
+        sql += " WHERE tenant_id = %s"
+        params = (tenant_id,)
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        count, crc = cur.fetchone()
+    return (count, int(crc))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把租户独立库迁移到共享表")
+    parser.add_argument('--tenant', action='append', help="只迁移指定的租户库（可重复）")
+    parser.add_argument('--batch', type=int, default=config.DB_BULK_CHUNK_SIZE * 10,
+                        help="每个事务复制的ID区间大小")
+    parser.add_argument('--verify-only', action='store_true', help="不复制，只核对")
+    args = parser.parse_args()
+
+    db_manager.ensure_shared_database()
+    conn = _connect()
+    try:
+        tenants = args.tenant or list_tenant_databases(conn)
+        print(f"🚚 共 {len(tenants)} 个租户库 → {config.TENANT_SHARED_DB}.drawings")
+
+        mismatched = []
+        total_rows = 0
+        for tenant_db in tenants:
+            start_time = time.time()
+            if not args.verify_only:
+                total_rows += copy_tenant(conn, tenant_db, args.batch)
+            source = checksum(conn, tenant_db)
+            target = checksum(conn, config.TENANT_SHARED_DB, db_manager.tenant_id(tenant_db))
+            status = "✅" if source == target else "❌"
+            if source != target:
+                mismatched.append(tenant_db)
+            print(f"  {status} {tenant_db}: 源 {source[0]} 条 / 共享表 {target[0]} 条, "
+                  f"耗时 {time.time() - start_time:.2f}s")
+    finally:
+        conn.close()
+
+    if not args.verify_only:
+        print(f"📊 共复制 {total_rows} 条")
+    if mismatched:
+        # 共享表中有而源库已删除的行也会导致不一致，可清理该租户后重新迁移
+        print(f"❌ {len(mismatched)} 个租户核对不一致: {', '.join(mismatched)}")
+        sys.exit(1)
+    print("✅ 核对通过，可将 config.TENANT_STORAGE_MODE 改为 'shared' 后重启服务")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+测试PDF内容寻址存储（硬链接去重、引用释放与回收）与流式上传的临时文件
+只在临时目录中读写，可直接运行，也可用 pytest 执行
+"""
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from config import config
+from utils.blob_store import BlobStore, blob_store
+from utils.upload_stream import StagedUpload
+
+PDF = b'%PDF-1.4\n' + b'x' * 1000
+
+
+@contextmanager
+def _workspace(dedup=True):
+    """临时PDF根目录；期间开启/关闭去重，结束后恢复配置并删除目录"""
+    root = tempfile.mkdtemp()
+    old_flag, old_root = config.PDF_DEDUP_ENABLED, blob_store.root
+    config.PDF_DEDUP_ENABLED = dedup
+    blob_store.root = os.path.join(root, '.blobs')
+    try:
+        yield root
+    finally:
+        config.PDF_DEDUP_ENABLED, blob_store.root = old_flag, old_root
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _put(store, root, name, data=PDF):
+    tmp = os.path.join(root, 'upload.part')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    dest = os.path.join(root, name)
+    return store.put(tmp, hashlib.sha256(data).hexdigest(), dest), dest
+
+
+def test_duplicate_content_is_hard_linked():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        first, a = _put(store, root, 'A/1.pdf')
+        second, b = _put(store, root, 'B/2.pdf')
+        assert (first, second) == (False, True)
+        assert os.path.samefile(a, b)
+        # 链接数：blob + 两个对外文件
+        assert os.stat(a).st_nlink == 3
+        assert not os.path.exists(os.path.join(root, 'upload.part'))
+        assert store.stats()['blobs'] == 1 and store.deduplicated == 1
+
+
+def test_release_keeps_blob_while_other_links_exist():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        _, a = _put(store, root, 'A/1.pdf')
+        _, b = _put(store, root, 'B/2.pdf')
+        assert store.release(a)
+        assert not os.path.exists(a)
+        assert store._gc_pending == set()
+        with open(b, 'rb') as f:
+            assert f.read() == PDF
+        assert not store.release(a)
+
+
+def test_last_release_queues_blob_and_gc_removes_it():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        store.GC_GRACE_SECONDS = 0
+        _, a = _put(store, root, 'A/1.pdf')
+        blob = store.blob_path(hashlib.sha256(PDF).hexdigest())
+        store.collect_garbage_async = lambda: None   # 由测试直接调用回收
+        assert store.release(a)
+        assert store._gc_pending == {blob}
+        time.sleep(0.01)
+        assert store.collect_garbage(set(store._gc_pending)) == 1
+        assert not os.path.exists(blob)
+
+
+def test_gc_skips_blobs_inside_grace_period():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        store.collect_garbage_async = lambda: None
+        _, a = _put(store, root, 'A/1.pdf')
+        blob = store.blob_path(hashlib.sha256(PDF).hexdigest())
+        store.release(a)
+        store._gc_pending.clear()
+        assert store.collect_garbage([blob]) == 0
+        assert os.path.exists(blob)
+        # 留到下一次回收
+        assert store._gc_pending == {blob}
+
+
+def test_full_sweep_removes_only_unlinked_blobs():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        store.GC_GRACE_SECONDS = 0
+        _put(store, root, 'A/keep.pdf', b'%PDF-keep')
+        _, gone = _put(store, root, 'A/gone.pdf', b'%PDF-gone')
+        os.remove(gone)   # 绕过 release，模拟进程退出前未回收
+        time.sleep(0.01)
+        assert store.stats()['blobs'] == 2
+        assert store.collect_garbage() == 1
+        assert store.stats()['blobs'] == 2   # 磁盘统计有缓存
+        store._disk_stats = None
+        assert store.stats()['blobs'] == 1
+
+
+def test_release_of_plain_file():
+    with _workspace() as root:
+        store = BlobStore(os.path.join(root, '.blobs'))
+        path = os.path.join(root, 'plain.pdf')
+        with open(path, 'wb') as f:
+            f.write(PDF)
+        assert store.release(path)
+        assert not os.path.exists(path)
+
+
+def test_staged_upload_commit_without_dedup():
+    with _workspace(dedup=False) as root:
+        upload = StagedUpload(os.path.join(root, '.incoming'))
+        for i in range(0, len(PDF), 100):
+            upload.write(PDF[i:i + 100])
+        assert upload.is_pdf and upload.size == len(PDF)
+        dest = os.path.join(root, 'T', 'a.pdf')
+        assert upload.commit(dest) == hashlib.sha256(PDF).hexdigest()
+        upload.close()
+        with open(dest, 'rb') as f:
+            assert f.read() == PDF
+        assert os.listdir(os.path.join(root, '.incoming')) == []
+
+
+def test_staged_upload_commit_with_dedup():
+    with _workspace(dedup=True) as root:
+        paths = []
+        for name in ('a.pdf', 'b.pdf'):
+            upload = StagedUpload(os.path.join(root, '.incoming'))
+            upload.write(PDF)
+            paths.append(os.path.join(root, name))
+            upload.commit(paths[-1])
+            upload.close()
+        assert os.path.samefile(*paths)
+        assert os.listdir(os.path.join(root, '.incoming')) == []
+
+
+def test_staged_upload_close_without_commit_removes_temp():
+    with _workspace() as root:
+        upload = StagedUpload(os.path.join(root, '.incoming'))
+        upload.write(b'not a pdf')
+        assert not upload.is_pdf
+        upload.close()
+        assert not os.path.exists(upload.path)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试PDF去重存储与流式上传")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 去重存储测试完成！共 {len(tests)} 项")
+    print("=" * 60)
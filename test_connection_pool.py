@@ -0,0 +1,151 @@
+"""
+测试数据库连接池（不需要MySQL：用假连接代替 pymysql.connect）
+可直接运行，也可用 pytest 执行
+"""
+import time
+import threading
+from database.connection_pool import ConnectionPool, PoolExhaustedError
+
+
+class FakeConnection:
+    """只实现连接池用到的属性与方法"""
+
+    def __init__(self, database):
+        self.database = database
+        self.open = True
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.open:
+            raise ConnectionError("连接已关闭")
+
+    def close(self):
+        self.open = False
+
+
+class FakePool(ConnectionPool):
+    """_connect 返回假连接，并记录创建过的连接"""
+
+    def __init__(self, **kwargs):
+        super().__init__({'database': 'main'}, **kwargs)
+        self.connections = []
+
+    def _connect(self, database):
+        conn = FakeConnection(database)
+        self.connections.append(conn)
+        return conn
+
+
+def test_reuse_after_release():
+    pool = FakePool()
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert (stats['created'], stats['reused'], stats['in_use'], stats['idle']) == (1, 1, 1, 0)
+
+
+def test_databases_are_pooled_separately():
+    pool = FakePool()
+    main = pool.acquire()
+    tenant = pool.acquire('tenant_a')
+    assert (main.database, tenant.database) == ('main', 'tenant_a')
+    pool.release(main)
+    pool.release(tenant)
+    assert pool.acquire('tenant_a') is tenant
+    assert pool.stats()['databases'] == {'main': 1, 'tenant_a': 1}
+
+
+def test_max_per_db_times_out():
+    pool = FakePool(max_per_db=1, acquire_timeout=0.1)
+    pool.acquire('tenant_a')
+    start = time.monotonic()
+    try:
+        pool.acquire('tenant_a')
+    except PoolExhaustedError:
+        pass
+    else:
+        raise AssertionError("超过 max_per_db 时应抛出 PoolExhaustedError")
+    assert time.monotonic() - start >= 0.1
+    # 其他库不受影响
+    assert pool.acquire('tenant_b').database == 'tenant_b'
+
+
+def test_waiter_gets_released_connection():
+    pool = FakePool(max_per_db=1, acquire_timeout=2)
+    conn = pool.acquire()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(conn)
+    waiter.join(1)
+    assert result == [conn]
+
+
+def test_max_total_closes_idle_connection_of_other_db():
+    pool = FakePool(max_total=2)
+    a = pool.acquire('tenant_a')
+    b = pool.acquire('tenant_b')
+    pool.release(a)
+    c = pool.acquire('tenant_c')
+    assert not a.open and b.open and c.open
+    assert pool.stats()['databases'] == {'tenant_b': 1, 'tenant_c': 1}
+
+
+def test_discard_frees_slot():
+    pool = FakePool(max_per_db=1, acquire_timeout=0.1)
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    assert not conn.open
+    assert pool.acquire() is not conn
+    assert pool.stats()['closed'] == 1
+
+
+def test_closed_connection_is_not_reused():
+    pool = FakePool()
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    assert pool.stats()['idle'] == 0
+    assert pool.acquire() is not conn
+
+
+def test_stale_idle_connection_is_pinged():
+    pool = FakePool(ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert conn.pings == 1
+
+
+def test_evict_idle():
+    pool = FakePool(idle_timeout=0.05)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.1)
+    assert pool.evict_idle() == 1
+    assert not conn.open
+    assert pool.stats()['total'] == 0
+
+
+def test_prewarm_respects_max_per_db():
+    pool = FakePool(max_per_db=3)
+    assert pool.prewarm('tenant_a', 5) == 3
+    assert pool.prewarm('tenant_a', 5) == 0
+    assert pool.stats()['idle'] == 3
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试数据库连接池")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 连接池测试完成！共 {len(tests)} 项")
+    print("=" * 60)
@@ -0,0 +1,127 @@
+"""
+测试管理端游标（keyset）分页：游标编解码与分页SQL（不需要MySQL：用假连接记录执行的SQL）
+可直接运行，也可用 pytest 执行
+"""
+from contextlib import contextmanager
+from database.db_manager import db_manager
+
+encode = db_manager._encode_page_cursor
+decode = db_manager._decode_page_cursor
+
+
+def test_cursor_round_trip():
+    for value, sort, order in [(1, 'id', 'asc'), (987654321, 'id', 'desc'),
+                               ('NR-1001', 'product_code', 'asc'), ('图号 Ａ/é%_', 'product_code', 'desc')]:
+        cursor = encode(value, sort, order)
+        assert '=' not in cursor and '+' not in cursor and '/' not in cursor   # 可直接放在URL中
+        assert decode(cursor, sort, order) == value
+
+
+def test_cursor_must_match_sort_and_order():
+    cursor = encode(10, 'id', 'asc')
+    for sort, order in [('id', 'desc'), ('product_code', 'asc')]:
+        try:
+            decode(cursor, sort, order)
+        except ValueError:
+            continue
+        raise AssertionError("排序方式不一致的游标应被拒绝")
+
+
+def test_invalid_cursor():
+    for cursor in ['', 'not-base64!', encode(1, 'id', 'asc')[:-3], 'W10', 'bnVsbA']:
+        try:
+            decode(cursor, 'id', 'asc')
+        except ValueError:
+            continue
+        raise AssertionError(f"无效游标应抛出 ValueError: {cursor!r}")
+
+
+class _FakeCursor:
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+
+    def execute(self, sql, params):
+        self.log.append((' '.join(sql.split()), list(params)))
+        limit = params[-1]
+        self.result = self.rows[:limit]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+
+    def cursor(self, *args):
+        return _FakeCursor(self.rows, self.log)
+
+
+@contextmanager
+def _fake_tenant(rows):
+    """把 get_tenant_connection 换成返回固定行的假连接，记录执行的SQL"""
+    log = []
+    original = db_manager.get_tenant_connection
+
+    @contextmanager
+    def connection(activation_code=None):
+        yield _FakeConnection(rows, log)
+
+    db_manager.get_tenant_connection = connection
+    try:
+        yield log
+    finally:
+        db_manager.get_tenant_connection = original
+
+
+def test_page_returns_cursor_for_next_page():
+    rows = [{'id': i, 'product_code': f"P{i}", 'pdf_path': f"P{i}.pdf"} for i in range(1, 7)]
+    with _fake_tenant(rows) as log:
+        page = db_manager.get_drawings_page(limit=5, with_total=False)
+    assert [item['id'] for item in page['items']] == [1, 2, 3, 4, 5]
+    assert page['has_more'] and page['total'] is None
+    assert decode(page['next_cursor'], 'id', 'asc') == 5
+    sql, params = log[0]
+    assert sql.endswith("ORDER BY id ASC LIMIT %s") and 'WHERE' not in sql
+    assert params[-1] == 6   # 多取一条判断是否还有下一页
+
+
+def test_page_with_cursor_and_keyword():
+    rows = [{'id': 3, 'product_code': 'B_2', 'pdf_path': 'b.pdf'}]
+    cursor = encode('A', 'product_code', 'desc')
+    with _fake_tenant(rows) as log:
+        page = db_manager.get_drawings_page(cursor=cursor, limit=5, keyword='_2%', sort='product_code',
+                                            order='desc', with_total=False)
+    assert page['next_cursor'] is None and not page['has_more']
+    sql, params = log[0]
+    assert "product_code LIKE %s AND product_code < %s ORDER BY product_code DESC" in sql
+    # LIKE 通配符按普通字符匹配
+    assert params[-3:] == ['%\\_2\\%%', 'A', 6]
+
+
+def test_invalid_sort_is_rejected():
+    for kwargs in ({'sort': 'pdf_path'}, {'order': 'up'}):
+        try:
+            db_manager.get_drawings_page(**kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"应拒绝 {kwargs}")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试管理端游标分页")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 游标分页测试完成！共 {len(tests)} 项")
+    print("=" * 60)
@@ -0,0 +1,137 @@
+"""
+测试模糊查询索引（三元组倒排索引 + 按数据库排序输出）
+可直接运行，也可用 pytest 执行
+"""
+import time
+from database.fuzzy_index import TrigramIndex, FuzzyIndexManager, fold, collation_key, trigrams
+
+
+def _codes(results):
+    return [r['product_code'] for r in results]
+
+
+def _index(codes):
+    """按给定顺序（视为数据库 ORDER BY product_code 的结果）加载"""
+    index = TrigramIndex()
+    assert index.load([(i + 1, code, f"{code}.pdf") for i, code in enumerate(codes)], max_rows=1000)
+    return index
+
+
+def test_fold_matches_unicode_ci():
+    assert fold('ABC') == 'abc'
+    assert fold('Café') == 'cafe'
+    assert fold('ＡＢ１２') == 'ab12'
+    assert fold('Straße') == 'strasse'
+
+
+def test_collation_key_ignores_trailing_spaces():
+    assert collation_key('AB-01  ') == collation_key('ab-01')
+    assert collation_key(' AB') != collation_key('AB')
+
+
+def test_trigrams():
+    assert trigrams('abcd') == {'abc', 'bcd'}
+    assert trigrams('ab') == set()
+
+
+def test_results_follow_load_order():
+    # 加载顺序即数据库排序，结果不按 Python 字符串顺序重排
+    index = _index(['X-10', 'x-2', 'X-3', 'Y-10'])
+    assert _codes(index.search('x-', 10, scan_threshold=100)) == ['X-10', 'x-2', 'X-3']
+    assert _codes(index.search('-10', 10, scan_threshold=100)) == ['X-10', 'Y-10']
+
+
+def test_candidate_path_and_scan_path_agree():
+    codes = [f"AB{i:04d}" for i in range(300)]
+    index = _index(codes)
+    via_postings = index.search('b01', 50, scan_threshold=10000)
+    via_scan = index.search('b01', 50, scan_threshold=0)
+    assert via_postings == via_scan
+    assert _codes(via_postings) == [c for c in codes if 'b01' in c.lower()][:50]
+
+
+def test_short_keyword_scans_in_order_and_stops_at_limit():
+    index = _index([f"A{i:03d}" for i in range(100)])
+    assert _codes(index.search('a', 3, scan_threshold=100)) == ['A000', 'A001', 'A002']
+
+
+def test_accent_and_width_insensitive_match():
+    index = _index(['CAFÉ-1', 'ＡＢＣ-2'])
+    assert _codes(index.search('cafe', 10, 100)) == ['CAFÉ-1']
+    assert _codes(index.search('abc-', 10, 100)) == ['ＡＢＣ-2']
+
+
+def test_added_rows_sort_after_loaded_rows():
+    index = _index(['B1', 'B3'])
+    index.add(10, 'A2', 'a2.pdf')
+    index.add(11, 'B2', 'b2.pdf')
+    assert _codes(index.search('', 10, 100)) == ['B1', 'B3', 'A2', 'B2']
+
+
+def test_pdf_only_update_keeps_rank():
+    index = _index(['B1', 'B2', 'B3'])
+    index.add(2, 'B2', 'new.pdf')
+    results = index.search('b', 10, 100)
+    assert _codes(results) == ['B1', 'B2', 'B3']
+    assert results[1]['pdf_path'] == 'new.pdf'
+
+
+def test_code_change_moves_row_to_end():
+    index = _index(['B1', 'B2', 'B3'])
+    index.add(1, 'B9', 'b9.pdf')
+    assert _codes(index.search('b', 10, 100)) == ['B2', 'B3', 'B9']
+    assert index.id_for_code('b1') is None
+    assert index.id_for_code('b9 ') == 1
+
+
+def test_remove():
+    index = _index(['AB1', 'AB2'])
+    index.remove(1)
+    assert _codes(index.search('ab', 10, 100)) == ['AB2']
+    assert len(index) == 1
+    assert 'ab1' not in index.postings.get('ab1', set())
+
+
+def test_load_rejects_oversized():
+    index = TrigramIndex()
+    assert not index.load([(i, f"C{i}", '') for i in range(5)], max_rows=3)
+
+
+def test_scan_resumes_after_position():
+    index = _index([f"K{i:02d}" for i in range(10)])
+    kw = fold('k')
+    first, after = index.scan(kw, 100, max_entries=4)
+    assert _codes(first) == ['K00', 'K01', 'K02', 'K03']
+    # 两段之间删除上一段的最后一条，续扫不受影响
+    index.remove(4)
+    rest, after = index.scan(kw, 100, after=after)
+    assert _codes(rest) == ['K04', 'K05', 'K06', 'K07', 'K08', 'K09']
+    assert after is None
+
+
+def test_manager_sliced_scan():
+    codes = [f"M{i:05d}" for i in range(1000)]
+    manager = FuzzyIndexManager(lambda tenant_db, limit: [(i, c, '') for i, c in enumerate(codes)],
+                                max_rows=10000, refresh_seconds=3600, scan_threshold=1)
+    manager.SCAN_SLICE = 64
+    assert manager.search('t1', 'm', 10) is None   # 首次查询触发后台加载
+    deadline = time.monotonic() + 5
+    while manager.count('t1') is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _codes(manager.search('t1', 'm', 5)) == codes[:5]
+    assert _codes(manager.search('t1', '99', 500)) == [c for c in codes if '99' in c]
+    assert manager.search('t1', 'm%', 5) is None   # LIKE 通配符交给数据库
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试模糊查询索引")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 模糊查询索引测试完成！共 {len(tests)} 项")
+    print("=" * 60)
@@ -0,0 +1,114 @@
+"""
+测试密码哈希（scrypt、旧版 SHA-256 校验与重新生成、并发名额）
+可直接运行，也可用 pytest 执行
+"""
+import time
+import hashlib
+import threading
+from utils.password_hasher import PasswordHasher, ScryptScheme
+
+FAST_N = 2 ** 10   # 测试用较小的开销参数
+
+
+def _hasher():
+    hasher = PasswordHasher('scrypt')
+    hasher.register(ScryptScheme(n=FAST_N), default=True)
+    return hasher
+
+
+def test_scrypt_hash_and_verify():
+    hasher = _hasher()
+    stored = hasher.hash('秘密 pass')
+    assert stored.startswith(f"scrypt${FAST_N}$")
+    assert hasher.verify('秘密 pass', stored) == (True, False)
+    assert hasher.verify('wrong', stored) == (False, False)
+    # 每次生成的盐不同
+    assert hasher.hash('秘密 pass') != stored
+
+
+def test_legacy_sha256_verifies_and_needs_rehash():
+    hasher = _hasher()
+    legacy = hashlib.sha256('admin123'.encode()).hexdigest()
+    assert hasher.verify('admin123', legacy) == (True, True)
+    assert hasher.verify('admin123', legacy.upper()) == (True, True)
+    assert hasher.verify('admin124', legacy) == (False, False)
+
+
+def test_weaker_parameters_need_rehash():
+    hasher = _hasher()
+    weaker = ScryptScheme(n=FAST_N // 2).hash('pw')
+    assert hasher.verify('pw', weaker) == (True, True)
+
+
+def test_unknown_or_broken_hash():
+    hasher = _hasher()
+    for stored in ('', None, 'plaintext', 'md5$abc', 'scrypt$1024$8$1$!!$!!', f"scrypt${FAST_N}$8"):
+        assert hasher.verify('pw', stored) == (False, False)
+
+
+def test_verify_dummy():
+    hasher = _hasher()
+    assert hasher.verify_dummy('anything') is None
+    dummy = hasher._dummy
+    assert dummy.startswith('scrypt$')
+    hasher.verify_dummy('again')
+    assert hasher._dummy is dummy   # 只生成一次
+
+
+class _SlowScheme:
+    """记录同时执行的校验数量"""
+
+    name = 'slow'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def identify(self, stored):
+        return stored.startswith('slow$')
+
+    def hash(self, password):
+        return f"slow${password}"
+
+    def verify(self, password, stored):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return stored == self.hash(password)
+
+    def needs_rehash(self, stored):
+        return False
+
+
+def test_concurrency_is_capped():
+    hasher = _hasher()
+    hasher._slots = threading.BoundedSemaphore(2)
+    slow = _SlowScheme()
+    hasher.register(slow, default=True)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(hasher.verify('pw', 'slow$pw')))
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == [(True, False)] * 6
+    assert slow.peak == 2
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试密码哈希")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 密码哈希测试完成！共 {len(tests)} 项")
+    print("=" * 60)
@@ -0,0 +1,92 @@
+"""
+测试查询缓存（进程内 LRU + TTL）
+可直接运行，也可用 pytest 执行
+"""
+import time
+from database.query_cache import LRUCache
+
+
+def test_get_set_and_default():
+    cache = LRUCache(max_entries=10, ttl=60)
+    assert cache.get('missing') is None
+    assert cache.get('missing', 'default') == 'default'
+    cache.set('a', {'id': 1})
+    assert cache.get('a') == {'id': 1}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 1)
+
+
+def test_overwrite_refreshes_value_and_ttl():
+    cache = LRUCache(ttl=0.05)
+    cache.set('a', 1)
+    time.sleep(0.03)
+    cache.set('a', 2)
+    time.sleep(0.03)
+    assert cache.get('a') == 2
+    assert len(cache) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')          # a 变为最近访问
+    cache.set('c', 3)       # 淘汰 b
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_entries_expire():
+    cache = LRUCache(ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=60)
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+
+def test_delete_and_delete_where():
+    cache = LRUCache()
+    for tenant in ('t1', 't2'):
+        for code in ('a', 'b'):
+            cache.set((tenant, code), code)
+    cache.delete(('t1', 'a'))
+    assert cache.get(('t1', 'a')) is None
+    assert cache.delete_where(lambda key: key[0] == 't2') == 2
+    assert len(cache) == 1
+
+
+def test_empty_cache_is_falsy():
+    # 判断缓存是否启用时必须用 is not None
+    cache = LRUCache()
+    assert not cache
+    assert cache is not None
+    cache.set('a', 1)
+    assert cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_after_fork_resets_stats():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache._after_fork()
+    assert cache.stats()['hits'] == 0
+    assert cache.get('a') == 1
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试查询缓存")
+    print("=" * 60)
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith('test_') and callable(fn)]
+    for i, (name, fn) in enumerate(tests, start=1):
+        print(f"\n[测试{i}] {fn.__name__}...")
+        fn()
+        print("✅ 通过")
+    print("\n" + "=" * 60)
+    print(f"🎉 查询缓存测试完成！共 {len(tests)} 项")
+    print("=" * 60)
@@ -1,8 +1,8 @@
 """
 数据管理界面组件
 """
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                             QTableWidgetItem, QPushButton, QMessageBox, QLabel, QDialog)
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                             QAbstractItemView, QPushButton, QMessageBox, QLabel, QDialog)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QColor
 import os
@@ -11,6 +11,7 @@ import shutil  # 新增：用于文件移动
 from config import config
 from database.db_manager import db_manager
 from utils.pdf_handler import pdf_handler
+from .drawing_model import DrawingTableModel
 from .dialogs.add_dialog import AddDrawingDialog
 from .dialogs.edit_dialog import EditDrawingDialog
 
@@ -35,12 +36,14 @@ class DataManagerWidget(QWidget):
         title.setStyleSheet("color: #2c3e50; padding: 10px;")
         layout.addWidget(title)
         
-        # 表格
-        self.table = QTableWidget()
+        # 表格（模型按页懒加载，滚动到底部时自动取下一页）
+        self.model = DrawingTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.setFont(QFont("Microsoft YaHei", 10))
         self.table.setAlternatingRowColors(True)
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 gridline-color: #bdc3c7;
                 background-color: white;
                 alternate-background-color: #ecf0f1;
@@ -53,11 +56,14 @@ class DataManagerWidget(QWidget):
                 font-weight: bold;
             }
         """)
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["ID", "产品号", "PDF路径"])
+        # 固定列宽（按内容调整列宽需要遍历全部行）
+        self.table.setColumnWidth(0, 80)
+        self.table.setColumnWidth(1, 200)
         self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)  # 只读
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)  # 只读
         layout.addWidget(self.table)
         
         # 按钮栏
@@ -135,49 +141,38 @@ class DataManagerWidget(QWidget):
         self.setLayout(layout)
         
         # 连接选中事件
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         # 连接双击事件
-        self.table.itemDoubleClicked.connect(self.on_item_double_clicked)
+        self.table.doubleClicked.connect(self.on_item_double_clicked)
     
     def load_data(self):
-        """加载数据到表格"""
-        drawings = db_manager.get_all_drawings()
-        self.table.setRowCount(len(drawings))
-        
-        for row, drawing in enumerate(drawings):
-            # ID
-            id_item = QTableWidgetItem(str(drawing['id']))
-            id_item.setTextAlignment(Qt.AlignCenter)
-            self.table.setItem(row, 0, id_item)
-            
-            # 产品号
-            code_item = QTableWidgetItem(drawing['product_code'])
-            code_item.setTextAlignment(Qt.AlignCenter)
-            self.table.setItem(row, 1, code_item)
-            
-            # PDF路径
-            path_item = QTableWidgetItem(drawing['pdf_path'])
-            path_item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-            self.table.setItem(row, 2, path_item)
-        
-        # 调整列宽
-        self.table.resizeColumnsToContents()
-        self.table.horizontalHeader().setStretchLastSection(True)
+        """重新加载表格（只取第一页，其余在滚动时加载）"""
+        self.model.reload()
+        self.on_selection_changed()
+    
+    def selected_drawing(self):
+        """
+        获取当前选中的图纸
         
-        if config.DEBUG:
-            print(f"✅ 加载 {len(drawings)} 条数据")
+        返回:
+            dict: {'id', 'product_code', 'pdf_path'}，未选中时返回None
+        """
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.model.row_data(rows[0].row())
     
     def on_selection_changed(self):
         """选中行变化"""
-        has_selection = len(self.table.selectedItems()) > 0
+        has_selection = self.table.selectionModel().hasSelection()
         self.edit_btn.setEnabled(has_selection)
         self.delete_btn.setEnabled(has_selection)
     
-    def on_item_double_clicked(self, item):
+    def on_item_double_clicked(self, index):
         """双击单元格事件"""
-        col = item.column()
+        col = index.column()
         if col == 2:  # PDF路径列
-            pdf_path = item.text()
+            pdf_path = self.model.row_data(index.row())['pdf_path']
             if self.main_window and self.main_window.status_bar:
                 self.main_window.status_bar.showMessage("正在打开PDF...")
             success, message = pdf_handler.open_pdf(pdf_path)
@@ -197,11 +192,11 @@ class DataManagerWidget(QWidget):
     
     def edit_drawing(self):
         """编辑"""
-        if not self.table.selectedItems():
+        drawing = self.selected_drawing()
+        if not drawing:
             return
-        row = self.table.currentRow()
-        product_code = self.table.item(row, 1).text()
-        current_path = self.table.item(row, 2).text()
+        product_code = drawing['product_code']
+        current_path = drawing['pdf_path']
         
         dialog = EditDrawingDialog(product_code, current_path, self)
         if dialog.exec_() == QDialog.Accepted:
@@ -209,11 +204,11 @@ class DataManagerWidget(QWidget):
     
     def delete_drawing(self):
         """删除"""
-        if not self.table.selectedItems():
+        drawing = self.selected_drawing()
+        if not drawing:
             return
-        row = self.table.currentRow()
-        product_code = self.table.item(row, 1).text()
-        pdf_path = self.table.item(row, 2).text()
+        product_code = drawing['product_code']
+        pdf_path = drawing['pdf_path']
         
         # 构建服务器PDF路径
         server_pdf_path = os.path.join(config.PDF_NETWORK_PATH.rstrip(os.sep), pdf_path)
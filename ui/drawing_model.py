@@ -0,0 +1,102 @@
+"""
+图纸表格数据模型
+按页（keyset游标）从数据库懒加载，滚动到底部时由视图通过 canFetchMore/fetchMore 继续取数；
+每页在后台线程查询（QueryExecutor），结果返回后再插入表格，界面不等待数据库
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from config import config
+from database.db_manager import db_manager
+from ui.query_worker import QueryExecutor
+
+
+class DrawingTableModel(QAbstractTableModel):
+    """图纸列表模型（只读）"""
+
+    COLUMNS = [("ID", 'id'), ("产品号", 'product_code'), ("PDF路径", 'pdf_path')]
+
+    def __init__(self, parent=None, page_size=None):
+        super().__init__(parent)
+        self.page_size = page_size or config.DESKTOP_PAGE_SIZE
+        self.query_executor = QueryExecutor(self, max_threads=1)
+        self._rows = []
+        self._cursor = None
+        self._has_more = True
+        self._loading = False
+
+    # ---------- Qt 模型接口 ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self._rows[index.row()][self.COLUMNS[index.column()][1]])
+        if role == Qt.TextAlignmentRole:
+            if index.column() == 2:
+                return Qt.AlignLeft | Qt.AlignVCenter
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        """在后台取下一页，返回后追加到末尾（不需要总数，不执行 COUNT）"""
+        if parent.isValid() or not self._has_more or self._loading:
+            return
+        self._loading = True
+        self.query_executor.submit('page', db_manager.get_drawings_page,
+                                   cursor=self._cursor, limit=self.page_size, with_total=False,
+                                   on_result=self._on_page, on_error=self._on_page_error)
+
+    def _on_page(self, page):
+        self._loading = False
+        self._cursor = page['next_cursor']
+        self._has_more = page['has_more']
+        items = page['items']
+        if items:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+            self._rows.extend(items)
+            self.endInsertRows()
+
+        if config.DEBUG:
+            print(f"✅ 加载 {len(items)} 条数据（已加载 {len(self._rows)} 条）")
+
+    def _on_page_error(self, message):
+        print(f"❌ 加载数据失败: {message}")
+        self._loading = False
+        self._has_more = False
+
+    # ---------- 辅助方法 ----------
+
+    def reload(self):
+        """清空并从第一页重新加载（尚未返回的旧页被丢弃）"""
+        self.query_executor.cancel('page')
+        self.beginResetModel()
+        self._rows = []
+        self._cursor = None
+        self._has_more = True
+        self._loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def row_data(self, row):
+        """
+        获取指定行的图纸数据
+
+        返回:
+            dict: {'id', 'product_code', 'pdf_path'}
+        """
+        return self._rows[row]
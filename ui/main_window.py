@@ -8,7 +8,7 @@ from PyQt5.QtWidgets import (
     QLineEdit, QPushButton, QTextEdit, QLabel, QMessageBox, QGroupBox, 
     QStatusBar
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QEvent
 from PyQt5.QtGui import QFont, QIcon
 
 from config import config
@@ -16,6 +16,21 @@ from database.db_manager import db_manager
 from utils.pdf_handler import pdf_handler
 from ui.data_manager import DataManagerWidget
 from ui.pdf_viewer import PDFViewer
+from ui.query_worker import QueryExecutor
+
+
+def _lookup_drawing(product_code):
+    """
+    查询图纸并检查PDF文件（在后台线程执行）
+    
+    返回:
+        tuple: (图纸信息或None, 完整路径, 文件是否存在)
+    """
+    drawing = db_manager.search_by_code(product_code)
+    if not drawing:
+        return (None, None, False)
+    exists, full_path = pdf_handler.check_exists(drawing['pdf_path'])
+    return (drawing, full_path, exists)
 
 
 class MainWindow(QMainWindow):
@@ -27,6 +42,12 @@ class MainWindow(QMainWindow):
         # 当前查询到的图纸信息
         self.current_drawing = None
         
+        # 同步其他桌面端/Web端的写操作（查询缓存、模糊查询索引）：不常驻轮询，启动和窗口获得焦点时读取一次变更日志
+        db_manager.sync_change_log()
+        
+        # 后台查询（数据库/网络共享访问不阻塞界面）
+        self.query_executor = QueryExecutor(self)
+        
         # 初始化界面
         self.init_ui()
         
@@ -213,41 +234,44 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage("就绪 - 请输入产品号查询", 5000)
     
     def search_drawing(self):
-        """查询图纸"""
+        """查询图纸（后台执行，连续扫码时只显示最后一次的结果）"""
         product_code = self.code_input.text().strip()
         if not product_code:
             QMessageBox.warning(self, "提示", "请输入产品号！")
             return
         
-        self.search_btn.setEnabled(False)
-        self.status_bar.showMessage("正在查询...")
-        
-        # 查询
-        self.current_drawing = db_manager.search_by_code(product_code)
+        self.status_bar.showMessage(f"正在查询: {product_code}...")
+        self.query_executor.submit(
+            'search', _lookup_drawing, product_code,
+            on_result=lambda result: self.on_search_finished(product_code, result),
+            on_error=self.on_query_failed
+        )
+    
+    def on_search_finished(self, product_code, result):
+        """查询完成（界面线程）"""
+        drawing, full_path, exists = result
+        self.current_drawing = drawing
         
-        if self.current_drawing:
-            full_path = pdf_handler.get_full_path(self.current_drawing['pdf_path'])
-            self.display_drawing_info(self.current_drawing)
+        if drawing:
+            self.display_drawing_info(drawing, full_path)
             # 加载嵌入PDF（替换外部打开）
-            if self.pdf_viewer.load_pdf(full_path):
+            if exists and self.pdf_viewer.load_pdf(full_path, verified=True):
                 self.status_bar.showMessage(f"PDF加载成功: {product_code}", 3000)
             else:
+                self.pdf_viewer.clear()
                 self.status_bar.showMessage("PDF加载失败 - 文件不存在", 3000)
-                # 如果加载失败，可选：调用外部打开作为回退
-                # success, msg = pdf_handler.open_pdf(self.current_drawing['pdf_path'])
-                # if not success:
-                #     QMessageBox.critical(self, "错误", msg)
         else:
-            self.current_drawing = None
             self.display_not_found(product_code)
             self.pdf_viewer.clear()
             self.status_bar.showMessage(f"未找到图纸: {product_code}", 3000)
-        
-        self.search_btn.setEnabled(True)
     
-    def display_drawing_info(self, drawing):
+    def on_query_failed(self, message):
+        """后台查询失败（界面线程）"""
+        self.status_bar.showMessage("查询失败", 3000)
+        QMessageBox.critical(self, "错误", f"查询失败: {message}")
+    
+    def display_drawing_info(self, drawing, full_path):
         """显示图纸信息"""
-        full_path = pdf_handler.get_full_path(drawing['pdf_path'])
         info_text = f"""
 ╔═══════════════════════════════════════════════════════════╗
                     查询成功 - 图纸信息                    
@@ -294,9 +318,15 @@ class MainWindow(QMainWindow):
         self.info_display.setText(not_found_text)
     
     def show_statistics(self):
-        """显示统计信息"""
-        total = db_manager.get_total_count()
-        
+        """显示统计信息（后台查询总数）"""
+        self.status_bar.showMessage("正在统计...")
+        self.query_executor.submit('stats', db_manager.get_total_count,
+                                   on_result=self.on_statistics_finished,
+                                   on_error=self.on_query_failed)
+    
+    def on_statistics_finished(self, total):
+        """统计完成（界面线程）"""
+        self.status_bar.clearMessage()
         stats_text = f"""
 统计信息
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -312,6 +342,7 @@ PDF目录: {config.PDF_NETWORK_PATH}
     
     def clear_display(self):
         """清空显示"""
+        self.query_executor.cancel('search')
         self.code_input.clear()
         self.current_drawing = None
         self.pdf_viewer.clear()
@@ -323,4 +354,15 @@ PDF目录: {config.PDF_NETWORK_PATH}
         """处理键盘事件"""
         # Ctrl+Q 退出
         if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_Q:
-            self.close()
\ No newline at end of file
+            self.close()
+    
+    def changeEvent(self, event):
+        """窗口获得焦点时读取其他桌面端/Web端的写操作"""
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            db_manager.sync_change_log()
+        super().changeEvent(event)
+    
+    def closeEvent(self, event):
+        """关闭窗口：取消排队中的查询并等待执行中的查询结束"""
+        self.query_executor.shutdown()
+        super().closeEvent(event)
@@ -7,13 +7,14 @@ from PyQt5.QtWidgets import (
     QLineEdit, QPushButton, QTextEdit, QLabel, QMessageBox, QGroupBox, 
     QStatusBar
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QEvent
 from PyQt5.QtGui import QFont, QIcon
 
 from config import config
 from database.db_manager import db_manager
 from utils.pdf_handler import pdf_handler
 from ui.data_manager import DataManagerWidget
+from ui.query_worker import QueryExecutor
 
 
 class MainWindow(QMainWindow):
@@ -25,6 +26,12 @@ class MainWindow(QMainWindow):
         # 当前查询到的图纸信息
         self.current_drawing = None
         
+        # 同步其他桌面端/Web端的写操作（查询缓存、模糊查询索引）：不常驻轮询，启动和窗口获得焦点时读取一次变更日志
+        db_manager.sync_change_log()
+        
+        # 后台查询（数据库/网络共享访问不阻塞界面）
+        self.query_executor = QueryExecutor(self)
+        
         # 初始化界面
         self.init_ui()
         
@@ -235,17 +242,22 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage("就绪 - 请输入产品号查询", 5000)
     
     def search_drawing(self):
-        """查询图纸"""
+        """查询图纸（后台执行，连续扫码时只显示最后一次的结果）"""
         product_code = self.code_input.text().strip()
         if not product_code:
             QMessageBox.warning(self, "提示", "请输入产品号！")
             return
         
-        self.search_btn.setEnabled(False)
-        self.status_bar.showMessage("正在查询...")
-        
-        # 查询
-        self.current_drawing = db_manager.search_by_code(product_code)
+        self.status_bar.showMessage(f"正在查询: {product_code}...")
+        self.query_executor.submit(
+            'search', db_manager.search_by_code, product_code,
+            on_result=lambda drawing: self.on_search_finished(product_code, drawing),
+            on_error=self.on_query_failed
+        )
+    
+    def on_search_finished(self, product_code, drawing):
+        """查询完成（界面线程）"""
+        self.current_drawing = drawing
         
         if self.current_drawing:
             self.display_drawing_info(self.current_drawing)
@@ -256,8 +268,11 @@ class MainWindow(QMainWindow):
             self.display_not_found(product_code)
             self.open_btn.setEnabled(False)
             self.status_bar.showMessage(f"未找到图纸: {product_code}", 3000)
-        
-        self.search_btn.setEnabled(True)
+    
+    def on_query_failed(self, message):
+        """后台查询失败（界面线程）"""
+        self.status_bar.showMessage("查询失败", 3000)
+        QMessageBox.critical(self, "错误", f"查询失败: {message}")
     
     def display_drawing_info(self, drawing):
         """显示图纸信息"""
@@ -332,9 +347,15 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", message)
     
     def show_statistics(self):
-        """显示统计信息"""
-        total = db_manager.get_total_count()
-        
+        """显示统计信息（后台查询总数）"""
+        self.status_bar.showMessage("正在统计...")
+        self.query_executor.submit('stats', db_manager.get_total_count,
+                                   on_result=self.on_statistics_finished,
+                                   on_error=self.on_query_failed)
+    
+    def on_statistics_finished(self, total):
+        """统计完成（界面线程）"""
+        self.status_bar.clearMessage()
         stats_text = f"""
 统计信息
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -350,6 +371,7 @@ PDF目录: {config.PDF_NETWORK_PATH}
     
     def clear_display(self):
         """清空显示"""
+        self.query_executor.cancel('search')
         self.code_input.clear()
         self.current_drawing = None
         self.open_btn.setEnabled(False)
@@ -361,4 +383,15 @@ PDF目录: {config.PDF_NETWORK_PATH}
         """处理键盘事件"""
         # Ctrl+Q 退出
         if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_Q:
-            self.close()
\ No newline at end of file
+            self.close()
+    
+    def changeEvent(self, event):
+        """窗口获得焦点时读取其他桌面端/Web端的写操作"""
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            db_manager.sync_change_log()
+        super().changeEvent(event)
+    
+    def closeEvent(self, event):
+        """关闭窗口：取消排队中的查询并等待执行中的查询结束"""
+        self.query_executor.shutdown()
+        super().closeEvent(event)
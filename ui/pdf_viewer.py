@@ -62,9 +62,15 @@ class PDFViewer(QWidget):
         self.setLayout(layout)
         self.hide()  # 初始隐藏
     
-    def load_pdf(self, pdf_full_path):
-        """加载PDF文件"""
-        if not pdf_full_path or not os.path.exists(pdf_full_path):
+    def load_pdf(self, pdf_full_path, verified=False):
+        """
+        加载PDF文件
+        
+        参数:
+            pdf_full_path: PDF完整路径
+            verified: 调用方已在后台确认文件存在时为True（避免在界面线程访问网络共享）
+        """
+        if not pdf_full_path or (not verified and not os.path.exists(pdf_full_path)):
             print(f"❌ PDF路径不存在: {pdf_full_path}")  # 调试输出
             return False
         url = QUrl.fromLocalFile(pdf_full_path)
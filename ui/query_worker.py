@@ -0,0 +1,116 @@
+"""
+后台查询执行器
+数据库/网络共享访问放到 QThreadPool 中执行，结果通过信号回到界面线程；
+新查询提交后，尚未开始的旧查询直接取消，已在执行的旧查询结果被丢弃
+"""
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from config import config
+from database.db_manager import db_manager
+
+
+class _QuerySignals(QObject):
+    """工作线程 → 界面线程的信号（QRunnable 本身不能发信号）"""
+    finished = pyqtSignal(str, int, object)   # 通道, 查询序号, 结果
+    failed = pyqtSignal(str, int, str)        # 通道, 查询序号, 错误信息
+
+
+class _QueryRunnable(QRunnable):
+    """在线程池中执行一次查询"""
+
+    def __init__(self, signals, channel, seq, tenant_db, fn, args, kwargs):
+        super().__init__()
+        self.signals = signals
+        self.channel = channel
+        self.seq = seq
+        self.tenant_db = tenant_db
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        # 工作线程沿用提交线程的租户设置（租户覆盖是线程局部的）
+        db_manager.set_tenant_override(self.tenant_db)
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            if config.DEBUG:
+                traceback.print_exc()
+            self.signals.failed.emit(self.channel, self.seq, str(e))
+        else:
+            self.signals.finished.emit(self.channel, self.seq, result)
+        finally:
+            db_manager.set_tenant_override(None)
+
+
+class QueryExecutor(QObject):
+    """
+    后台查询执行器（需在界面线程创建）
+    - 按通道（如 'search'、'stats'）区分查询，同一通道只保留最新一次的结果
+    - 数据库连接来自 db_manager 的连接池，线程数不超过连接池容量
+    """
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads or config.DESKTOP_QUERY_THREADS)
+        self._signals = _QuerySignals()
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._seq = 0
+        self._latest = {}    # 通道 -> (查询序号, runnable, on_result, on_error)
+
+    def submit(self, channel, fn, *args, on_result=None, on_error=None, **kwargs):
+        """
+        提交查询，取代同一通道中尚未返回的旧查询
+
+        参数:
+            channel: 通道名
+            fn: 在工作线程中执行的函数
+            on_result: 成功回调 on_result(result)，在界面线程调用
+            on_error: 失败回调 on_error(message)，在界面线程调用
+        """
+        self.cancel(channel)
+        self._seq += 1
+        runnable = _QueryRunnable(self._signals, channel, self._seq,
+                                  db_manager.get_tenant_override(), fn, args, kwargs)
+        runnable.setAutoDelete(False)  # 保留引用以便 tryTake 取消
+        self._latest[channel] = (self._seq, runnable, on_result, on_error)
+        self.pool.start(runnable)
+        return self._seq
+
+    def cancel(self, channel):
+        """取消通道中的查询（未开始的从队列移除，执行中的忽略其结果）"""
+        entry = self._latest.pop(channel, None)
+        if entry is not None:
+            self.pool.tryTake(entry[1])
+
+    def shutdown(self, timeout_ms=3000):
+        """关闭窗口时调用：清空队列并等待执行中的查询结束"""
+        self._latest.clear()
+        self.pool.clear()
+        self.pool.waitForDone(timeout_ms)
+
+    def _take(self, channel, seq):
+        entry = self._latest.get(channel)
+        if entry is None or entry[0] != seq:
+            return None   # 已被新查询取代
+        del self._latest[channel]
+        return entry
+
+    @pyqtSlot(str, int, object)
+    def _on_finished(self, channel, seq, result):
+        entry = self._take(channel, seq)
+        if entry is not None and entry[2]:
+            entry[2](result)
+
+    @pyqtSlot(str, int, str)
+    def _on_failed(self, channel, seq, message):
+        entry = self._take(channel, seq)
+        if entry is None:
+            return
+        if entry[3]:
+            entry[3](message)
+        else:
+            print(f"❌ 后台查询失败: {message}")
@@ -0,0 +1,216 @@
+"""
+PDF内容寻址存储
+相同内容的PDF只在磁盘上保存一份（PDF根目录下 .blobs/<哈希前2位>/<sha256>.pdf），
+各激活码目录下的 {产品号}_{uuid}.pdf 是指向该文件的硬链接：
+- 桌面端/网络共享按原路径打开文件，无需任何改动
+- 文件系统的硬链接计数即引用计数，最后一个链接删除后由垃圾回收清理 blob
+- 文件系统不支持硬链接时回退为普通文件（不去重）
+
+注意：硬链接共享同一份内容，任何程序原地修改其中一个文件（以写模式打开后覆盖）会同时改掉所有租户的同内容文件。
+只有所有写入方都通过“写临时文件 + os.replace”替换文件（本服务的上传即如此）时才能开启 PDF_DEDUP_ENABLED
+"""
+import os
+import time
+import hashlib
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+class BlobStore:
+    """按 SHA-256 去重的PDF存储"""
+
+    # 链接数变化后的保护期（秒）：期间的 blob 可能正在建立链接，回收时跳过
+    GC_GRACE_SECONDS = 60
+    # 磁盘占用统计的缓存时间（秒），避免每次都遍历整个 .blobs 目录
+    STATS_CACHE_SECONDS = 600
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(config.PDF_NETWORK_PATH, config.PDF_BLOB_DIR)
+        self.linked = 0        # 新建的链接数
+        self.deduplicated = 0  # 命中已有内容的次数
+        self._gc_lock = threading.Lock()
+        self._gc_thread = None
+        self._gc_pending = set()  # 最后一个对外链接已删除、等待回收的 blob 路径
+        self._disk_stats = None   # (统计时间, blob数量, blob字节数)
+        register_after_fork(self)
+
+    @property
+    def enabled(self):
+        return config.PDF_DEDUP_ENABLED
+
+    def blob_path(self, digest):
+        """内容哈希对应的 blob 路径"""
+        return os.path.join(self.root, digest[:2], f"{digest}.pdf")
+
+    def put(self, src_path, digest, dest_path):
+        """
+        把已写完的文件（同一文件系统上的临时文件）存入 blob 并链接到目标路径
+
+        参数:
+            src_path: 临时文件路径（调用后被移走或删除）
+            digest: 文件内容 SHA-256
+            dest_path: 对外可见的路径（激活码目录下的文件名）
+
+        返回:
+            bool: 是否命中已有内容（重复上传）
+        """
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        blob = self.blob_path(digest)
+        duplicate = os.path.exists(blob)
+        try:
+            if not duplicate:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(src_path, blob)
+            os.link(blob, dest_path)
+        except OSError as e:
+            # 不支持硬链接（或 blob 刚被回收）：直接保存为普通文件
+            if config.DEBUG:
+                print(f"⚠️ 硬链接失败，按普通文件保存: {e}")
+            if os.path.exists(src_path):
+                os.replace(src_path, dest_path)
+                return False
+            if not duplicate:
+                os.replace(blob, dest_path)
+                return False
+            raise
+        if duplicate and os.path.exists(src_path):
+            os.remove(src_path)
+        self.linked += 1
+        if duplicate:
+            self.deduplicated += 1
+            if config.DEBUG:
+                print(f"♻️ 重复内容，已链接到现有文件: {digest[:12]}")
+        return duplicate
+
+    def release(self, full_path):
+        """
+        删除对外可见的文件；若它是某个 blob 的最后一个链接，则在后台回收该 blob
+
+        返回:
+            bool: 文件是否存在并已删除
+        """
+        try:
+            st = os.stat(full_path)
+        except FileNotFoundError:
+            return False
+        blob = None
+        # 链接数为2说明只剩 blob 自身：删除前计算哈希定位 blob，回收时只检查这些 blob
+        if st.st_nlink == 2 and os.path.isdir(self.root):
+            blob = self._blob_of(full_path, st)
+        os.remove(full_path)
+        if blob:
+            with self._gc_lock:
+                self._gc_pending.add(blob)
+            self.collect_garbage_async()
+        return True
+
+    def collect_garbage(self, paths=None):
+        """
+        删除已无任何链接的 blob
+
+        参数:
+            paths: 要检查的 blob 路径；None 表示遍历整个 .blobs 目录（维护用，耗时与 blob 总数成正比）
+
+        返回:
+            int: 删除的 blob 数量
+        """
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        start_time = time.time()
+        if paths is None:
+            paths = (os.path.join(dirpath, name)
+                     for dirpath, _, filenames in os.walk(self.root) for name in filenames)
+        recent = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                if st.st_nlink > 1:
+                    continue
+                if start_time - st.st_ctime > self.GC_GRACE_SECONDS:
+                    os.remove(path)
+                    removed += 1
+                else:
+                    recent.append(path)
+            except OSError:
+                continue
+        if recent:
+            # 仍在保护期内的留到下一次回收
+            with self._gc_lock:
+                self._gc_pending.update(recent)
+            self.collect_garbage_async()
+        if config.DEBUG:
+            print(f"🧹 blob回收完成: 删除 {removed} 个, 耗时 {time.time() - start_time:.2f}s")
+        return removed
+
+    def collect_garbage_async(self):
+        """保护期过后在后台线程回收（已有回收在进行时不重复启动）"""
+        with self._gc_lock:
+            if self._gc_thread is not None and self._gc_thread.is_alive():
+                return
+            self._gc_thread = threading.Thread(target=self._gc_worker, daemon=True)
+            self._gc_thread.start()
+
+    def stats(self):
+        """存储统计信息（磁盘占用每 STATS_CACHE_SECONDS 秒统计一次）"""
+        cached = self._disk_stats
+        if cached is None or time.monotonic() - cached[0] > self.STATS_CACHE_SECONDS:
+            blobs = 0
+            blob_bytes = 0
+            if os.path.isdir(self.root):
+                for dirpath, _, filenames in os.walk(self.root):
+                    for name in filenames:
+                        try:
+                            blob_bytes += os.stat(os.path.join(dirpath, name)).st_size
+                            blobs += 1
+                        except OSError:
+                            continue
+            cached = self._disk_stats = (time.monotonic(), blobs, blob_bytes)
+        return {
+            'enabled': self.enabled,
+            'blobs': cached[1],
+            'blob_bytes': cached[2],
+            'linked': self.linked,
+            'deduplicated': self.deduplicated,
+        }
+
+    def _blob_of(self, full_path, st):
+        """
+        文件对应的 blob 路径
+
+        返回:
+            str: blob 路径；文件不是 blob 的链接时返回None
+        """
+        sha = hashlib.sha256()
+        try:
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            blob = self.blob_path(sha.hexdigest())
+            blob_st = os.stat(blob)
+        except OSError:
+            return None
+        if (blob_st.st_dev, blob_st.st_ino) != (st.st_dev, st.st_ino):
+            return None
+        return blob
+
+    def _gc_worker(self):
+        time.sleep(self.GC_GRACE_SECONDS + 1)
+        with self._gc_lock:
+            paths, self._gc_pending = self._gc_pending, set()
+            # 之后 release 的 blob 由下一次回收处理
+            self._gc_thread = None
+        try:
+            self.collect_garbage(paths)
+        except Exception as e:
+            print(f"❌ blob回收失败: {e}")
+
+    def _after_fork(self):
+        self._gc_lock = threading.Lock()
+        self._gc_thread = None
+        self._gc_pending = set()
+
+
+# 创建全局实例
+blob_store = BlobStore()
@@ -0,0 +1,340 @@
+"""
+图纸目录批量导入
+逐行流式读取 CSV / XLSX 中的 (产品号, PDF路径)，用线程池并行检查PDF文件是否存在，
+再按块批量写入租户数据库，过程中回调进度
+"""
+import os
+import re
+import csv
+import json
+import codecs
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+from database.db_manager import db_manager
+from utils.pdf_handler import pdf_handler
+
+# 可选依赖：读取 Excel
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# 表头别名（第一行匹配到时按表头定位列，否则按第1、2列读取）
+CODE_HEADERS = {'product_code', '产品号', '产品编号', '图号'}
+PATH_HEADERS = {'pdf_path', 'pdf路径', 'pdf文件', '文件名', '路径'}
+
+
+def iter_catalog_rows(path):
+    """
+    逐行读取目录文件（不整体载入内存）
+
+    参数:
+        path: .csv / .xlsx 文件路径
+
+    返回:
+        generator: (行号, 产品号, PDF路径)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        rows = _iter_csv(path)
+    elif ext in ('.xlsx', '.xlsm'):
+        rows = _iter_xlsx(path)
+    else:
+        raise ValueError(f"不支持的文件类型: {ext}（仅支持 .csv / .xlsx）")
+
+    code_col, path_col = 0, 1
+    for line_no, row in enumerate(rows, start=1):
+        cells = ['' if v is None else str(v).strip() for v in row]
+        if line_no == 1:
+            lowered = [c.lower() for c in cells]
+            code_idx = next((i for i, c in enumerate(lowered) if c in CODE_HEADERS), None)
+            path_idx = next((i for i, c in enumerate(lowered) if c in PATH_HEADERS), None)
+            if code_idx is not None or path_idx is not None:
+                code_col = code_idx if code_idx is not None else 0
+                path_col = path_idx if path_idx is not None else 1
+                continue
+        if not any(cells):
+            continue
+        product_code = cells[code_col] if len(cells) > code_col else ''
+        pdf_path = cells[path_col] if len(cells) > path_col else ''
+        yield (line_no, product_code, pdf_path)
+
+
+def _iter_csv(path):
+    encoding = _detect_csv_encoding(path)
+    with open(path, newline='', encoding=encoding) as f:
+        yield from csv.reader(f)
+
+
+def _detect_csv_encoding(path):
+    """
+    整个文件都能解码的编码：导入开始前完整检查一遍（只解码不解析，不占内存），
+    避免前面的批次已经写入数据库后才在文件后部遇到无法解码的行
+    """
+    # Excel 导出的 CSV 常见 UTF-8 BOM 或 GBK 编码
+    for encoding in ('utf-8-sig', 'gbk'):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    raise ValueError("无法识别CSV文件编码（支持 UTF-8 / GBK，整个文件须使用同一编码）")
+
+
+def _iter_xlsx(path):
+    if openpyxl is None:
+        raise ValueError("读取Excel需要安装 openpyxl（pip install openpyxl）")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+class CatalogImporter:
+    """
+    目录导入任务
+    - 每读取 chunk_size 行：校验格式 → 线程池检查文件 → 批量写入
+    - 文件不存在的行默认不导入（allow_missing=True 时照常导入并计入 missing）
+    """
+
+    def __init__(self, activation_code=None, on_duplicate='skip', allow_missing=False,
+                 chunk_size=None, workers=None, progress=None):
+        """
+        参数:
+            activation_code: 目标租户激活码（None 表示主库/PDF根目录）
+            on_duplicate: 产品号已存在时 'skip' 跳过 / 'update' 更新PDF路径
+            allow_missing: PDF文件不存在时是否仍然导入
+            chunk_size: 每批行数（默认 config.DB_BULK_CHUNK_SIZE）
+            workers: 文件检查线程数（默认 config.IMPORT_VERIFY_WORKERS）
+            progress: 进度回调 progress(stats)，每批处理完调用一次
+        """
+        self.activation_code = activation_code
+        self.on_duplicate = on_duplicate
+        self.allow_missing = allow_missing
+        self.chunk_size = chunk_size or config.DB_BULK_CHUNK_SIZE
+        self.workers = workers or config.IMPORT_VERIFY_WORKERS
+        self.progress = progress
+        self.stats = {
+            'read': 0, 'invalid': 0, 'missing': 0,
+            'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0,
+            'elapsed': 0.0, 'finished': False,
+        }
+        # 问题行明细（最多保留 IMPORT_MAX_ERRORS 条）
+        self.errors = []
+
+    def run(self, path):
+        """
+        执行导入
+
+        参数:
+            path: .csv / .xlsx 文件路径
+
+        返回:
+            dict: 导入统计
+        """
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import-verify') as executor:
+            chunk = []
+            for line_no, product_code, pdf_path in iter_catalog_rows(path):
+                self.stats['read'] += 1
+                problem = self._validate(product_code, pdf_path)
+                if problem:
+                    self.stats['invalid'] += 1
+                    self._error(line_no, product_code, problem)
+                    continue
+                chunk.append((line_no, product_code, pdf_path))
+                if len(chunk) >= self.chunk_size:
+                    self._process_chunk(executor, chunk, start_time)
+                    chunk = []
+            if chunk:
+                self._process_chunk(executor, chunk, start_time)
+        self.stats['elapsed'] = time.time() - start_time
+        self.stats['finished'] = True
+        self._report()
+        return self.stats
+
+    def _validate(self, product_code, pdf_path):
+        if not product_code or not pdf_path:
+            return '产品号或PDF路径为空'
+        if len(product_code) > 100 or len(pdf_path) > 500:
+            return '产品号或PDF路径过长'
+        if not pdf_path.lower().endswith('.pdf'):
+            return 'PDF路径不是.pdf文件'
+        normalized = os.path.normpath(pdf_path)
+        if os.path.isabs(normalized) or normalized.startswith('..'):
+            return 'PDF路径必须是相对路径'
+        return None
+
+    def _process_chunk(self, executor, chunk, start_time):
+        full_paths = [pdf_handler.get_full_path(pdf_path, self.activation_code) for _, _, pdf_path in chunk]
+        # 导入校验以文件系统为准，不使用存在性索引（索引可能尚未包含刚复制进来的文件）
+        exists = list(executor.map(os.path.exists, full_paths))
+
+        rows = []
+        for (line_no, product_code, pdf_path), ok in zip(chunk, exists):
+            if not ok:
+                self.stats['missing'] += 1
+                self._error(line_no, product_code, f'PDF文件不存在: {pdf_path}')
+                if not self.allow_missing:
+                    continue
+            rows.append((product_code, pdf_path))
+
+        if rows:
+            result = db_manager.bulk_upsert_drawings(rows, on_duplicate=self.on_duplicate,
+                                                     chunk_size=self.chunk_size,
+                                                     activation_code=self.activation_code)
+            for key in ('inserted', 'updated', 'skipped', 'failed'):
+                self.stats[key] += len(result[key])
+        self.stats['elapsed'] = time.time() - start_time
+        self._report()
+
+    def _error(self, line_no, product_code, message):
+        if len(self.errors) < config.IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line_no, 'product_code': product_code, 'message': message})
+
+    def _report(self):
+        if self.progress:
+            try:
+                self.progress(dict(self.stats))
+            except Exception as e:
+                print(f"❌ 导入进度回调失败: {e}")
+
+
+# ==================== 后台导入任务（Web端） ====================
+
+def _job_path(job_id):
+    return os.path.join(config.IMPORT_JOB_DIR, f"{job_id}.json")
+
+
+def _save_job(job):
+    """写入任务状态文件（多进程部署时任意 worker 都能查询进度）"""
+    os.makedirs(config.IMPORT_JOB_DIR, exist_ok=True)
+    path = _job_path(job['id'])
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def start_import_job(file_path, filename, activation_code=None, on_duplicate='skip', allow_missing=False):
+    """
+    在后台线程中导入已上传的目录文件，导入结束后删除该文件
+    任务运行期间每隔 IMPORT_HEARTBEAT_SECONDS 秒更新心跳时间，执行进程退出后 load_import_job 据此判定任务失败
+
+    参数:
+        file_path: 已保存的上传文件路径（位于 IMPORT_JOB_DIR 下）
+        filename: 原始文件名
+        activation_code: 目标租户激活码
+
+    返回:
+        str: 任务ID
+    """
+    job = {
+        'id': uuid.uuid4().hex,
+        'filename': filename,
+        'activation_code': activation_code,
+        'status': 'running',
+        'stats': None,
+        'errors': [],
+        'message': '',
+        'started_at': time.time(),
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'heartbeat_at': time.time(),
+    }
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def save():
+        with lock:
+            job['heartbeat_at'] = time.time()
+            _save_job(job)
+
+    save()
+
+    def progress(stats):
+        job['stats'] = stats
+        save()
+
+    def heartbeat():
+        while not done.wait(config.IMPORT_HEARTBEAT_SECONDS):
+            try:
+                save()
+            except OSError as e:
+                print(f"⚠️  更新导入任务心跳失败: {e}")
+
+    def worker():
+        importer = CatalogImporter(activation_code=activation_code, on_duplicate=on_duplicate,
+                                   allow_missing=allow_missing, progress=progress)
+        try:
+            importer.run(file_path)
+            job['status'] = 'finished'
+        except Exception as e:
+            print(f"❌ 导入失败: {e}")
+            job['status'] = 'failed'
+            job['message'] = str(e)
+        finally:
+            done.set()
+            job['stats'] = dict(importer.stats)
+            job['errors'] = importer.errors
+            save()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    threading.Thread(target=worker, daemon=True, name=f"import-{job['id'][:8]}").start()
+    threading.Thread(target=heartbeat, daemon=True, name=f"import-heartbeat-{job['id'][:8]}").start()
+    return job['id']
+
+
+def _job_process_alive(job):
+    """
+    执行任务的进程是否仍在运行
+
+    返回:
+        bool: 心跳超时或（同一台机器上）进程已不存在时返回False
+    """
+    heartbeat_at = job.get('heartbeat_at') or job.get('started_at') or 0
+    if time.time() - heartbeat_at > config.IMPORT_STALE_SECONDS:
+        return False
+    # 只在 POSIX 上用信号0探测进程（Windows 的 os.kill 会结束进程）
+    if os.name == 'posix' and job.get('pid') and job.get('host') == socket.gethostname():
+        try:
+            os.kill(job['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+    return True
+
+
+def load_import_job(job_id):
+    """
+    读取导入任务状态（执行进程已退出的 running 任务改为 failed 并写回）
+
+    返回:
+        dict: 任务状态；任务不存在时返回None
+    """
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+        return None
+    try:
+        with open(_job_path(job_id), encoding='utf-8') as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if job.get('status') == 'running' and not _job_process_alive(job):
+        job['status'] = 'failed'
+        job['message'] = '导入进程已退出，任务未完成（已导入的数据保留，可重新导入剩余部分）'
+        try:
+            _save_job(job)
+        except OSError as e:
+            print(f"⚠️  更新导入任务状态失败: {e}")
+    return job
@@ -0,0 +1,126 @@
+"""
+进程内事件广播
+按主题发布事件，订阅者各自持有一个有界队列（消费过慢时丢弃最旧的事件），供 SSE 推送使用
+一个订阅可以同时订阅多个主题（一个页面只占用一个推送连接）
+"""
+import queue
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+class Subscription:
+    """一个订阅者"""
+
+    def __init__(self, broker, topics, max_queue):
+        self.broker = broker
+        self.topics = topics
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False   # 是否因消费过慢丢弃过事件
+
+    def put(self, event):
+        """（发布方调用）队列满时丢弃最旧的事件"""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                self.overflowed = True
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def take_overflow(self):
+        """读取并清除丢弃标记"""
+        overflowed, self.overflowed = self.overflowed, False
+        return overflowed
+
+    def get(self, timeout=None):
+        """
+        等待下一个事件
+
+        返回:
+            tuple: (主题, 事件)；超时返回None
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBroker:
+    """按主题广播事件"""
+
+    def __init__(self, max_subscribers=None, max_queue=100):
+        # 每个推送连接占用一个工作线程，上限不超过线程数的一半，保证普通请求始终有线程可用
+        self.max_subscribers = max_subscribers or min(config.SSE_MAX_CLIENTS, max(1, config.WEB_THREADS // 2))
+        self.max_queue = max_queue
+        self._topics = {}    # 主题 -> set[Subscription]
+        self._count = 0
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def subscribe(self, *topics):
+        """
+        订阅一个或多个主题（计为一个订阅者）
+
+        返回:
+            Subscription: 订阅；订阅者已达上限时返回None
+        """
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            sub = Subscription(self, topics, self.max_queue)
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(sub)
+            self._count += 1
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            removed = False
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs and sub in subs:
+                    subs.discard(sub)
+                    removed = True
+                    if not subs:
+                        del self._topics[topic]
+            if removed:
+                self._count -= 1
+
+    def publish(self, topic, event):
+        """向主题的所有订阅者发布事件"""
+        with self._lock:
+            subs = list(self._topics.get(topic, ()))
+        for sub in subs:
+            sub.put((topic, event))
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return bool(self._topics.get(topic))
+
+    def stats(self):
+        """订阅统计"""
+        with self._lock:
+            return {'subscribers': self._count, 'topics': len(self._topics)}
+
+    def _after_fork(self):
+        """子进程不继承父进程的连接，清空订阅"""
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._count = 0
+
+
+# 创建全局实例
+event_broker = EventBroker()
@@ -0,0 +1,26 @@
+"""
+多进程（fork）支持
+gunicorn 等多进程服务器在 fork 工作进程后，父进程中的锁、后台线程、数据库连接不能继续使用
+"""
+import os
+import weakref
+
+
+def register_after_fork(obj, method_name='_after_fork'):
+    """
+    在子进程中 fork 完成后调用 obj 的指定方法（Windows 无 fork，直接忽略）
+
+    参数:
+        obj: 需要重置状态的对象（弱引用，不影响回收）
+        method_name: 重置方法名
+    """
+    if not hasattr(os, 'register_at_fork'):
+        return
+    ref = weakref.ref(obj)
+
+    def _callback():
+        target = ref()
+        if target is not None:
+            getattr(target, method_name)()
+
+    os.register_at_fork(after_in_child=_callback)
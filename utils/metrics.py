@@ -0,0 +1,367 @@
+"""
+运行指标
+计数器 / 直方图 / 采集函数，以 Prometheus 文本格式输出（GET /metrics）
+
+多进程部署（gunicorn）时每个工作进程各自计数，并定期把快照写入 METRICS_DIR/<pid>.json（只有Web进程调用 share() 后才写入，
+桌面端/脚本只在本进程内计数）；输出时合并所有进程的快照（同名同标签的值相加）。
+超过 METRICS_STALE_SECONDS 未更新的快照视为已退出的进程：其计数器与直方图并入 exited.json 后删除（仪表值直接丢弃），
+合并结果中的计数器不会因进程退出/重启而减少
+"""
+import os
+import json
+import atexit
+import time
+import threading
+from contextlib import contextmanager
+from config import config
+try:
+    import fcntl
+except ImportError:
+    # Windows 只使用单进程的 waitress，无需跨进程加锁
+    fcntl = None
+from utils.fork_safe import register_after_fork
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 已退出进程的累计数据
+EXITED_FILE = 'exited.json'
+
+
+class _Metric:
+    """指标基类：按标签值保存数据"""
+
+    kind = None
+
+    def __init__(self, registry, name, help_text, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _after_fork(self):
+        # 子进程从零开始计数（父进程的数据由父进程自己的快照文件提供）
+        self._lock = threading.Lock()
+        self._values = {}
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry._touch()
+
+
+class Histogram(_Metric):
+    """分布统计（各区间计数 + 总和 + 次数）"""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames, buckets=None):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+        self.registry._touch()
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return [[list(key), [list(entry[0]), entry[1], entry[2]]] for key, entry in self._values.items()]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, directory=None, enabled=True, flush_seconds=None, stale_seconds=None):
+        """
+        参数:
+            directory: 多进程快照目录（None 表示只输出本进程的数据，之后可由 share() 开启）
+            flush_seconds: 写入快照的周期（秒）
+            stale_seconds: 快照超过该时间未更新视为进程已退出
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.flush_seconds = flush_seconds or config.METRICS_FLUSH_SECONDS
+        self.stale_seconds = stale_seconds or config.METRICS_STALE_SECONDS
+        self._metrics = {}
+        self._collectors = []
+        self._flusher = None
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    # ==================== 定义指标 ====================
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=None):
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """
+        注册采集函数（输出时调用，用于连接池/缓存等已有统计）
+
+        参数:
+            collector: 函数 collector() -> [(名称, 'counter'/'gauge', 说明, {标签: 值}, 数值), ...]
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    # ==================== 快照与合并 ====================
+
+    def snapshot(self):
+        """
+        本进程的指标快照
+
+        返回:
+            dict: 名称 -> {'kind', 'help', 'labelnames', 'buckets', 'values': [[标签值列表, 数据], ...]}
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        result = {}
+        for metric in metrics:
+            result[metric.name] = {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'values': metric._snapshot(),
+            }
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"⚠️  指标采集失败: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                entry = result.setdefault(name, {
+                    'kind': kind, 'help': help_text, 'labelnames': sorted(labels), 'buckets': [], 'values': [],
+                })
+                entry['values'].append([[str(labels[k]) for k in entry['labelnames']], value])
+        return result
+
+    def share(self, directory):
+        """
+        开启多进程快照（Web服务启动时调用；fork 出的工作进程沿用该设置）
+
+        参数:
+            directory: 快照目录
+        """
+        self.directory = directory
+
+    def flush(self):
+        """把本进程快照写入目录（先写临时文件再替换）"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(os.path.join(self.directory, f"{os.getpid()}.json"), self.snapshot())
+
+    @staticmethod
+    def _write(path, snapshot):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        合并所有进程的快照
+
+        返回:
+            dict: 与 snapshot() 格式相同
+        """
+        if not self.directory:
+            return self.snapshot()
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"⚠️  写入指标快照失败: {e}")
+            return self.snapshot()
+        merged = {}
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == EXITED_FILE:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.stale_seconds:
+                    self._retire(path)
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._merge(merged, snapshot)
+        try:
+            with open(os.path.join(self.directory, EXITED_FILE), 'r', encoding='utf-8') as f:
+                self._merge(merged, json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️  读取已退出进程的指标失败: {e}")
+        return merged
+
+    def _retire(self, path):
+        """把已退出进程的计数器/直方图并入 exited.json 并删除其快照（多个进程同时发现时只处理一次）"""
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                # 已被其他进程处理
+                return
+            except ValueError:
+                snapshot = {}
+            exited_path = os.path.join(self.directory, EXITED_FILE)
+            try:
+                with open(exited_path, 'r', encoding='utf-8') as f:
+                    exited = json.load(f)
+            except FileNotFoundError:
+                exited = {}
+            # 仪表值（连接数、缓存条目数等）只对存活进程有意义
+            self._merge(exited, {name: metric for name, metric in snapshot.items() if metric['kind'] != 'gauge'})
+            self._write(exited_path, exited)
+            os.remove(path)
+
+    @staticmethod
+    def _merge(merged, snapshot):
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = dict(metric, values=[[labels, value] for labels, value in metric['values']])
+                continue
+            index = {tuple(labels): i for i, (labels, _) in enumerate(target['values'])}
+            for labels, value in metric['values']:
+                i = index.get(tuple(labels))
+                if i is None:
+                    index[tuple(labels)] = len(target['values'])
+                    target['values'].append([labels, value])
+                elif metric['kind'] == 'histogram':
+                    old = target['values'][i][1]
+                    target['values'][i][1] = [[a + b for a, b in zip(old[0], value[0])],
+                                              old[1] + value[1], old[2] + value[2]]
+                else:
+                    target['values'][i][1] += value
+
+    # ==================== 文本格式 ====================
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            labelnames = metric['labelnames']
+            for labels, value in sorted(metric['values'], key=lambda item: item[0]):
+                pairs = list(zip(labelnames, labels))
+                if metric['kind'] == 'histogram':
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric['buckets'], counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(pairs)} {count}")
+                else:
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    # ==================== 后台写入 ====================
+
+    def _touch(self):
+        """记录数据时确保后台写入线程已启动（fork 后的子进程首次记录时启动）"""
+        if self.directory and self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flusher.start()
+                    # 正常退出时写入最后一次快照，之后由其他进程并入 exited.json
+                    atexit.register(self._flush_at_exit)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️  写入指标快照失败: {e}")
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._flusher = None
+        for metric in self._metrics.values():
+            metric._after_fork()
+
+
+def _number(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+# 创建全局实例
+metrics = MetricsRegistry(enabled=config.METRICS_ENABLED)
@@ -0,0 +1,189 @@
+"""
+密码哈希
+按方案（scheme）生成与校验密码哈希，存储格式为 "<方案>$<参数...>"：
+- scrypt（默认，标准库 hashlib.scrypt）: scrypt$<n>$<r>$<p>$<盐>$<哈希>
+- argon2（需安装 argon2-cffi）: argon2 库自身的格式 $argon2id$...
+- sha256（旧格式，只用于校验）: 64位十六进制，无盐
+
+登录时旧格式或参数低于当前配置的哈希会被重新生成（needs_rehash），用户无感知地完成升级。
+scrypt 每次计算占用约 128 * n * r 字节内存（默认16MB），同时计算的数量由 PASSWORD_HASH_CONCURRENCY 限制
+"""
+import os
+import hmac
+import threading
+import base64
+import hashlib
+from config import config
+from utils.fork_safe import register_after_fork
+
+try:
+    # 可选依赖：安装 argon2-cffi 后可使用 argon2 方案
+    from argon2 import PasswordHasher as _Argon2Hasher
+    from argon2.exceptions import VerificationError as _Argon2Error, InvalidHashError as _Argon2InvalidHash
+except ImportError:
+    _Argon2Hasher = None
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class ScryptScheme:
+    """scrypt（n 为 CPU/内存开销，占用内存约 128 * n * r 字节）"""
+
+    name = 'scrypt'
+
+    def __init__(self, n=None, r=None, p=None, salt_bytes=16, key_bytes=32):
+        self.n = n or config.PASSWORD_SCRYPT_N
+        self.r = r or config.PASSWORD_SCRYPT_R
+        self.p = p or config.PASSWORD_SCRYPT_P
+        self.salt_bytes = salt_bytes
+        self.key_bytes = key_bytes
+
+    def identify(self, stored):
+        return stored.startswith('scrypt$')
+
+    def hash(self, password):
+        salt = os.urandom(self.salt_bytes)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.key_bytes)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password, stored):
+        try:
+            _, n, r, p, salt, key = stored.split('$')
+            expected = _b64decode(key)
+            actual = self._derive(password, _b64decode(salt), int(n), int(r), int(p), len(expected))
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, stored):
+        try:
+            _, n, r, p, _, _ = stored.split('$')
+        except ValueError:
+            return True
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+
+    @staticmethod
+    def _derive(password, salt, n, r, p, key_bytes):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=key_bytes)
+
+
+class Argon2Scheme:
+    """argon2id（参数使用 argon2-cffi 的默认值）"""
+
+    name = 'argon2'
+
+    def __init__(self):
+        if _Argon2Hasher is None:
+            raise RuntimeError("未安装 argon2-cffi，无法使用 argon2 密码哈希")
+        self._hasher = _Argon2Hasher()
+
+    def identify(self, stored):
+        return stored.startswith('$argon2')
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, stored):
+        try:
+            return self._hasher.verify(stored, password)
+        except (_Argon2Error, _Argon2InvalidHash):
+            return False
+
+    def needs_rehash(self, stored):
+        return self._hasher.check_needs_rehash(stored)
+
+
+class LegacySha256Scheme:
+    """旧格式：无盐 SHA-256 十六进制（只校验，不再生成）"""
+
+    name = 'sha256'
+
+    def identify(self, stored):
+        return len(stored) == 64 and all(c in '0123456789abcdef' for c in stored.lower())
+
+    def hash(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password, stored):
+        return hmac.compare_digest(self.hash(password), stored.lower())
+
+    def needs_rehash(self, stored):
+        return True
+
+
+class PasswordHasher:
+    """按配置的方案生成哈希，按存储格式自动选择方案校验"""
+
+    def __init__(self, scheme=None):
+        """
+        参数:
+            scheme: 新哈希使用的方案名（默认 config.PASSWORD_HASH_SCHEME）
+        """
+        self.schemes = {'scrypt': ScryptScheme(), 'sha256': LegacySha256Scheme()}
+        if _Argon2Hasher is not None:
+            self.schemes['argon2'] = Argon2Scheme()
+        name = scheme or config.PASSWORD_HASH_SCHEME
+        if name not in self.schemes:
+            print(f"⚠️  密码哈希方案不可用: {name}，改用 scrypt")
+            name = 'scrypt'
+        self.default = self.schemes[name]
+        self._slots = threading.BoundedSemaphore(config.PASSWORD_HASH_CONCURRENCY)
+        self._dummy = None  # 用户不存在时用于校验的哈希
+        register_after_fork(self)
+
+    def register(self, scheme, default=False):
+        """注册自定义方案（需提供 name / identify / hash / verify / needs_rehash）"""
+        self.schemes[scheme.name] = scheme
+        if default:
+            self.default = scheme
+
+    def hash(self, password):
+        """生成新密码哈希"""
+        with self._slots:
+            return self.default.hash(password)
+
+    def identify(self, stored):
+        """存储的哈希对应的方案（无法识别时返回None）"""
+        if not stored:
+            return None
+        for scheme in self.schemes.values():
+            if scheme.identify(stored):
+                return scheme
+        return None
+
+    def verify(self, password, stored):
+        """
+        校验密码
+
+        返回:
+            tuple: (是否正确, 是否需要用当前方案重新生成哈希)
+        """
+        scheme = self.identify(stored)
+        if scheme is None:
+            return (False, False)
+        with self._slots:
+            valid = scheme.verify(password, stored)
+        if not valid:
+            return (False, False)
+        return (True, scheme is not self.default or scheme.needs_rehash(stored))
+
+    def verify_dummy(self, password):
+        """用户不存在时调用：按当前方案做一次同等开销的校验，使响应时间不暴露用户名是否存在"""
+        if self._dummy is None:
+            self._dummy = self.hash(os.urandom(16).hex())
+        self.verify(password, self._dummy)
+
+    def _after_fork(self):
+        """fork 时其他线程持有的名额不会在子进程中释放"""
+        self._slots = threading.BoundedSemaphore(config.PASSWORD_HASH_CONCURRENCY)
+
+
+# 创建全局实例
+password_hasher = PasswordHasher()
@@ -5,7 +5,11 @@ PDF文件处理器
 import os
 import subprocess
 import platform
+import threading
 from config import config
+from utils.pdf_index import PDFFileIndex
+from utils.blob_store import blob_store
+from utils.request_trace import request_tracer
 
 
 class PDFHandler:
@@ -14,19 +18,22 @@ class PDFHandler:
     def __init__(self):
         """初始化"""
         self.pdf_root = config.PDF_NETWORK_PATH
+        # 已确认存在的激活码文件夹，避免每次拼路径都 stat
+        self._known_folders = set()
+        # 文件存在性索引（首次查询时启动后台扫描）
+        self.file_index = PDFFileIndex(self.pdf_root) if config.PDF_INDEX_ENABLED else None
         if config.DEBUG:
             print(f"📂 PDF根目录: {self.pdf_root}")
     
-    def get_full_path(self, pdf_path, activation_code=None):
+    def get_folder(self, activation_code=None):
         """
-        获取PDF完整路径
+        获取PDF所在文件夹（激活码对应的子文件夹，未提供激活码时为根目录）
         
         参数:
-            pdf_path: PDF相对路径（如：NR1001.pdf）
             activation_code: 激活码（可选）
         
         返回:
-            str: 完整路径
+            str: 文件夹路径
         """
         from utils.activation_code import ActivationCodeManager
         
@@ -38,22 +45,32 @@ class PDFHandler:
                 
                 # 确保文件夹存在
                 folder_path = os.path.join(self.pdf_root, folder_name)
-                if not os.path.exists(folder_path):
-                    os.makedirs(folder_path, exist_ok=True)
-                    if config.DEBUG:
-                        print(f"📂 创建激活码文件夹: {folder_path}")
-                
-                # 拼接完整路径
-                full_path = os.path.join(folder_path, pdf_path)
-                return full_path
+                if folder_path not in self._known_folders:
+                    if not os.path.exists(folder_path):
+                        os.makedirs(folder_path, exist_ok=True)
+                        if config.DEBUG:
+                            print(f"📂 创建激活码文件夹: {folder_path}")
+                    self._known_folders.add(folder_path)
+                return folder_path
             except Exception as e:
                 if config.DEBUG:
                     print(f"❌ 获取激活码文件夹失败: {e}")
                 # 如果获取激活码文件夹失败，则使用默认路径
         
-        # 拼接完整路径（默认路径）
-        full_path = os.path.join(self.pdf_root, pdf_path)
-        return full_path
+        return self.pdf_root
+    
+    def get_full_path(self, pdf_path, activation_code=None):
+        """
+        获取PDF完整路径
+        
+        参数:
+            pdf_path: PDF相对路径（如：NR1001.pdf）
+            activation_code: 激活码（可选）
+        
+        返回:
+            str: 完整路径
+        """
+        return os.path.join(self.get_folder(activation_code), pdf_path)
     
     def check_exists(self, pdf_path, activation_code=None):
         """
@@ -66,8 +83,9 @@ class PDFHandler:
         返回:
             tuple: (是否存在, 完整路径)
         """
-        full_path = self.get_full_path(pdf_path, activation_code)
-        exists = os.path.exists(full_path)
+        with request_tracer.span('fs_stat'):
+            full_path = self.get_full_path(pdf_path, activation_code)
+            exists = self.file_exists(full_path)
         
         if config.DEBUG:
             if exists:
@@ -77,6 +95,86 @@ class PDFHandler:
         
         return (exists, full_path)
     
+    def file_exists(self, full_path):
+        """
+        按完整路径检查文件是否存在（索引命中时直接返回）
+        索引只在扫描周期内有效，其他进程/桌面端刚写入的文件可能还不在索引中，
+        因此只信任命中，未命中时仍检查文件系统
+        
+        参数:
+            full_path: 文件完整路径
+        
+        返回:
+            bool: 是否存在
+        """
+        if self.file_index and self.file_index.contains(full_path):
+            return True
+        return os.path.exists(full_path)
+    
+    def mark_saved(self, full_path):
+        """
+        通知索引：文件已写入
+        
+        参数:
+            full_path: 文件完整路径
+        """
+        if self.file_index:
+            self.file_index.add(full_path)
+    
+    def mark_removed(self, full_path):
+        """
+        通知索引：文件已删除或移走
+        
+        参数:
+            full_path: 文件完整路径
+        """
+        if self.file_index:
+            self.file_index.discard(full_path)
+    
+    def remove_file(self, full_path):
+        """
+        删除PDF文件（去重存储下只删除链接，最后一个链接删除后回收内容）
+        
+        参数:
+            full_path: 文件完整路径
+        
+        返回:
+            bool: 文件是否存在并已删除
+        """
+        removed = blob_store.release(full_path)
+        self.mark_removed(full_path)
+        return removed
+    
+    def remove_files_async(self, full_paths, on_removed=None):
+        """
+        在后台线程中删除一批文件（批量删除记录后清理，避免阻塞请求）
+        
+        参数:
+            full_paths: 文件完整路径列表
+            on_removed: 回调 on_removed([(完整路径, 文件大小), ...])，全部处理完后在后台线程调用
+        """
+        full_paths = list(full_paths)
+        if not full_paths:
+            return
+        
+        def worker():
+            removed = []
+            for full_path in full_paths:
+                try:
+                    size = os.path.getsize(full_path)
+                    if self.remove_file(full_path):
+                        removed.append((full_path, size))
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    print(f"❌ 删除文件失败: {full_path}: {e}")
+            if config.DEBUG:
+                print(f"🗑️ 已清理 {len(removed)} 个PDF文件")
+            if on_removed and removed:
+                on_removed(removed)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
     def open_pdf(self, pdf_path, activation_code=None):
         """
         打开PDF文件
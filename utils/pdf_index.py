@@ -0,0 +1,126 @@
+"""
+PDF文件存在性索引
+定期扫描PDF根目录，在内存中维护已存在文件集合，避免每次查询都对网络共享目录执行 stat
+"""
+import os
+import time
+import threading
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+def normalize_path(path):
+    """统一路径写法（Windows下不区分大小写）"""
+    return os.path.normcase(os.path.normpath(path))
+
+
+class PDFFileIndex:
+    """
+    PDF文件存在性索引
+    - 后台线程每隔 refresh_seconds 秒全量扫描一次根目录
+    - 上传/删除时通过 add/discard 即时更新
+    - 首次扫描完成前 contains 返回None，调用方应回退到 os.path.exists
+    """
+
+    def __init__(self, root, refresh_seconds=None):
+        self.root = root
+        self.refresh_seconds = refresh_seconds or config.PDF_INDEX_REFRESH_SECONDS
+        self._files = None            # set[str]，首次扫描完成前为None
+        self._changes = None          # 扫描期间的增量变化：path -> 是否存在
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_scan_at = None
+        self.last_scan_seconds = None
+        register_after_fork(self)
+
+    def start(self):
+        """启动后台扫描线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def contains(self, full_path):
+        """
+        查询文件是否存在
+
+        返回:
+            bool: 是否存在；索引尚未就绪时返回None
+        """
+        if self._thread is None:
+            self.start()
+        files = self._files
+        if files is None:
+            return None
+        return normalize_path(full_path) in files
+
+    def add(self, full_path):
+        """记录新写入的文件"""
+        self._update(full_path, True)
+
+    def discard(self, full_path):
+        """记录已删除/移走的文件"""
+        self._update(full_path, False)
+
+    def refresh(self):
+        """全量扫描根目录并替换索引"""
+        start_time = time.time()
+        with self._lock:
+            self._changes = {}
+        files = set()
+        try:
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                # 跳过隐藏目录（如上传临时目录 .incoming）
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for name in filenames:
+                    files.add(normalize_path(os.path.join(dirpath, name)))
+        finally:
+            with self._lock:
+                # 重放扫描期间的变化，避免被扫描快照覆盖
+                for path, exists in self._changes.items():
+                    if exists:
+                        files.add(path)
+                    else:
+                        files.discard(path)
+                self._changes = None
+                self._files = files
+        self.last_scan_at = time.time()
+        self.last_scan_seconds = self.last_scan_at - start_time
+        if config.DEBUG:
+            print(f"📂 PDF索引扫描完成: {len(files)} 个文件, 耗时 {self.last_scan_seconds:.2f}s")
+
+    def stats(self):
+        """索引统计信息"""
+        files = self._files
+        return {
+            'ready': files is not None,
+            'files': len(files) if files is not None else 0,
+            'last_scan_at': self.last_scan_at,
+            'last_scan_seconds': self.last_scan_seconds,
+        }
+
+    def _after_fork(self):
+        """子进程中重建锁，并在下次查询时重新启动扫描线程（保留已有索引）"""
+        self._lock = threading.Lock()
+        self._changes = None
+        self._thread = None
+
+    def _update(self, full_path, exists):
+        path = normalize_path(full_path)
+        with self._lock:
+            if self._changes is not None:
+                self._changes[path] = exists
+            if self._files is not None:
+                if exists:
+                    self._files.add(path)
+                else:
+                    self._files.discard(path)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ PDF索引扫描失败: {e}")
+            time.sleep(self.refresh_seconds)
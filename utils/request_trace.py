@@ -0,0 +1,168 @@
+"""
+慢请求采样日志
+记录超过阈值的请求各阶段耗时（登录校验、租户解析、取连接、数据库操作、文件检查、发送），
+按行写入 LOG_DIR/slow_requests.jsonl（JSON Lines，按大小轮转）
+
+用法:
+    request_tracer.start()                       # 请求开始（before_request）
+    with request_tracer.span('fs_stat'):         # 记录某一阶段的耗时（未开始追踪时不做任何事）
+        ...
+    trace = request_tracer.stop()                # 处理结束（after_request），之后的时间计为发送
+    request_tracer.finish(trace, method=..., ...) # 响应发送完毕（call_on_close），超过阈值则写入日志
+
+说明:
+- 每个线程同时只追踪一个请求（gthread / waitress 均为每请求一个线程）
+- 多进程同时写同一个文件时，轮转瞬间可能丢失少量记录
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
+from config import config
+from utils.fork_safe import register_after_fork
+
+
+class RequestTracer:
+    """按线程记录当前请求的分阶段耗时"""
+
+    def __init__(self, log_path, threshold_ms=None, sample_rate=None, enabled=True):
+        """
+        参数:
+            log_path: 日志文件路径
+            threshold_ms: 总耗时超过该值（毫秒）的请求写入日志
+            sample_rate: 未超过阈值的请求按该比例随机写入（0 表示不采样）
+            enabled: 是否启用
+        """
+        self.log_path = log_path
+        self.threshold_ms = config.SLOW_REQUEST_THRESHOLD_MS if threshold_ms is None else threshold_ms
+        self.sample_rate = config.SLOW_REQUEST_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.enabled = enabled
+        self._local = threading.local()
+        self._logger = None
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    # ==================== 记录阶段 ====================
+
+    def start(self):
+        """开始追踪当前线程的请求"""
+        if self.enabled:
+            self._local.trace = {'start': time.perf_counter(), 'spans': {}, 'tags': {}}
+
+    @contextmanager
+    def span(self, name):
+        """记录 with 块的耗时（同名阶段累加）"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(trace, name, time.perf_counter() - start)
+
+    def tag(self, name, value):
+        """附加信息（同名的多个值按顺序保存，如本次请求执行的数据库操作）"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace['tags'].setdefault(name, []).append(value)
+
+    @staticmethod
+    def _add(trace, name, seconds):
+        entry = trace['spans'].get(name)
+        if entry is None:
+            trace['spans'][name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    # ==================== 结束与写入 ====================
+
+    def stop(self):
+        """
+        结束当前线程的追踪（响应已生成，尚未发送）
+
+        返回:
+            dict: 追踪数据（未启用或未开始时为None）
+        """
+        trace = getattr(self._local, 'trace', None)
+        self._local.trace = None
+        if trace is not None:
+            trace['stop'] = time.perf_counter()
+        return trace
+
+    def finish(self, trace, **info):
+        """
+        响应发送完毕：计入发送耗时，超过阈值（或被采样）时写入日志
+
+        参数:
+            trace: stop() 的返回值
+            info: 随记录写入的请求信息（方法、路由、状态码等）
+        """
+        if trace is None:
+            return
+        now = time.perf_counter()
+        self._add(trace, 'send', now - trace['stop'])
+        total_ms = (now - trace['start']) * 1000
+        sampled = False
+        if total_ms < self.threshold_ms:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                return
+            sampled = True
+        spans = {name: {'ms': round(seconds * 1000, 2), 'count': count}
+                 for name, (seconds, count) in trace['spans'].items()}
+        accounted = sum(seconds for seconds, _ in trace['spans'].values()) * 1000
+        record = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
+            'pid': os.getpid(),
+            **info,
+            'total_ms': round(total_ms, 2),
+            'spans': spans,
+            'other_ms': round(max(0.0, total_ms - accounted), 2),
+            **trace['tags'],
+        }
+        if sampled:
+            record['sampled'] = True
+        self._write(record)
+
+    def _write(self, record):
+        try:
+            logger = self._logger or self._open()
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        except Exception as e:
+            print(f"⚠️  写入慢请求日志失败: {e}")
+
+    def _open(self):
+        """首次写入时创建日志文件（按大小轮转）"""
+        with self._lock:
+            if self._logger is None:
+                os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                handler = RotatingFileHandler(
+                    self.log_path,
+                    maxBytes=config.SLOW_REQUEST_LOG_MAX_BYTES,
+                    backupCount=config.SLOW_REQUEST_LOG_BACKUPS,
+                    encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger = logging.getLogger('slow_requests')
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                self._logger = logger
+        return self._logger
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+# 创建全局实例
+request_tracer = RequestTracer(
+    os.path.join(config.LOG_DIR, 'slow_requests.jsonl'),
+    enabled=config.ENABLE_LOGGING and config.SLOW_REQUEST_LOG_ENABLED
+)
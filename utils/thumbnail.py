@@ -0,0 +1,265 @@
+"""
+PDF缩略图
+渲染PDF首页为小图（WebP/PNG），按文件路径+大小+修改时间缓存在磁盘上（只需一次 stat，不读取PDF内容），
+上传时在后台线程池预生成；PDF被替换后大小或修改时间改变，自动生成新的缩略图。
+旧缩略图不会再被访问，每 THUMBNAIL_EVICT_SECONDS 秒在后台清理一次：删除超过 THUMBNAIL_MAX_AGE_DAYS 天未访问的，
+总大小仍超过 THUMBNAIL_CACHE_MAX_MB 时从最久未访问的开始删除（访问时间记在文件修改时间上，不依赖 atime）
+"""
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+from utils.fork_safe import register_after_fork
+
+# 可选依赖：PyMuPDF 渲染PDF，Pillow 转码/缩放
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def thumbnail_key(full_path):
+    """
+    缩略图缓存键（同时用作 ETag）：由文件路径、大小、修改时间生成
+
+    异常:
+        FileNotFoundError: PDF文件不存在
+    """
+    st = os.stat(full_path)
+    ident = f"{os.path.normcase(os.path.normpath(full_path))}\0{st.st_size}\0{st.st_mtime_ns}"
+    return hashlib.sha256(ident.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class ThumbnailService:
+    """缩略图生成与缓存"""
+
+    def __init__(self):
+        self.cache_dir = config.THUMBNAIL_CACHE_PATH or os.path.join(
+            os.path.dirname(config.PDF_NETWORK_PATH.rstrip('/\\')), 'thumbnails')
+        self.width = config.THUMBNAIL_WIDTH
+        self.format = 'webp' if (config.THUMBNAIL_FORMAT == 'webp' and Image is not None) else 'png'
+        self.mimetype = f'image/{self.format}'
+        self._has_renderer = fitz is not None or shutil.which('pdftoppm') is not None
+        self._executor = None
+        self._inflight = {}   # 缓存键 -> Future
+        self._lock = threading.Lock()
+        self._evict_checked = 0.0  # 上次检查是否需要清理的时间
+        register_after_fork(self)
+
+    @property
+    def enabled(self):
+        """是否可以生成缩略图（已启用且有可用的渲染器）"""
+        return config.THUMBNAIL_ENABLED and self._has_renderer
+
+    def get_thumbnail(self, full_path):
+        """
+        获取PDF缩略图路径（缓存未命中时同步生成）
+
+        返回:
+            tuple: (缩略图路径, 缓存键)，无法生成时返回 (None, None)
+
+        异常:
+            FileNotFoundError: PDF文件不存在
+        """
+        if not self.enabled:
+            return (None, None)
+        key = thumbnail_key(full_path)
+        self._maybe_evict()
+        try:
+            thumb_path = self._thumb_path(key)
+            if os.path.exists(thumb_path):
+                self._mark_used(thumb_path)
+                return (thumb_path, key)
+            self._submit(full_path, key).result()
+            return (thumb_path, key) if os.path.exists(thumb_path) else (None, None)
+        except Exception as e:
+            print(f"❌ 生成缩略图失败: {e}")
+            return (None, None)
+
+    def schedule(self, full_path):
+        """在后台预生成缩略图（上传后调用）"""
+        if not self.enabled:
+            return
+        try:
+            key = thumbnail_key(full_path)
+            if not os.path.exists(self._thumb_path(key)):
+                self._submit(full_path, key)
+        except Exception as e:
+            print(f"❌ 预生成缩略图失败: {e}")
+
+    def evict(self):
+        """
+        清理缩略图缓存：删除超过 THUMBNAIL_MAX_AGE_DAYS 天未访问的，总大小仍超过上限时从最久未访问的开始删除
+
+        返回:
+            int: 删除的缩略图数量
+        """
+        start_time = time.time()
+        cutoff = start_time - config.THUMBNAIL_MAX_AGE_DAYS * 86400
+        removed = 0
+        total = 0
+        entries = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                # 跳过清理标记与正在生成的临时文件
+                if name.startswith(('.', 'tmp')):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    if st.st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                        continue
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        limit = config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+        if limit and total > limit:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                total -= size
+        if config.DEBUG:
+            print(f"🧹 缩略图清理完成: 删除 {removed} 个, 耗时 {time.time() - start_time:.2f}s")
+        return removed
+
+    def _maybe_evict(self):
+        """距上次清理超过 THUMBNAIL_EVICT_SECONDS 时在后台清理（多个进程通过目录中的标记文件协调）"""
+        now = time.time()
+        if now - self._evict_checked < 60:
+            return
+        self._evict_checked = now
+        marker = os.path.join(self.cache_dir, '.last_evict')
+        try:
+            if now - os.path.getmtime(marker) < config.THUMBNAIL_EVICT_SECONDS:
+                return
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(marker, 'a'):
+                pass
+            os.utime(marker)
+        except OSError:
+            return
+        threading.Thread(target=self._evict_worker, daemon=True).start()
+
+    def _evict_worker(self):
+        try:
+            self.evict()
+        except Exception as e:
+            print(f"❌ 缩略图清理失败: {e}")
+
+    @staticmethod
+    def _mark_used(thumb_path):
+        """命中时把修改时间更新为最近访问时间（每天最多一次）"""
+        try:
+            if time.time() - os.path.getmtime(thumb_path) > 86400:
+                os.utime(thumb_path)
+        except OSError:
+            pass
+
+    def _thumb_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{self.format}")
+
+    def _submit(self, full_path, key):
+        """提交生成任务（同一文件只生成一次）"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=config.THUMBNAIL_WORKERS,
+                                                        thread_name_prefix='thumbnail')
+                future = self._executor.submit(self._generate, full_path, key)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._done(key))
+            return future
+
+    def _done(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _generate(self, full_path, key):
+        thumb_path = self._thumb_path(key)
+        if os.path.exists(thumb_path):
+            return
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读取到半个文件
+        fd, tmp_path = tempfile.mkstemp(suffix=f'.{self.format}', dir=os.path.dirname(thumb_path))
+        os.close(fd)
+        try:
+            if fitz is not None:
+                self._render_pymupdf(full_path, tmp_path)
+            else:
+                self._render_pdftoppm(full_path, tmp_path)
+            os.replace(tmp_path, thumb_path)
+            if config.DEBUG:
+                print(f"🖼️ 缩略图已生成: {thumb_path}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _render_pymupdf(self, full_path, out_path):
+        with fitz.open(full_path) as doc:
+            page = doc.load_page(0)
+            zoom = self.width / max(page.rect.width, 1)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            if Image is not None:
+                image = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+                self._save_image(image, out_path)
+            else:
+                pix.save(out_path, output='png')
+
+    def _render_pdftoppm(self, full_path, out_path):
+        """使用 poppler 的 pdftoppm 命令渲染（未安装 PyMuPDF 时）"""
+        prefix = out_path[:-len(self.format) - 1] + '_ppm'
+        subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-png', '-singlefile',
+             '-scale-to-x', str(self.width), '-scale-to-y', '-1', full_path, prefix],
+            check=True, capture_output=True, timeout=60
+        )
+        png_path = prefix + '.png'
+        try:
+            if Image is not None:
+                with Image.open(png_path) as image:
+                    self._save_image(image.convert('RGB'), out_path)
+            else:
+                os.replace(png_path, out_path)
+        finally:
+            if os.path.exists(png_path):
+                os.remove(png_path)
+
+    def _save_image(self, image, out_path):
+        if self.format == 'webp':
+            image.save(out_path, 'WEBP', quality=config.THUMBNAIL_QUALITY, method=4)
+        else:
+            image.save(out_path, 'PNG', optimize=True)
+
+    def _after_fork(self):
+        """子进程中重建锁与线程池（父进程的工作线程不会被继承）"""
+        self._lock = threading.Lock()
+        self._executor = None
+        self._inflight = {}
+
+
+# 创建全局实例
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,135 @@
+"""
+流式上传
+上传的PDF在解析请求体时直接分块写入PDF目录下的临时文件，同时计算 SHA-256 并校验 %PDF 文件头，
+确认无误后原子改名到目标位置；失败或中途断开时临时文件自动删除，不会留下半个文件
+"""
+import os
+import hashlib
+import tempfile
+from flask import Request
+from config import config
+from utils.blob_store import blob_store
+
+# PDF规范允许文件头出现在前1024字节内
+PDF_HEADER_WINDOW = 1024
+
+
+def staging_dir():
+    """临时文件目录（位于PDF根目录下，保证与目标文件同一文件系统，可以原子改名）"""
+    return os.path.join(config.PDF_NETWORK_PATH, '.incoming')
+
+
+class StagedUpload:
+    """
+    边接收边落盘的上传文件（供 werkzeug 表单解析器写入）
+    - write 时同步计算 SHA-256，并保留文件头用于校验
+    - commit 原子改名到目标路径；未 commit 就 close 时删除临时文件
+    """
+
+    def __init__(self, directory=None):
+        directory = directory or staging_dir()
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix='.part', dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self.size = 0
+        self.committed = False
+
+    # ---------- 文件对象接口（werkzeug 使用） ----------
+
+    def write(self, data):
+        if len(self._head) < PDF_HEADER_WINDOW:
+            self._head += bytes(data[:PDF_HEADER_WINDOW - len(self._head)])
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+    def close(self):
+        """请求结束时由 werkzeug 调用：未提交的临时文件直接删除"""
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    # ---------- 上传结果 ----------
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def is_pdf(self):
+        return b'%PDF-' in self._head
+
+    def commit(self, dest_path):
+        """
+        写入完成后原子改名到目标路径（启用去重时存入 blob 并链接到目标路径）
+
+        返回:
+            str: 文件内容的 SHA-256
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if blob_store.enabled:
+            blob_store.put(self.path, self.sha256, dest_path)
+        else:
+            os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+            os.replace(self.path, dest_path)
+        self.committed = True
+        return self.sha256
+
+
+class StreamingRequest(Request):
+    """上传的PDF文件直接写入 StagedUpload，而不是先缓存在内存/系统临时目录"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and filename.lower().endswith('.pdf'):
+            return StagedUpload()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def is_valid_pdf(file_storage):
+    """
+    检查上传文件内容是否为PDF（流式上传直接看已记录的文件头）
+
+    参数:
+        file_storage: request.files 中的 FileStorage
+    """
+    stream = file_storage.stream
+    if isinstance(stream, StagedUpload):
+        return stream.is_pdf
+    pos = stream.tell()
+    head = stream.read(PDF_HEADER_WINDOW)
+    stream.seek(pos)
+    return b'%PDF-' in head
+
+
+def store_upload(file_storage, dest_path):
+    """
+    把上传文件保存到目标路径
+
+    返回:
+        str: 流式上传时返回内容 SHA-256，否则返回None
+    """
+    stream = file_storage.stream
+    if isinstance(stream, StagedUpload):
+        return stream.commit(dest_path)
+    file_storage.save(dest_path)
+    return None
@@ -0,0 +1,108 @@
+"""
+图纸查询系统 - Web服务器启动模式
+根据 config.WEB_SERVER 选择 Flask 开发服务器或生产服务器（gunicorn / waitress）
+"""
+import sys
+from config import config
+
+
+def resolve_server_mode():
+    """
+    解析实际使用的服务器模式
+
+    返回:
+        str: 'development' / 'gunicorn' / 'waitress'
+    """
+    mode = (config.WEB_SERVER or 'auto').lower()
+    if mode != 'auto':
+        return mode
+    if config.DEBUG:
+        return 'development'
+    # gunicorn 不支持 Windows
+    return 'waitress' if sys.platform.startswith('win') else 'gunicorn'
+
+
+def serve(app, host='0.0.0.0', port=5000):
+    """
+    启动Web服务（阻塞直到退出）
+
+    参数:
+        app: Flask应用
+        host: 监听地址
+        port: 监听端口
+    """
+    mode = resolve_server_mode()
+    if mode == 'gunicorn':
+        if _serve_gunicorn(app, host, port):
+            return
+    elif mode == 'waitress':
+        if _serve_waitress(app, host, port):
+            return
+
+    print("🔧 使用 Flask 开发服务器")
+    app.run(
+        host=host,
+        port=port,
+        debug=config.DEBUG,
+        threaded=True
+    )
+
+
+def _serve_gunicorn(app, host, port):
+    """多进程 + 多线程(gthread)，支持 HUP 信号平滑重载，文件响应走 sendfile"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("⚠️  未安装 gunicorn，回退到开发服务器（pip install gunicorn）")
+        return False
+
+    class _GunicornApp(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': config.WEB_WORKERS,
+        'worker_class': 'gthread',
+        'threads': config.WEB_THREADS,
+        'keepalive': config.WEB_KEEPALIVE,
+        'timeout': config.WEB_TIMEOUT,
+        'graceful_timeout': config.WEB_GRACEFUL_TIMEOUT,
+        'max_requests': config.WEB_MAX_REQUESTS,
+        'max_requests_jitter': config.WEB_MAX_REQUESTS // 10 if config.WEB_MAX_REQUESTS else 0,
+        'sendfile': True,
+    }
+    print(f"🚀 使用 gunicorn: {config.WEB_WORKERS} 个进程 × {config.WEB_THREADS} 个线程")
+    print("💡 平滑重载: kill -HUP <主进程PID>")
+    _GunicornApp(app, options).run()
+    return True
+
+
+def _serve_waitress(app, host, port):
+    """单进程多线程（Windows可用），支持 keep-alive"""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("⚠️  未安装 waitress，回退到开发服务器（pip install waitress）")
+        return False
+
+    threads = config.WEB_WORKERS * config.WEB_THREADS
+    print(f"🚀 使用 waitress: {threads} 个线程")
+    waitress_serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        channel_timeout=config.WEB_TIMEOUT,
+        connection_limit=max(100, threads * 4),
+    )
+    return True